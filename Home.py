@@ -1,5 +1,6 @@
 import streamlit as st
 from utils.auth import login_user
+from utils.warmup import warmup_on_process_start
 
 # --- Configuração da Página ---
 st.set_page_config(
@@ -9,6 +10,9 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Preenche os caches do Dashboard em segundo plano (uma vez por processo)
+warmup_on_process_start()
+
 # --- Lógica de Redirecionamento ---
 # Se o usuário já está logado, manda direto para o Dashboard
 if "authenticated" in st.session_state and st.session_state.authenticated:
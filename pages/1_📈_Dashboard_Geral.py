@@ -1,103 +1,31 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import sys
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, date
 import calendar
 
 # CORREÇÃO PARA 'KeyError: utils': Adiciona o diretório raiz ao path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.auth import auth_guard
-from utils.firebase_config import get_db
+from utils.detail_table import render_detail_table
+from utils.dashboard_views import get_dashboard_view, make_view_key
+from utils.aggregates import get_goal_progress
+from utils.data_access import (
+    get_users_frame,
+    sales_scope,
+    load_sales_frame,
+    load_sales_kpis
+)
+from utils.live_sales import LIVE_REFRESH_SECONDS, live_window_supported, get_live_sales_view
 
 # --- 1. Proteção da Página ---
 auth_guard()
 st.title(f"📈 Dashboard Geral")
 st.markdown(f"Bem-vindo, **{st.session_state.user_name}**!")
 
-# --- 2. Funções de Busca (com cache) ---
-
-@st.cache_data(ttl=600)
-def get_supporting_data():
-    """Busca dados de usuários (para filtros) e metas."""
-    db = get_db()
-    users_ref = db.collection("users").stream()
-    users = []
-    for user in users_ref:
-        data = user.to_dict()
-        users.append({
-            "uid": user.id,
-            "name": data.get("name", "N/A"),
-            "role": data.get("role", "N/A"),
-            "manager_uid": data.get("manager_uid")
-        })
-    
-    # Busca metas do mês atual
-    current_month_id = datetime.now().strftime("%Y-%m")
-    goals_ref = db.collection("goals").document(current_month_id).get()
-    goals = goals_ref.to_dict() if goals_ref.exists else {}
-
-    return pd.DataFrame(users), goals
-
-
-@st.cache_data(ttl=600) # Cache de 10 minutos
-def query_sales_data(start_date, end_date, role, uid, manager_uid_filter=None):
-    """
-    Busca os dados de vendas no Firestore com base no nível de acesso.
-    AGORA BUSCA O PERÍODO ANTERIOR JUNTO PARA COMPARAÇÃO.
-    """
-    db = get_db()
-    sales_ref = db.collection("sales_data")
-    
-    # 1. Período Atual
-    start_ts = datetime.combine(start_date, datetime.min.time())
-    end_ts = datetime.combine(end_date, datetime.max.time())
-    
-    # 2. Período Anterior (mesma duração)
-    period_days = (end_date - start_date).days
-    prev_end_date = start_date - timedelta(days=1)
-    prev_start_date = prev_end_date - timedelta(days=period_days)
-    
-    prev_start_ts = datetime.combine(prev_start_date, datetime.min.time())
-    prev_end_ts = datetime.combine(prev_end_date, datetime.max.time())
-    
-    # --- Função interna para executar a query ---
-    def fetch_data(start, end, role, uid, manager_uid_filter):
-        query = sales_ref.where("date", ">=", start).where("date", "<=", end)
-        
-        # Filtro de Nível de Acesso (CRÍTICO)
-        if role == 'consultant':
-            query = query.where("consultant_uid", "==", uid)
-        elif role == 'manager':
-            # Gestor vê o time dele OU pode filtrar por um consultor do time
-            if manager_uid_filter:
-                query = query.where("consultant_uid", "==", manager_uid_filter)
-            else:
-                 query = query.where("manager_uid", "==", uid)
-        elif role == 'admin':
-            # Admin pode filtrar por Gestor ou Consultor
-            if manager_uid_filter: # Filtro de gestor
-                query = query.where("manager_uid", "==", manager_uid_filter)
-            # (Filtro de consultor é aplicado via Pandas depois)
-
-        try:
-            docs = query.stream()
-            data = [doc.to_dict() for doc in docs]
-            if not data:
-                return pd.DataFrame()
-            return pd.DataFrame(data)
-        except Exception as e:
-            st.error(f"Erro ao consultar o Firestore: {e}")
-            return pd.DataFrame()
-    # -------------------------------------------
-    
-    df_current = fetch_data(start_ts, end_ts, role, uid, manager_uid_filter)
-    df_previous = fetch_data(prev_start_ts, prev_end_ts, role, uid, manager_uid_filter)
-    
-    return df_current, df_previous, (prev_start_date, prev_end_date)
-
+# --- 2. Funções de Busca (com cache em utils/data_access, aquecidas em segundo plano) ---
 
 def process_dataframe(df):
     """Processa o DF (tipos de dados) se não estiver vazio."""
@@ -108,8 +36,8 @@ def process_dataframe(df):
     df['revenue_net'] = pd.to_numeric(df['revenue_net'])
     return df
 
-# --- 3. Carrega Dados de Suporte (Filtros, Metas) ---
-df_users, user_goals = get_supporting_data()
+# --- 3. Carrega Dados de Suporte (Filtros) ---
+df_users = get_users_frame()
 
 # --- 4. Filtros na Sidebar ---
 st.sidebar.header("Filtros do Dashboard")
@@ -118,8 +46,9 @@ my_uid = st.session_state.user_uid
 
 # --- MELHORIA DE USABILIDADE: Persistência de Filtros ---
 # Inicializa o estado da sessão para os filtros
-default_start = datetime.now().replace(day=1)
-default_end = datetime.now()
+# Datas (sem hora): a mesma chave de cache usada pelo aquecimento (utils/warmup)
+default_start = date.today().replace(day=1)
+default_end = date.today()
 
 if 'filter_start_date' not in st.session_state:
     st.session_state.filter_start_date = default_start
@@ -131,6 +60,10 @@ if 'filter_manager' not in st.session_state:
     st.session_state.filter_manager = "all"
 if 'filter_consultant' not in st.session_state:
     st.session_state.filter_consultant = "all"
+if 'filter_team_mode' not in st.session_state:
+    st.session_state.filter_team_mode = False
+if 'filter_live' not in st.session_state:
+    st.session_state.filter_live = False
 
 # Usa 'key' para vincular o widget ao st.session_state
 st.sidebar.date_input("Data Inicial", key="filter_start_date")
@@ -188,6 +121,19 @@ elif my_role == 'manager':
         key="filter_consultant" # "filter_consultant" será o UID do consultor
     )
 
+if my_role in ['admin', 'manager']:
+    st.sidebar.toggle(
+        "Time pela hierarquia atual",
+        key="filter_team_mode",
+        help="Resolve o time pelo cadastro de usuários, sem depender do gestor gravado em cada venda. Reorganizações de time valem na hora."
+    )
+
+st.sidebar.toggle(
+    "Ao vivo",
+    key="filter_live",
+    help="Para períodos que incluem hoje: vendas gravadas por uma carga aparecem em segundos, sem recarregar."
+)
+
 # Botão de Carregar
 load_button = st.sidebar.button("Aplicar Filtros e Carregar Dados", type="primary", use_container_width=True)
 
@@ -199,6 +145,7 @@ filter_end_date = st.session_state.filter_end_date
 filter_source = st.session_state.filter_source
 filter_consultant_id = st.session_state.filter_consultant
 filter_manager_id = st.session_state.filter_manager
+filter_team_mode = st.session_state.filter_team_mode
 
 # Determina o filtro de query
 query_filter = None
@@ -207,64 +154,93 @@ if my_role == 'admin' and filter_manager_id != 'all':
 elif my_role == 'manager' and filter_consultant_id != 'all':
     query_filter = filter_consultant_id # Manager filtrando por consultor
 
+consultant_filter = None
+if my_role == 'admin' and filter_consultant_id != 'all':
+    consultant_filter = filter_consultant_id # Admin filtrando por consultor
+
 # Inicializa estados
 if "dashboard_data" not in st.session_state:
-    st.session_state.dashboard_data = (pd.DataFrame(), pd.DataFrame(), None)
+    st.session_state.dashboard_data = pd.DataFrame()
 
 if load_button:
-    with st.spinner("Carregando dados... Por favor, aguarde."):
-        df_curr, df_prev, prev_period = query_sales_data(
-            filter_start_date, 
-            filter_end_date, 
-            my_role, 
-            my_uid,
-            query_filter
-        )
-        
-        df_curr = process_dataframe(df_curr)
-        df_prev = process_dataframe(df_prev)
-        
-        st.session_state.dashboard_data = (df_curr, df_prev, prev_period)
-else:
-    if st.session_state.dashboard_data[0].empty:
-        st.info("Selecione os filtros e clique em 'Carregar Dados' na barra lateral para começar.")
+    # Os parâmetros da consulta ficam fixos até o próximo clique em "Carregar".
+    # O escopo (utils/data_access.sales_scope) limita a consulta ao que o usuário pode ver.
+    try:
+        scope = sales_scope(my_role, my_uid, query_filter, filter_team_mode, consultant_filter)
+    except PermissionError as e:
+        st.error(f"Acesso negado: {e}")
         st.stop()
+    st.session_state.dashboard_query = (filter_start_date, filter_end_date, scope)
+elif "dashboard_query" not in st.session_state:
+    st.info("Selecione os filtros e clique em 'Carregar Dados' na barra lateral para começar.")
+    st.stop()
 
-# --- 6. Exibição do Dashboard (com filtros Pandas) ---
-
-df_data, df_prev_data, prev_period = st.session_state.dashboard_data
-df_display = df_data.copy()
-df_prev_display = df_prev_data.copy()
-
-# Aplica filtros PANDAS (pós-query)
-if filter_source:
-    df_display = df_display[df_display['source'].isin(filter_source)]
-    df_prev_display = df_prev_display[df_prev_display['source'].isin(filter_source)]
+dashboard_query = st.session_state.dashboard_query
 
-if my_role == 'admin' and filter_consultant_id != 'all':
-    df_display = df_display[df_display['consultant_uid'] == filter_consultant_id]
-    df_prev_display = df_prev_display[df_prev_display['consultant_uid'] == filter_consultant_id]
+# Modo ao vivo: listener do período (utils/live_sales) em vez da consulta.
+# Enquanto o listener faz a carga inicial, a página usa a carga normal (em cache).
+live_view = None
+live_ready = False
+if st.session_state.filter_live:
+    if not live_window_supported(dashboard_query[1]):
+        st.sidebar.caption("O modo ao vivo vale apenas para períodos que incluem hoje.")
+    else:
+        live_view = get_live_sales_view(*dashboard_query)
+        if live_view is None:
+            st.sidebar.warning("Limite de painéis ao vivo atingido. Usando a carga normal.")
+        else:
+            live_ready = live_view.is_ready()
+
+if live_view is not None:
+    @st.fragment(run_every=LIVE_REFRESH_SECONDS)
+    def live_watch(live_view, seen_state):
+        """Confere as mudanças recebidas; recarrega a página só quando há novidade."""
+        ready, version = live_view.state()
+        if (ready, version) != seen_state:
+            st.rerun()
+        if not ready:
+            st.caption("⏳ Conectando ao modo ao vivo... (exibindo a carga normal)")
+            return
+        updated = datetime.fromtimestamp(live_view.updated_at).strftime("%H:%M:%S") if live_view.updated_at else "-"
+        st.caption(f"🟢 Ao vivo · última mudança às {updated}")
+
+    if live_ready:
+        # Frame com as mudanças aplicadas (o resto da página segue igual)
+        df_live, live_version = live_view.snapshot()
+        if st.session_state.get("dashboard_live_seen") != (id(live_view), live_version):
+            st.session_state.dashboard_data = process_dataframe(df_live)
+            st.session_state.dashboard_data_version = st.session_state.get("dashboard_data_version", 0) + 1
+            st.session_state.dashboard_live_seen = (id(live_view), live_version)
+        live_watch(live_view, (True, live_version))
+    else:
+        live_watch(live_view, live_view.state())
 
+# --- 6. KPIs Principais (agregação no servidor, COM COMPARAÇÃO) ---
+current_kpis, prev_kpis, prev_period = load_sales_kpis(
+    *dashboard_query,
+    tuple(sorted(filter_source))
+)
+if live_ready:
+    # Período atual pelos totais do listener (o anterior não muda)
+    current_kpis = live_view.totals(filter_source)
 
-if df_display.empty and load_button:
+if current_kpis["sales"] == 0 and load_button:
     st.warning("Nenhum dado encontrado para os filtros selecionados.")
     st.stop()
-elif df_display.empty:
+elif current_kpis["sales"] == 0:
     st.stop()
 
-
-# --- 7. KPIs Principais (COM COMPARAÇÃO) ---
 st.subheader("Visão Geral do Período")
 
 # Período Atual
-total_revenue_net = df_display['revenue_net'].sum()
-total_revenue_gross = df_display['revenue_gross'].sum()
-total_sales = len(df_display)
+total_revenue_net = current_kpis["revenue_net"]
+total_revenue_gross = current_kpis["revenue_gross"]
+total_sales = current_kpis["sales"]
 
 # Período Anterior
-prev_revenue_net = df_prev_display['revenue_net'].sum()
-prev_revenue_gross = df_prev_display['revenue_gross'].sum()
-prev_sales = len(df_prev_display)
+prev_revenue_net = prev_kpis["revenue_net"]
+prev_revenue_gross = prev_kpis["revenue_gross"]
+prev_sales = prev_kpis["sales"]
 
 # Funções de Delta
 def get_delta(current, previous):
@@ -289,37 +265,36 @@ col3.metric("Total de Vendas",
 
 st.divider()
 
-# --- 8. Módulo de Metas (Visível para Consultor/Manager) ---
+# --- 7. Módulo de Metas (Visível para Consultor/Manager) ---
 if my_role in ['consultant', 'manager']:
     
     target_uid = my_uid if my_role == 'consultant' else filter_consultant_id # Se manager filtrando consultor
     
+    # Progresso do mês mantido pela ingestão (metas já juntadas): uma leitura
+    goal_progress = get_goal_progress(datetime.now().strftime("%Y-%m"))
+    consultants_progress = goal_progress["consultants"]
+    
     if my_role == 'manager' and filter_consultant_id == 'all': # Manager vendo o time todo
         st.subheader("Meta do Time (Mês Atual)")
-        # Lógica para somar metas do time
-        my_team_uids = df_users[df_users['manager_uid'] == my_uid]['uid'].tolist()
-        team_goal = sum(user_goals.get(uid, 0) for uid in my_team_uids)
-        team_revenue_month = df_data[
-            (df_data['date'].dt.month == datetime.now().month) &
-            (df_data['date'].dt.year == datetime.now().year)
-        ]['revenue_net'].sum()
-        
-        goal_value = team_goal
-        current_value = team_revenue_month
+        if filter_team_mode:
+            # Time pela hierarquia atual: soma o progresso de cada consultor
+            my_team_uids = df_users[df_users['manager_uid'] == my_uid]['uid'].tolist()
+            team_progress = [consultants_progress.get(uid, {}) for uid in my_team_uids]
+            goal_value = sum(p.get("goal", 0) for p in team_progress)
+            current_value = sum(p.get("revenue_net", 0) for p in team_progress)
+        else:
+            manager_progress = goal_progress["managers"].get(my_uid, {})
+            goal_value = manager_progress.get("goal", 0)
+            current_value = manager_progress.get("revenue_net", 0)
 
     else: # Consultor ou Manager filtrando 1 consultor
         user_name_series = df_users[df_users['uid'] == target_uid]['name']
         user_name = user_name_series.values[0] if not user_name_series.empty else "Consultor"
         st.subheader(f"Meta de {user_name.split(' ')[0]} (Mês Atual)")
         
-        goal_value = user_goals.get(target_uid, 0)
-        
-        # Calcula receita do mês atual para esse usuário
-        current_value = df_data[
-            (df_data['consultant_uid'] == target_uid) &
-            (df_data['date'].dt.month == datetime.now().month) &
-            (df_data['date'].dt.year == datetime.now().year)
-        ]['revenue_net'].sum()
+        consultant_progress = consultants_progress.get(target_uid, {})
+        goal_value = consultant_progress.get("goal", 0)
+        current_value = consultant_progress.get("revenue_net", 0)
 
     if goal_value > 0:
         progress = min(current_value / goal_value, 1.0)
@@ -330,40 +305,45 @@ if my_role in ['consultant', 'manager']:
     
     st.divider()
 
+# --- 8. Carga dos Dados Detalhados (gráficos e tabela) ---
+if load_button and not live_ready:
+    with st.spinner("Carregando dados... Por favor, aguarde."):
+        df_curr = load_sales_frame(*dashboard_query)
+        st.session_state.dashboard_data = process_dataframe(df_curr)
+        # Versão do conjunto carregado (invalida ordenações/exports em memória)
+        st.session_state.dashboard_data_version = st.session_state.get("dashboard_data_version", 0) + 1
+
+df_data = st.session_state.dashboard_data
+data_version = st.session_state.get("dashboard_data_version", 0)
+
+# Filtros PANDAS (pós-query) viram uma máscara memorizada: sem cópias do DataFrame
+view = get_dashboard_view(df_data, data_version, filter_source)
+
+if view["rows"] == 0:
+    st.stop()
+
 # --- 9. Gráficos (Plotly) ---
 col1, col2 = st.columns(2)
 
 with col1:
     st.subheader("Receita Líquida por Produto")
-    df_grouped = df_display.groupby("source")['revenue_net'].sum().reset_index()
-    fig = px.pie(
-        df_grouped, 
-        names="source", 
-        values="revenue_net", 
-        title="Receita Líquida (R$) por Fonte",
-        hole=0.3
-    )
-    fig.update_traces(textposition='inside', textinfo='percent+label')
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(view["fig_source"], use_container_width=True)
     
     st.subheader("Pontos de Atenção: Menor Receita")
-    bottom_products = df_display.groupby('product_name')['revenue_net'].sum().nsmallest(5).reset_index()
-    st.dataframe(bottom_products.style.format({'revenue_net': 'R$ {:,.2f}'}), use_container_width=True)
+    st.dataframe(view["bottom_products"].style.format({'revenue_net': 'R$ {:,.2f}'}), use_container_width=True)
 
 with col2:
     st.subheader("Evolução da Receita Líquida")
-    df_time = df_display.set_index('date').resample('D')['revenue_net'].sum().reset_index()
-    fig_time = px.area(
-        df_time,
-        x="date",
-        y="revenue_net",
-        title="Receita Líquida ao Longo do Tempo"
-    )
-    st.plotly_chart(fig_time, use_container_width=True)
+    st.plotly_chart(view["fig_time"], use_container_width=True)
     
     st.subheader("Estratégia: Maior Receita")
-    top_products = df_display.groupby('product_name')['revenue_net'].sum().nlargest(5).reset_index()
-    st.dataframe(top_products.style.format({'revenue_net': 'R$ {:,.2f}'}), use_container_width=True)
+    st.dataframe(view["top_products"].style.format({'revenue_net': 'R$ {:,.2f}'}), use_container_width=True)
 
 with st.expander("Ver dados detalhados (Período Atual)"):
-    st.dataframe(df_display, use_container_width=True)
+    render_detail_table(
+        df_data,
+        key="dashboard_detail",
+        cache_key=make_view_key(data_version, filter_source),
+        mask=view["mask"]
+    )
+
@@ -8,89 +8,84 @@ from datetime import datetime
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.auth import auth_guard
-from utils.firebase_config import get_db
+from utils.data_access import get_users_frame, sales_scope, scope_consultant_uid, load_clients_frame
+from utils.aggregates import get_portfolio_summary, last_month_ids
+from utils.churn import get_at_risk_clients
 
 # --- 1. Proteção da Página ---
 auth_guard()
 st.title(f"🧑‍💼 Minha Carteira")
-st.markdown(f"**Consultor:** {st.session_state.user_name}")
-
-# --- 2. Funções de Busca (com cache) ---
-@st.cache_data(ttl=600)
-def get_my_clients(consultant_uid):
-    """Busca todos os clientes associados a este consultor."""
-    db = get_db()
-    clients_ref = db.collection("clients").where("consultant_uid", "==", consultant_uid).stream()
-    
-    clients = []
-    for client in clients_ref:
-        data = client.to_dict()
-        clients.append({
-            "cnpj": client.id,
-            "name": data.get("client_name", "N/A"),
-            "manager_uid": data.get("manager_uid")
-        })
-    
-    if not clients:
-        return pd.DataFrame(columns=["cnpj", "name", "manager_uid"])
-        
-    return pd.DataFrame(clients)
-
-@st.cache_data(ttl=600)
-def get_my_sales(consultant_uid, start_date, end_date):
-    """Busca as vendas deste consultor no período."""
-    db = get_db()
-    sales_ref = db.collection("sales_data")
-    
-    start_ts = datetime.combine(start_date, datetime.min.time())
-    end_ts = datetime.combine(end_date, datetime.max.time())
-    
-    query = sales_ref.where("consultant_uid", "==", consultant_uid) \
-                     .where("date", ">=", start_ts) \
-                     .where("date", "<=", end_ts)
-    
-    try:
-        docs = query.stream()
-        data = [doc.to_dict() for doc in docs]
-        if not data:
-            return pd.DataFrame()
-        
-        df = pd.DataFrame(data)
-        df['date'] = pd.to_datetime(df['date'])
-        df['revenue_net'] = pd.to_numeric(df['revenue_net'])
-        return df
-    except Exception as e:
-        st.error(f"Erro ao consultar vendas: {e}")
-        return pd.DataFrame()
-
-# --- 3. Filtros ---
-st.sidebar.header("Filtros")
-default_start = datetime.now().replace(day=1)
-default_end = datetime.now()
 
-filter_start_date = st.sidebar.date_input("Data Inicial", default_start)
-filter_end_date = st.sidebar.date_input("Data Final", default_end)
+# --- 2. Filtros ---
+st.sidebar.header("Filtros")
+my_role = st.session_state.user_role
+my_uid = st.session_state.user_uid
+
+# Gestor/admin escolhem uma carteira; o escopo (utils/data_access) garante que é do time
+consultant_choice = None
+if my_role in ['admin', 'manager']:
+    df_users = get_users_frame()
+    consultants = df_users[df_users["role"] == "consultant"] if not df_users.empty else df_users
+    if my_role == 'manager':
+        consultants = consultants[consultants["manager_uid"] == my_uid]
+    if consultants.empty:
+        st.info("Nenhum consultor disponível.")
+        st.stop()
+    consultant_names = dict(zip(consultants["uid"], consultants["name"]))
+    consultant_choice = st.sidebar.selectbox("Consultor", options=list(consultant_names),
+                                             format_func=consultant_names.get, key="portfolio_consultant")
+
+try:
+    if my_role == 'manager':
+        scope = sales_scope(my_role, my_uid, manager_uid_filter=consultant_choice)
+    else:
+        scope = sales_scope(my_role, my_uid, consultant_uid=consultant_choice)
+except PermissionError as e:
+    st.error(f"Acesso negado: {e}")
+    st.stop()
+consultant_uid = scope_consultant_uid(scope)
+consultant_name = st.session_state.user_name if consultant_choice is None else consultant_names[consultant_choice]
+st.markdown(f"**Consultor:** {consultant_name}")
+
+month_options = last_month_ids()
+period_start, period_end = st.sidebar.select_slider(
+    "Período (meses)",
+    options=month_options,
+    value=(month_options[-1], month_options[-1]),
+    format_func=lambda month_id: datetime.strptime(month_id, "%Y-%m").strftime("%m/%Y")
+)
+period_months = tuple(month_options[month_options.index(period_start):month_options.index(period_end) + 1])
 
-# --- 4. Carregamento de Dados ---
+# --- 3. Carregamento de Dados ---
 with st.spinner("Carregando seus dados..."):
-    df_clients = get_my_clients(st.session_state.user_uid)
-    df_sales = get_my_sales(st.session_state.user_uid, filter_start_date, filter_end_date)
+    df_clients = load_clients_frame(scope)
+    # Resumo mantido pela ingestão: uma leitura, sem varrer as vendas
+    portfolio = get_portfolio_summary(consultant_uid, period_months)
 
 if df_clients.empty:
     st.warning("Você ainda não possui clientes cadastrados na sua carteira.")
     st.stop()
 
-# --- 5. KPIs ---
-st.subheader(f"Performance do Período ({filter_start_date.strftime('%d/%m/%Y')} a {filter_end_date.strftime('%d/%m/%Y')})")
+# --- 4. Performance por Cliente (carteira atual + resumo do período) ---
+df_clients_perf = df_clients.copy()
+df_clients_perf['revenue_periodo'] = df_clients_perf['cnpj'].map(
+    lambda cnpj: portfolio.get(cnpj, {}).get("revenue_net", 0.0)
+)
+df_clients_perf['sales_periodo'] = df_clients_perf['cnpj'].map(
+    lambda cnpj: portfolio.get(cnpj, {}).get("sales", 0)
+)
+df_clients_perf['last_purchase'] = pd.to_datetime(
+    df_clients_perf['cnpj'].map(lambda cnpj: portfolio.get(cnpj, {}).get("last_purchase_ts")),
+    unit="s"
+)
+df_clients_perf['activated'] = df_clients_perf['sales_periodo'] > 0
 
-total_revenue = 0.0
-total_sales = 0
-clients_activated = 0
+# --- 5. KPIs ---
+st.subheader(f"Performance do Período ({period_start} a {period_end})")
 
-if not df_sales.empty:
-    total_revenue = df_sales['revenue_net'].sum()
-    total_sales = len(df_sales)
-    clients_activated = df_sales['client_cnpj'].nunique()
+total_revenue = df_clients_perf['revenue_periodo'].sum()
+total_sales = int(df_clients_perf['sales_periodo'].sum())
+clients_activated = int(df_clients_perf['activated'].sum())
 
 col1, col2, col3 = st.columns(3)
 col1.metric("Receita Líquida Gerada", f"R$ {total_revenue:,.2f}")
@@ -102,32 +97,12 @@ st.divider()
 # --- 6. Tabela de Clientes e Performance ---
 st.subheader("Performance por Cliente")
 
-if not df_sales.empty:
-    # Agrupa as vendas por cliente
-    sales_by_client = df_sales.groupby("client_cnpj")['revenue_net'].sum().reset_index()
-    sales_by_client = sales_by_client.rename(columns={"revenue_net": "revenue_periodo"})
-    
-    # Junta com a lista de clientes para ver quem não comprou
-    df_clients_perf = pd.merge(
-        df_clients,
-        sales_by_client,
-        on="client_cnpj",
-        how="left"
-    )
-    # Preenche clientes inativos (NaN) com 0
-    df_clients_perf['revenue_periodo'] = df_clients_perf['revenue_periodo'].fillna(0)
-    
-else:
-    # Se não houver vendas, todos têm 0
-    df_clients_perf = df_clients.copy()
-    df_clients_perf['revenue_periodo'] = 0.0
-
 # Ordena por quem gerou mais receita
 df_clients_perf = df_clients_perf.sort_values(by="revenue_periodo", ascending=False)
 
 # Exibe a tabela
 st.dataframe(
-    df_clients_perf[['name', 'cnpj', 'revenue_periodo']],
+    df_clients_perf[['name', 'cnpj', 'revenue_periodo', 'last_purchase', 'activated']],
     use_container_width=True,
     column_config={
         "name": st.column_config.TextColumn("Cliente"),
@@ -135,6 +110,37 @@ st.dataframe(
         "revenue_periodo": st.column_config.NumberColumn(
             "Receita no Período",
             format="R$ %.2f"
-        )
+        ),
+        "last_purchase": st.column_config.DatetimeColumn(
+            "Última Compra",
+            format="DD/MM/YYYY"
+        ),
+        "activated": st.column_config.CheckboxColumn("Ativo no Período")
     }
 )
+
+st.divider()
+
+# --- 7. Clientes em Risco (Churn) ---
+st.subheader("⚠️ Clientes em Risco")
+st.caption("Clientes cujo tempo sem comprar está bem acima do intervalo usual de compra deles (por produto).")
+
+df_at_risk = get_at_risk_clients(consultant_uid)
+
+if df_at_risk.empty:
+    st.success("Nenhum cliente da carteira com compras atrasadas.")
+else:
+    st.dataframe(
+        df_at_risk,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "cnpj": st.column_config.TextColumn("CNPJ"),
+            "client_name": st.column_config.TextColumn("Cliente"),
+            "source": st.column_config.TextColumn("Produto"),
+            "last_purchase": st.column_config.DatetimeColumn("Última Compra", format="DD/MM/YYYY"),
+            "days_since_last": st.column_config.NumberColumn("Dias sem Comprar"),
+            "usual_interval": st.column_config.NumberColumn("Intervalo Usual (dias)", format="%.0f"),
+            "risk_ratio": st.column_config.NumberColumn("Atraso (x usual)", format="%.1fx")
+        }
+    )
@@ -10,6 +10,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utils.auth import auth_guard, check_role
 from utils.firebase_config import get_db
 from utils.logger import log_audit
+from utils.data_processing import update_sales_attribution
 
 # --- 1. Proteção da Página ---
 auth_guard()
@@ -114,6 +115,7 @@ if st.button("Salvar Atribuições", type="primary"):
         db = get_db()
         batch = db.batch()
         count = 0
+        sale_assignments = {}
         
         for index, row in edited_df.iterrows():
             consultant_uid = row["assign_to_uid"]
@@ -126,12 +128,8 @@ if st.button("Salvar Atribuições", type="primary"):
                 consultant_data = consultants_map[consultant_uid]
                 manager_uid = consultant_data["manager_uid"]
                 
-                # 1. Atualiza o documento da VENDA (sales_data)
-                sale_ref = db.collection("sales_data").document(doc_id)
-                batch.update(sale_ref, {
-                    "consultant_uid": consultant_uid,
-                    "manager_uid": manager_uid
-                })
+                # 1. VENDA (sales_data): gravada em lote, com os agregados
+                sale_assignments[doc_id] = (consultant_uid, manager_uid)
                 
                 # 2. Atualiza (ou cria) o cadastro do CLIENTE
                 client_cnpj = row["client_cnpj"]
@@ -145,11 +143,10 @@ if st.button("Salvar Atribuições", type="primary"):
                         "manager_uid": manager_uid,
                         "updated_at": datetime.now()
                     }, merge=True) # merge=True para não sobrescrever outros dados
-                
-                count += 1
+                    count += 1
                 
                 # Limite de batch
-                if count >= 490: # (2 operações por linha)
+                if count >= 490:
                     batch.commit()
                     batch = db.batch()
                     count = 0
@@ -158,10 +155,12 @@ if st.button("Salvar Atribuições", type="primary"):
         if count > 0:
             batch.commit()
         
-        st.success(f"{int(count/2)} vendas foram corrigidas e atribuídas!")
+        update_sales_attribution(sale_assignments)
+        
+        st.success(f"{len(sale_assignments)} vendas foram corrigidas e atribuídas!")
         
         # Log
-        log_audit(action="assign_orphans", details={"count": int(count/2)})
+        log_audit(action="assign_orphans", details={"count": len(sale_assignments)})
         
         # Limpa o cache e recarrega
         st.cache_data.clear()
@@ -0,0 +1,157 @@
+import streamlit as st
+import pandas as pd
+import sys
+import os
+from datetime import datetime
+
+# CORREÇÃO PARA 'KeyError: utils': Adiciona o diretório raiz ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.auth import auth_guard
+from utils.data_access import get_users_frame, sales_scope
+from utils.aggregates import get_monthly_rollups, rollup_scope_for, last_month_ids
+
+# --- 1. Proteção da Página ---
+auth_guard()
+st.title("📅 Tendências")
+st.markdown("Últimos 12 meses e comparação com o ano anterior, a partir dos totais mensais mantidos pela carga de dados.")
+
+METRICS = {
+    "revenue_net": "Receita Líquida (R$)",
+    "revenue_gross": "Volume Bruto (R$)",
+    "sales": "Total de Vendas",
+}
+
+def format_metric(value, metric):
+    return f"{value:,.0f}" if metric == "sales" else f"R$ {value:,.2f}"
+
+def get_delta(current, previous):
+    if previous == 0:
+        return None # Evita divisão por zero
+    return f"{(current - previous) / previous * 100:.1f}%"
+
+# --- 2. Escopo (de acordo com o papel, validado por utils/data_access.sales_scope) ---
+my_role = st.session_state.user_role
+my_uid = st.session_state.user_uid
+df_users = get_users_frame()
+user_names = dict(zip(df_users["uid"], df_users["name"])) if not df_users.empty else {}
+
+st.sidebar.header("Filtros")
+
+if my_role == "admin":
+    scope_labels = {"all": "Empresa", "manager": "Gestor", "consultant": "Consultor"}
+    scope_kind = st.sidebar.radio("Visão", options=list(scope_labels), format_func=scope_labels.get, key="trend_scope_kind")
+    if scope_kind == "all":
+        scope_args = {}
+        scope_name = "Empresa"
+    else:
+        options = df_users[df_users["role"] == scope_kind]["uid"].tolist() if not df_users.empty else []
+        if not options:
+            st.info(f"Nenhum {scope_labels[scope_kind].lower()} cadastrado.")
+            st.stop()
+        scope_uid = st.sidebar.selectbox(scope_labels[scope_kind], options=options,
+                                         format_func=lambda uid: user_names.get(uid, uid), key="trend_scope_uid")
+        scope_args = {"manager_uid_filter": scope_uid} if scope_kind == "manager" else {"consultant_uid": scope_uid}
+        scope_name = user_names.get(scope_uid, scope_uid)
+
+elif my_role == "manager":
+    team = df_users[(df_users["role"] == "consultant") & (df_users["manager_uid"] == my_uid)]["uid"].tolist()
+    choice = st.sidebar.selectbox("Consultor", options=["team"] + team,
+                                  format_func=lambda uid: "Todo o Time" if uid == "team" else user_names.get(uid, uid),
+                                  key="trend_consultant")
+    scope_args = {} if choice == "team" else {"manager_uid_filter": choice}
+    scope_name = "Time" if choice == "team" else user_names.get(choice, choice)
+
+else:
+    scope_args = {}
+    scope_name = st.session_state.user_name
+
+try:
+    scope = rollup_scope_for(sales_scope(my_role, my_uid, **scope_args))
+except PermissionError as e:
+    st.error(f"Acesso negado: {e}")
+    st.stop()
+
+metric = st.sidebar.selectbox("Métrica", options=list(METRICS), format_func=METRICS.get, key="trend_metric")
+
+# --- 3. Dados (24 documentos, qualquer que seja o volume de vendas) ---
+month_ids = last_month_ids(24)
+df_rollups = get_monthly_rollups(scope, tuple(month_ids))
+
+if df_rollups.empty:
+    st.info("Nenhum total mensal encontrado para esta visão. Meses importados antes desta funcionalidade podem ser recalculados pelo administrador (aba Metas).")
+    st.stop()
+
+all_sources = sorted(df_rollups["source"].unique())
+sources = st.sidebar.multiselect("Filtrar por Produto", options=all_sources, placeholder="Todos os Produtos", key="trend_sources")
+if sources:
+    df_rollups = df_rollups[df_rollups["source"].isin(sources)]
+
+# Mês x produto, com zeros nos meses sem vendas
+monthly = df_rollups.pivot_table(index="month_id", columns="source", values=metric, aggfunc="sum") \
+                    .reindex(month_ids).fillna(0)
+totals = monthly.sum(axis=1)
+last_12, previous_12 = month_ids[-12:], month_ids[:12]
+current_month, same_month_last_year = month_ids[-1], month_ids[-13]
+
+# --- 4. KPIs (ano contra ano) ---
+st.subheader(f"{METRICS[metric]} — {scope_name}")
+
+total_last_12 = totals[last_12].sum()
+total_previous_12 = totals[previous_12].sum()
+
+col1, col2, col3 = st.columns(3)
+col1.metric("Últimos 12 meses", format_metric(total_last_12, metric),
+            delta=get_delta(total_last_12, total_previous_12),
+            help=f"12 meses anteriores: {format_metric(total_previous_12, metric)}")
+col2.metric("Mês atual", format_metric(totals[current_month], metric),
+            delta=get_delta(totals[current_month], totals[same_month_last_year]),
+            help=f"Mesmo mês do ano anterior: {format_metric(totals[same_month_last_year], metric)}")
+col3.metric("Média mensal (12 meses)", format_metric(total_last_12 / 12, metric))
+
+st.divider()
+
+# --- 5. Evolução de 12 meses por produto ---
+def month_label(month_id):
+    return datetime.strptime(month_id, "%Y-%m").strftime("%m/%Y")
+
+def build_trend_chart(monthly, months, metric):
+    """Área empilhada por produto nos meses pedidos."""
+    import plotly.express as px # Só ao montar o gráfico (importação pesada)
+    df_chart = monthly.loc[months].reset_index().melt(id_vars="month_id", var_name="source", value_name=metric)
+    df_chart["month"] = df_chart["month_id"].map(month_label)
+    return px.area(
+        df_chart,
+        x="month",
+        y=metric,
+        color="source",
+        title=f"{METRICS[metric]} por Produto (12 meses)",
+        labels={"month": "Mês", metric: METRICS[metric], "source": "Produto"}
+    )
+
+st.plotly_chart(build_trend_chart(monthly, last_12, metric), use_container_width=True)
+
+# --- 6. Comparação com o ano anterior ---
+col1, col2 = st.columns(2)
+
+with col1:
+    st.subheader("Mês a Mês (vs. ano anterior)")
+    df_yoy = pd.DataFrame({
+        "Mês": [month_label(month_id) for month_id in last_12],
+        "Atual": totals[last_12].to_numpy(),
+        "Ano Anterior": totals[previous_12].to_numpy(),
+    })
+    df_yoy["Variação (%)"] = (df_yoy["Atual"] - df_yoy["Ano Anterior"]) / df_yoy["Ano Anterior"].where(df_yoy["Ano Anterior"] != 0) * 100
+    st.dataframe(df_yoy.iloc[::-1], use_container_width=True, hide_index=True,
+                 column_config={"Variação (%)": st.column_config.NumberColumn(format="%.1f%%")})
+
+with col2:
+    st.subheader("Por Produto (12 meses vs. 12 anteriores)")
+    df_sources = pd.DataFrame({
+        "Últimos 12 meses": monthly.loc[last_12].sum(),
+        "12 meses anteriores": monthly.loc[previous_12].sum(),
+    })
+    df_sources["Variação (%)"] = (df_sources["Últimos 12 meses"] - df_sources["12 meses anteriores"]) \
+        / df_sources["12 meses anteriores"].where(df_sources["12 meses anteriores"] != 0) * 100
+    st.dataframe(df_sources.sort_values("Últimos 12 meses", ascending=False), use_container_width=True,
+                 column_config={"Variação (%)": st.column_config.NumberColumn(format="%.1f%%")})
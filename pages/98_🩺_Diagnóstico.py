@@ -0,0 +1,78 @@
+import streamlit as st
+import pandas as pd
+import sys
+import os
+
+# CORREÇÃO PARA 'KeyError: utils': Adiciona o diretório raiz ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.auth import auth_guard, check_role
+from utils.frame_cache import get_sales_frame_cache
+
+# --- 1. Proteção da Página ---
+auth_guard()
+check_role(["admin"])  # Apenas Admins
+st.title("🩺 Diagnóstico")
+
+MB = 1024 * 1024
+
+# --- 2. Cache de Vendas (segmentos, com orçamento de memória) ---
+st.header("Cache de Vendas")
+st.caption("Segmentos de vendas (mês ou dia, por escopo de acesso) guardados neste processo. Ao passar do orçamento, os menos usados recentemente são descartados.")
+
+cache = get_sales_frame_cache()
+stats = cache.stats()
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Memória", f"{stats['total_bytes'] / MB:,.1f} MB", help=f"Orçamento: {stats['max_bytes'] / MB:,.0f} MB")
+col2.metric("Segmentos", f"{stats['entries']:,}")
+col3.metric("Taxa de Acerto", f"{stats['hit_rate'] * 100:.1f}%", help=f"{stats['hits']:,} acertos / {stats['misses']:,} faltas")
+col4.metric("Descartes (LRU)", f"{stats['evictions']:,}", help=f"Expirados: {stats['expirations']:,} · Grandes demais: {stats['oversized']:,}")
+st.progress(min(stats["total_bytes"] / stats["max_bytes"], 1.0))
+
+entries = cache.entries()
+if entries:
+    df_entries = pd.DataFrame([
+        {
+            "start_date": key[0],
+            "end_date": key[1],
+            "scope": " / ".join(str(part) for part in key[2]),
+            "size_mb": round(nbytes / MB, 2),
+            "age_min": round(age / 60, 1),
+            "expires_in_min": round(ttl_left / 60, 1),
+            "hits": hits,
+        }
+        for key, nbytes, age, ttl_left, hits in reversed(entries) # Mais recentes primeiro
+    ])
+    st.dataframe(df_entries, use_container_width=True, hide_index=True)
+else:
+    st.info("Nenhum segmento em cache.")
+
+if st.button("Limpar Cache de Vendas"):
+    cache.clear()
+    st.rerun()
+
+st.divider()
+
+# --- 3. Tempo de Inicialização (importações por página) ---
+st.header("Tempo de Inicialização")
+st.caption("Mede as importações de cada página em um processo novo (como num cold start). Leva alguns segundos por página.")
+
+if st.button("Medir Importações"):
+    from utils.startup import startup_report # Só quando pedido (roda subprocessos)
+    with st.spinner("Medindo importações..."):
+        st.session_state.startup_report = pd.DataFrame(startup_report())
+
+if "startup_report" in st.session_state:
+    st.dataframe(
+        st.session_state.startup_report,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "page": st.column_config.TextColumn("Página"),
+            "import_seconds": st.column_config.NumberColumn("Importação (s)", format="%.2f"),
+            "budget_seconds": st.column_config.NumberColumn("Orçamento (s)", format="%.1f"),
+            "within_budget": st.column_config.CheckboxColumn("Dentro do Orçamento"),
+            "heaviest": st.column_config.TextColumn("Módulos Mais Pesados"),
+        }
+    )
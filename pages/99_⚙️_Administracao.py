@@ -5,6 +5,7 @@ import os
 from datetime import datetime
 import asyncio 
 import calendar
+import math
 
 # CORREÇÃO PARA 'KeyError: utils': Adiciona o diretório raiz ao path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -12,11 +13,28 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utils.auth import auth_guard, check_role
 from utils.firebase_config import get_db, get_admin_auth
 from utils.logger import log_audit
+from utils.client_search import get_client_search_data, search_clients
+from utils.aggregates import (
+    sync_goals_to_progress,
+    rebuild_goal_progress,
+    rebuild_monthly_rollups,
+    rebuild_portfolio_summary,
+    rebuild_client_activity
+)
+from utils.connectors import CONNECTORS, get_connectors, run_csv_connector, run_api_connector
+from utils.api_archive import list_api_archives
+from utils.export import (
+    dataframe_to_csv_bytes,
+    export_sales_to_file,
+    read_export_file,
+    SALES_EXPORT_FORMATS,
+    EXPORT_DOWNLOAD_MAX_BYTES
+)
+from utils.data_access import build_sales_queries
 from utils.data_processing import (
-    process_bionio_csv, 
-    process_rovema_csv,
-    process_asto_api,
-    process_eliq_api
+    process_clients_csv,
+    update_sales_attribution,
+    PORTFOLIO_CSV_COLUMNS
 )
 
 # --- 1. Proteção da Página ---
@@ -24,10 +42,13 @@ auth_guard()
 check_role(["admin"])
 st.title("⚙️ Painel de Administração")
 
+# Clientes por página na aba "Carteiras Atuais"
+CLIENTS_PAGE_SIZE = 50
+
 # --- 2. Funções de Busca (para todas as abas) ---
 
 @st.cache_data(ttl=300)
-def get_all_users_and_clients():
+def get_all_users():
     db = get_db()
     
     # Busca todos os usuários
@@ -51,19 +72,9 @@ def get_all_users_and_clients():
         if user_data['role'] == 'consultant':
             consultants_map[user.id] = user_data
             consultants_list_dict[user.id] = user_data['name']
-            
-    # Busca todos os clientes
-    clients_ref = db.collection("clients").stream()
-    clients_list = []
-    for client in clients_ref:
-        data = client.to_dict()
-        clients_list.append({
-            "cnpj": client.id,
-            "name": data.get("client_name"),
-            "consultant_uid": data.get("consultant_uid")
-        })
-        
-    return pd.DataFrame(users_list), pd.DataFrame(clients_list), consultants_map, consultants_list_dict
+
+    # (Clientes: ver utils/client_search.get_client_search_data)
+    return pd.DataFrame(users_list), consultants_map, consultants_list_dict
 
 @st.cache_data(ttl=300)
 def get_goals(month_id):
@@ -126,376 +137,534 @@ def get_audit_logs(limit=100):
         st.error(f"Erro ao consultar logs: {e}")
         return pd.DataFrame()
 
-# --- 3. Carregamento de Dados Principal ---
-try:
-    df_users, df_clients, consultants_map, consultants_list_dict = get_all_users_and_clients()
-    df_consultants = df_users[df_users['role'] == 'consultant'].copy()
-except Exception as e:
-    st.error(f"Erro crítico ao conectar ao Firestore: {e}")
-    st.info("Verifique se as credenciais [firebase_service_account] estão corretas nos Secrets.")
-    st.stop()
-    
+# --- 3. Carregamento de Dados (sob demanda, por aba) ---
+def load_users():
+    """Carrega os usuários apenas nas abas que precisam deles (cache próprio)."""
+    try:
+        return get_all_users()
+    except Exception as e:
+        st.error(f"Erro crítico ao conectar ao Firestore: {e}")
+        st.info("Verifique se as credenciais [firebase_service_account] estão corretas nos Secrets.")
+        st.stop()
+
+def show_dead_letter(state_key):
+    """Relatório das linhas rejeitadas na última carga (guardado na sessão para o download)."""
+    df_rejected = st.session_state.get(state_key)
+    if df_rejected is None or df_rejected.empty:
+        return
+    with st.expander(f"⚠️ {len(df_rejected)} registros rejeitados na última carga"):
+        st.dataframe(df_rejected["reason"].value_counts().rename("linhas"))
+        st.dataframe(df_rejected, use_container_width=True, hide_index=True)
+        st.download_button(
+            "Baixar relatório de rejeitados (CSV)",
+            data=dataframe_to_csv_bytes(df_rejected),
+            file_name=f"rejeitados_{state_key}_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
+            mime="text/csv",
+            key=f"{state_key}_download"
+        )
+
 
 # --- 4. Layout em Abas (Reformulado) ---
-tab_assign, tab_clients, tab_users, tab_goals, tab_csv, tab_api, tab_logs = st.tabs([
+tab_assign, tab_clients, tab_users, tab_goals, tab_csv, tab_api, tab_export, tab_logs = st.tabs([
     "🧑‍💼 Atribuir Clientes (Reativo)",
     "📊 Carteiras Atuais (Visão)",
     "👥 Gestão de Usuários",
     "🎯 Gestão de Metas",
     "📄 Carga de Dados (CSV)",
     "☁️ Carga de Dados (API)",
+    "📦 Exportação (BI)",
     "📜 Logs de Auditoria"
-])
+], key="admin_tab", on_change="rerun") # Apenas a aba ativa é executada (.open)
 
 
 # --- ABA 1: ATRIBUIR CLIENTES (Sua sugestão!) ---
-with tab_assign:
-    st.header("Atribuir Clientes (Vendas Órfãs)")
-    st.info("""
-    **Este é o principal módulo de gestão de clientes.**
-    Ele lista todas as vendas de produtos que não foram associadas a um consultor,
-    pois o CNPJ do cliente não estava em nenhuma carteira no momento da importação.
+if tab_assign.open:
+    with tab_assign:
+        st.header("Atribuir Clientes (Vendas Órfãs)")
+        df_users, consultants_map, consultants_list_dict = load_users()
+        st.info("""
+        **Este é o principal módulo de gestão de clientes.**
+        Ele lista todas as vendas de produtos que não foram associadas a um consultor,
+        pois o CNPJ do cliente não estava em nenhuma carteira no momento da importação.
     
-    Ao atribuir uma venda a um consultor aqui, o sistema automaticamente:
-    1.  Atualiza esta e todas as futuras vendas desse CNPJ.
-    2.  Adiciona o cliente à carteira do consultor.
-    """)
+        Ao atribuir uma venda a um consultor aqui, o sistema automaticamente:
+        1.  Atualiza esta e todas as futuras vendas desse CNPJ.
+        2.  Adiciona o cliente à carteira do consultor.
+        """)
     
-    with st.spinner("Buscando vendas órfãs..."):
-        df_orphans = get_orphan_sales()
+        with st.spinner("Buscando vendas órfãs..."):
+            df_orphans = get_orphan_sales()
 
-    if df_orphans.empty:
-        st.success("🎉 Nenhuma venda órfã encontrada no sistema!")
-    else:
-        st.warning(f"Encontradas **{len(df_orphans)}** vendas órfãs (limitado a 500 por vez).")
+        if df_orphans.empty:
+            st.success("🎉 Nenhuma venda órfã encontrada no sistema!")
+        else:
+            st.warning(f"Encontradas **{len(df_orphans)}** vendas órfãs (limitado a 500 por vez).")
         
-        # Usando st.data_editor para uma interface de atribuição rápida
-        df_orphans["assign_to_uid"] = "" # Adiciona coluna vazia
-
-        edited_df = st.data_editor(
-            df_orphans,
-            column_config={
-                "doc_id": None, # Esconde o ID
-                "client_name": st.column_config.TextColumn("Cliente"),
-                "client_cnpj": st.column_config.TextColumn("CNPJ"),
-                "source": st.column_config.TextColumn("Produto"),
-                "date": st.column_config.TextColumn("Data Venda"),
-                "revenue_net": st.column_config.NumberColumn("Receita", format="R$ %.2f"),
-                "assign_to_uid": st.column_config.SelectboxColumn(
-                    "Atribuir ao Consultor",
-                    options=consultants_list_dict.keys(),
-                    format_func=lambda uid: consultants_list_dict.get(uid, "Selecione...")
-                )
-            },
-            use_container_width=True,
-            num_rows="dynamic"
-        )
+            # Usando st.data_editor para uma interface de atribuição rápida
+            df_orphans["assign_to_uid"] = "" # Adiciona coluna vazia
+
+            edited_df = st.data_editor(
+                df_orphans,
+                column_config={
+                    "doc_id": None, # Esconde o ID
+                    "client_name": st.column_config.TextColumn("Cliente"),
+                    "client_cnpj": st.column_config.TextColumn("CNPJ"),
+                    "source": st.column_config.TextColumn("Produto"),
+                    "date": st.column_config.TextColumn("Data Venda"),
+                    "revenue_net": st.column_config.NumberColumn("Receita", format="R$ %.2f"),
+                    "assign_to_uid": st.column_config.SelectboxColumn(
+                        "Atribuir ao Consultor",
+                        options=consultants_list_dict.keys(),
+                        format_func=lambda uid: consultants_list_dict.get(uid, "Selecione...")
+                    )
+                },
+                use_container_width=True,
+                num_rows="dynamic"
+            )
         
-        st.divider()
-
-        if st.button("Salvar Atribuições", type="primary"):
-            with st.spinner("Processando atribuições..."):
-                db = get_db()
-                batch = db.batch()
-                count = 0
-                assigned_count = 0
+            st.divider()
+
+            if st.button("Salvar Atribuições", type="primary"):
+                with st.spinner("Processando atribuições..."):
+                    db = get_db()
+                    batch = db.batch()
+                    count = 0
+                    sale_assignments = {}
                 
-                for index, row in edited_df.iterrows():
-                    consultant_uid = row["assign_to_uid"]
+                    for index, row in edited_df.iterrows():
+                        consultant_uid = row["assign_to_uid"]
                     
-                    if consultant_uid and consultant_uid in consultants_map:
-                        doc_id = row["doc_id"]
-                        consultant_data = consultants_map[consultant_uid]
-                        manager_uid = consultant_data["manager_uid"]
-                        
-                        # 1. Atualiza o documento da VENDA (sales_data)
-                        sale_ref = db.collection("sales_data").document(doc_id)
-                        batch.update(sale_ref, {
-                            "consultant_uid": consultant_uid,
-                            "manager_uid": manager_uid
-                        })
+                        if consultant_uid and consultant_uid in consultants_map:
+                            doc_id = row["doc_id"]
+                            consultant_data = consultants_map[consultant_uid]
+                            manager_uid = consultant_data["manager_uid"]
                         
-                        # 2. Atualiza (ou cria) o cadastro do CLIENTE
-                        client_cnpj = row["client_cnpj"]
-                        client_name = row["client_name"]
+                            # 1. Venda (sales_data): gravada em lote, com os agregados
+                            sale_assignments[doc_id] = (consultant_uid, manager_uid)
                         
-                        if client_cnpj and client_cnpj != "N/A":
-                            client_ref = db.collection("clients").document(client_cnpj)
-                            batch.set(client_ref, {
-                                "client_name": client_name,
-                                "consultant_uid": consultant_uid,
-                                "manager_uid": manager_uid,
-                                "updated_at": datetime.now()
-                            }, merge=True)
+                            # 2. Atualiza (ou cria) o cadastro do CLIENTE
+                            client_cnpj = row["client_cnpj"]
+                            client_name = row["client_name"]
                         
-                        count += 2 # Duas operações
-                        assigned_count += 1
+                            if client_cnpj and client_cnpj != "N/A":
+                                client_ref = db.collection("clients").document(client_cnpj)
+                                batch.set(client_ref, {
+                                    "client_name": client_name,
+                                    "consultant_uid": consultant_uid,
+                                    "manager_uid": manager_uid,
+                                    "updated_at": datetime.now()
+                                }, merge=True)
+                                count += 1
                         
-                        if count >= 490:
-                            batch.commit()
-                            batch = db.batch()
-                            count = 0
+                            if count >= 490:
+                                batch.commit()
+                                batch = db.batch()
+                                count = 0
                 
-                if count > 0:
-                    batch.commit()
+                    if count > 0:
+                        batch.commit()
                 
-                st.success(f"{assigned_count} vendas foram corrigidas e atribuídas!")
-                log_audit(action="assign_orphans", details={"count": assigned_count})
-                st.cache_data.clear()
-                st.rerun()
+                    update_sales_attribution(sale_assignments)
+                    assigned_count = len(sale_assignments)
+                
+                    st.success(f"{assigned_count} vendas foram corrigidas e atribuídas!")
+                    log_audit(action="assign_orphans", details={"count": assigned_count})
+                    st.cache_data.clear()
+                    get_client_search_data.clear()
+                    st.rerun()
 
 
 # --- ABA 2: CARTEIRAS ATUAIS (Visão) ---
-with tab_clients:
-    st.header("Visão das Carteiras Atuais")
-    st.info("Esta é uma visão de todos os clientes que já foram atribuídos a um consultor.")
+if tab_clients.open:
+    with tab_clients:
+        st.header("Visão das Carteiras Atuais")
+        df_users, consultants_map, consultants_list_dict = load_users()
+        st.info("Esta é uma visão de todos os clientes que já foram atribuídos a um consultor.")
+    
+        df_index_clients, client_index = get_client_search_data()
     
-    if df_clients.empty:
-        st.warning("Nenhum cliente cadastrado no sistema ainda.")
-    else:
-        # Mapeia UID para Nome para visualização
-        consultant_name_map = {u['uid']: u['name'] for _, u in df_users.iterrows()}
-        df_clients['consultant_name'] = df_clients['consultant_uid'].map(consultant_name_map).fillna("N/A")
+        if df_index_clients.empty:
+            st.warning("Nenhum cliente cadastrado no sistema ainda.")
+        else:
+            # Filtro (índice em memória: sem acento, por prefixo ou trecho, ou dígitos do CNPJ)
+            search_name = st.text_input("Buscar por nome ou CNPJ")
+            matches = search_clients(client_index, search_name)
         
-        # Filtro
-        search_name = st.text_input("Buscar por nome ou CNPJ")
+            col1, col2 = st.columns([3, 1])
+            total_pages = max(math.ceil(len(matches) / CLIENTS_PAGE_SIZE), 1)
+            if st.session_state.get("clients_page", 1) > total_pages:
+                st.session_state.clients_page = total_pages
+            page = col2.number_input("Página", min_value=1, max_value=total_pages, step=1, key="clients_page")
+            col1.caption(f"{len(matches):,} clientes encontrados (página {page} de {total_pages})")
         
-        if search_name:
-            df_display = df_clients[
-                df_clients['name'].str.contains(search_name, case=False) |
-                df_clients['cnpj'].str.contains(search_name, case=False)
-            ]
-        else:
-            df_display = df_clients
+            page_rows = matches[(page - 1) * CLIENTS_PAGE_SIZE:page * CLIENTS_PAGE_SIZE]
+            df_display = df_index_clients.iloc[page_rows].copy()
         
-        st.dataframe(df_display[['cnpj', 'name', 'consultant_name']], use_container_width=True)
+            # Mapeia UID para Nome para visualização (apenas a página exibida)
+            consultant_name_map = {u['uid']: u['name'] for _, u in df_users.iterrows()}
+            df_display['consultant_name'] = df_display['consultant_uid'].map(consultant_name_map).fillna("N/A")
+        
+            st.dataframe(df_display[['cnpj', 'name', 'consultant_name']], use_container_width=True, hide_index=True)
+    
+        st.divider()
+        st.subheader("Resumo de Carteira (Minha Carteira)")
+        st.caption("O resumo (e a cadência de compra usada em 'Clientes em Risco') é atualizado a cada carga. Recalcule um consultor do zero se as vendas dele foram importadas antes desta funcionalidade.")
+        rebuild_uid = st.selectbox(
+            "Consultor",
+            options=list(consultants_list_dict.keys()),
+            format_func=lambda uid: consultants_list_dict.get(uid, uid),
+            key="rebuild_portfolio_uid"
+        )
+        if rebuild_uid and st.button("Recalcular Resumo de Carteira"):
+            with st.spinner("Recalculando resumo de carteira..."):
+                try:
+                    rebuild_portfolio_summary(rebuild_uid)
+                    rebuild_client_activity(rebuild_uid)
+                    log_audit("rebuild_portfolio_summary", {"consultant_uid": rebuild_uid})
+                    st.success("Resumo de carteira recalculado!")
+                    st.cache_data.clear()
+                except Exception as e:
+                    st.error(f"Erro ao recalcular resumo: {e}")
 
 
 # --- ABA 3: GESTÃO DE USUÁRIOS ---
-with tab_users:
-    st.header("Criar e Gerenciar Usuários")
+if tab_users.open:
+    with tab_users:
+        st.header("Criar e Gerenciar Usuários")
+        df_users, consultants_map, consultants_list_dict = load_users()
     
-    col1, col2 = st.columns(2)
+        col1, col2 = st.columns(2)
     
-    with col1:
-        st.subheader("Criar Novo Usuário")
+        with col1:
+            st.subheader("Criar Novo Usuário")
         
-        manager_dict = {u['uid']: u['name'] for _, u in df_users[df_users['role'] == 'manager'].iterrows()}
+            manager_dict = {u['uid']: u['name'] for _, u in df_users[df_users['role'] == 'manager'].iterrows()}
         
-        with st.form("new_user_form", clear_on_submit=True):
-            name = st.text_input("Nome Completo")
-            email = st.text_input("Email")
-            password = st.text_input("Senha Temporária", type="password")
-            role = st.selectbox("Nível de Acesso", ["consultant", "manager", "admin"])
+            with st.form("new_user_form", clear_on_submit=True):
+                name = st.text_input("Nome Completo")
+                email = st.text_input("Email")
+                password = st.text_input("Senha Temporária", type="password")
+                role = st.selectbox("Nível de Acesso", ["consultant", "manager", "admin"])
             
-            manager_uid = None
-            if role == "consultant" and manager_dict:
-                manager_uid = st.selectbox(
-                    "Gestor Responsável",
-                    options=list(manager_dict.keys()),
-                    format_func=lambda uid: manager_dict[uid]
-                )
-            elif role == "consultant":
-                st.warning("Crie um usuário 'manager' primeiro para poder associar.")
+                manager_uid = None
+                if role == "consultant" and manager_dict:
+                    manager_uid = st.selectbox(
+                        "Gestor Responsável",
+                        options=list(manager_dict.keys()),
+                        format_func=lambda uid: manager_dict[uid]
+                    )
+                elif role == "consultant":
+                    st.warning("Crie um usuário 'manager' primeiro para poder associar.")
             
-            submit_user = st.form_submit_button("Criar Usuário", use_container_width=True)
+                submit_user = st.form_submit_button("Criar Usuário", use_container_width=True)
             
-            if submit_user:
-                if not name or not email or not password or not role:
-                    st.error("Preencha todos os campos!")
-                elif role == "consultant" and not manager_uid:
-                     st.error("Consultores precisam de um gestor associado.")
-                else:
-                    try:
-                        admin_auth = get_admin_auth()
-                        db = get_db()
+                if submit_user:
+                    if not name or not email or not password or not role:
+                        st.error("Preencha todos os campos!")
+                    elif role == "consultant" and not manager_uid:
+                         st.error("Consultores precisam de um gestor associado.")
+                    else:
+                        try:
+                            admin_auth = get_admin_auth()
+                            db = get_db()
                         
-                        user_record = admin_auth.create_user(
-                            email=email,
-                            password=password,
-                            display_name=name
-                        )
+                            user_record = admin_auth.create_user(
+                                email=email,
+                                password=password,
+                                display_name=name
+                            )
                         
-                        user_data = {
-                            "name": name,
-                            "email": email,
-                            "role": role,
-                            "manager_uid": manager_uid if role == "consultant" else None
-                        }
-                        db.collection("users").document(user_record.uid).set(user_data)
+                            user_data = {
+                                "name": name,
+                                "email": email,
+                                "role": role,
+                                "manager_uid": manager_uid if role == "consultant" else None
+                            }
+                            db.collection("users").document(user_record.uid).set(user_data)
                         
-                        log_audit("create_user", {"new_user_email": email, "role": role})
-                        st.success(f"Usuário '{name}' criado com sucesso (UID: {user_record.uid})!")
-                        st.cache_data.clear()
+                            log_audit("create_user", {"new_user_email": email, "role": role})
+                            st.success(f"Usuário '{name}' criado com sucesso (UID: {user_record.uid})!")
+                            st.cache_data.clear()
                         
-                    except Exception as e:
-                        st.error(f"Erro ao criar usuário: {e}")
+                        except Exception as e:
+                            st.error(f"Erro ao criar usuário: {e}")
 
-    with col2:
-        st.subheader("Usuários Existentes")
-        st.dataframe(df_users, use_container_width=True)
+        with col2:
+            st.subheader("Usuários Existentes")
+            st.dataframe(df_users, use_container_width=True)
 
 
 # --- ABA 4: GESTÃO DE METAS ---
-with tab_goals:
-    st.header("🎯 Gestão de Metas Mensais")
-    st.info("Defina as metas de Receita Líquida (R$) para os consultores.")
+if tab_goals.open:
+    with tab_goals:
+        st.header("🎯 Gestão de Metas Mensais")
+        df_users, consultants_map, consultants_list_dict = load_users()
+        df_consultants = df_users[df_users['role'] == 'consultant'].copy()
+        st.info("Defina as metas de Receita Líquida (R$) para os consultores.")
     
-    today = datetime.now()
-    col1, col2 = st.columns(2)
-    selected_month = col1.selectbox(
-        "Mês da Meta", 
-        options=range(1, 13), 
-        format_func=lambda m: calendar.month_name[m],
-        index=today.month - 1
-    )
-    selected_year = col2.number_input("Ano da Meta", value=today.year, min_value=2024, max_value=2030)
+        today = datetime.now()
+        col1, col2 = st.columns(2)
+        selected_month = col1.selectbox(
+            "Mês da Meta", 
+            options=range(1, 13), 
+            format_func=lambda m: calendar.month_name[m],
+            index=today.month - 1
+        )
+        selected_year = col2.number_input("Ano da Meta", value=today.year, min_value=2024, max_value=2030)
     
-    month_id = f"{selected_year}-{selected_month:02d}"
+        month_id = f"{selected_year}-{selected_month:02d}"
     
-    st.subheader(f"Definindo Metas para: {calendar.month_name[selected_month]} / {selected_year}")
+        st.subheader(f"Definindo Metas para: {calendar.month_name[selected_month]} / {selected_year}")
     
-    current_goals = get_goals(month_id)
+        current_goals = get_goals(month_id)
     
-    df_consultants['meta'] = df_consultants['uid'].map(lambda uid: current_goals.get(uid, 0.0))
+        df_consultants['meta'] = df_consultants['uid'].map(lambda uid: current_goals.get(uid, 0.0))
     
-    edited_goals_df = st.data_editor(
-        df_consultants[['name', 'email', 'meta', 'uid']],
-        column_config={
-            "uid": None, # Esconde UID
-            "name": st.column_config.TextColumn("Consultor", disabled=True),
-            "email": st.column_config.TextColumn("Email", disabled=True),
-            "meta": st.column_config.NumberColumn(
-                "Meta (R$)",
-                min_value=0.0,
-                format="R$ %.2f"
-            )
-        },
-        use_container_width=True
-    )
+        edited_goals_df = st.data_editor(
+            df_consultants[['name', 'email', 'meta', 'uid']],
+            column_config={
+                "uid": None, # Esconde UID
+                "name": st.column_config.TextColumn("Consultor", disabled=True),
+                "email": st.column_config.TextColumn("Email", disabled=True),
+                "meta": st.column_config.NumberColumn(
+                    "Meta (R$)",
+                    min_value=0.0,
+                    format="R$ %.2f"
+                )
+            },
+            use_container_width=True
+        )
     
-    if st.button("Salvar Metas", type="primary"):
-        goals_to_save = pd.Series(
-            edited_goals_df.meta.values, 
-            index=edited_goals_df.uid
-        ).to_dict()
+        if st.button("Salvar Metas", type="primary"):
+            goals_to_save = pd.Series(
+                edited_goals_df.meta.values, 
+                index=edited_goals_df.uid
+            ).to_dict()
         
-        goals_to_save = {uid: float(meta) for uid, meta in goals_to_save.items() if pd.notna(meta)}
+            goals_to_save = {uid: float(meta) for uid, meta in goals_to_save.items() if pd.notna(meta)}
         
-        try:
-            db = get_db()
-            doc_ref = db.collection("goals").document(month_id)
-            doc_ref.set(goals_to_save)
+            try:
+                db = get_db()
+                doc_ref = db.collection("goals").document(month_id)
+                doc_ref.set(goals_to_save)
             
-            log_audit("set_goals", {"month_id": month_id, "goals_count": len(goals_to_save)})
-            st.success(f"Metas de {month_id} salvas com sucesso!")
-            st.cache_data.clear()
-            st.rerun()
+                # Junta as metas ao progresso do mês (lido direto pelo Dashboard)
+                consultant_managers = {uid: data["manager_uid"] for uid, data in consultants_map.items()}
+                sync_goals_to_progress(month_id, goals_to_save, consultant_managers)
+            
+                log_audit("set_goals", {"month_id": month_id, "goals_count": len(goals_to_save)})
+                st.success(f"Metas de {month_id} salvas com sucesso!")
+                st.cache_data.clear()
+                st.rerun()
             
-        except Exception as e:
-            st.error(f"Erro ao salvar metas: {e}")
+            except Exception as e:
+                st.error(f"Erro ao salvar metas: {e}")
+    
+        st.divider()
+        st.caption("O progresso das metas é atualizado a cada carga. Use o botão abaixo para recalcular um mês do zero (ex: meses importados antes desta funcionalidade).")
+        if st.button(f"Recalcular Progresso de {month_id}"):
+            with st.spinner("Recalculando progresso do mês..."):
+                try:
+                    consultant_managers = {uid: data["manager_uid"] for uid, data in consultants_map.items()}
+                    rebuild_goal_progress(month_id, consultant_managers)
+                    log_audit("rebuild_goal_progress", {"month_id": month_id})
+                    st.success(f"Progresso de {month_id} recalculado!")
+                    st.cache_data.clear()
+                except Exception as e:
+                    st.error(f"Erro ao recalcular progresso: {e}")
+
+        st.caption("As tendências (12 meses / ano contra ano) usam totais mensais mantidos pela carga. Recalcule aqui os meses importados antes dessa funcionalidade.")
+        if st.button(f"Recalcular Tendências de {month_id}"):
+            with st.spinner("Recalculando totais mensais..."):
+                try:
+                    rebuild_monthly_rollups(month_id)
+                    log_audit("rebuild_monthly_rollups", {"month_id": month_id})
+                    st.success(f"Totais mensais de {month_id} recalculados!")
+                    st.cache_data.clear()
+                except Exception as e:
+                    st.error(f"Erro ao recalcular totais mensais: {e}")
 
 
 # --- ABA 5: CARGA DE DADOS (CSV) ---
-with tab_csv:
-    st.header("Upload de Arquivos CSV")
+if tab_csv.open:
+    with tab_csv:
+        st.header("Upload de Arquivos CSV")
     
-    st.subheader("Produto: Bionio")
-    uploaded_bionio = st.file_uploader("Selecione o arquivo Bionio.csv", type="csv", key="bionio_uploader")
-    if uploaded_bionio:
-        if st.button("Processar Bionio"):
-            with st.spinner("Processando Bionio..."):
-                result = process_bionio_csv(uploaded_bionio)
-                if result:
-                    total_saved, total_orphans = result
-                    st.success(f"Processamento Bionio concluído! {total_saved} registros salvos.")
-                    if total_orphans > 0:
-                        st.warning(f"**{total_orphans} vendas órfãs** detectadas.")
-                        st.info("Acesse a aba 'Atribuir Clientes' para corrigi-las.")
-                    
-    st.divider()
-
-    st.subheader("Produto: Rovema Pay")
-    uploaded_rovema = st.file_uploader("Selecione o arquivo RovemaPay.csv", type="csv", key="rovema_uploader")
-    if uploaded_rovema:
-        if st.button("Processar Rovema Pay"):
-            with st.spinner("Processando Rovema Pay..."):
-                result = process_rovema_csv(uploaded_rovema)
-                if result:
-                    total_saved, total_orphans = result
-                    st.success(f"Processamento Rovema Pay concluído! {total_saved} registros salvos.")
-                    if total_orphans > 0:
-                        st.warning(f"**{total_orphans} vendas órfãs** detectadas.")
-                        st.info("Acesse a aba 'Atribuir Clientes' para corrigi-las.")
+        # Um bloco por conector de CSV (utils/connectors.py)
+        for connector_id, connector in get_connectors("csv").items():
+            label = connector["label"]
+            st.subheader(f"Produto: {label}")
+            uploaded_file = st.file_uploader(f"Selecione o arquivo {connector['file_name']}", type="csv", key=f"{connector_id}_uploader")
+            if uploaded_file:
+                if st.button(f"Processar {label}"):
+                    with st.spinner(f"Processando {label}..."):
+                        result = run_csv_connector(connector, uploaded_file)
+                        if result:
+                            total_saved, total_orphans, df_rejected = result
+                            st.session_state[f"{connector_id}_dead_letter"] = df_rejected
+                            st.success(f"Processamento {label} concluído! {total_saved} registros salvos.")
+                            if total_orphans > 0:
+                                st.warning(f"**{total_orphans} vendas órfãs** detectadas.")
+                                st.info("Acesse a aba 'Atribuir Clientes' para corrigi-las.")
+            show_dead_letter(f"{connector_id}_dead_letter")
+
+            st.divider()
+
+        st.subheader("Carteira de Clientes (Importação em Massa)")
+        st.caption(f"CSV separado por ';' com as colunas: `{';'.join(PORTFOLIO_CSV_COLUMNS)}`. Consultor e gestor podem ser UID ou e-mail; sem gestor, vale o gestor do consultor.")
+        uploaded_clients = st.file_uploader("Selecione o arquivo de carteira", type="csv", key="clients_uploader")
+        if uploaded_clients:
+            if st.button("Importar Carteira"):
+                df_users, consultants_map, consultants_list_dict = load_users()
+                users_map = df_users.set_index("uid")[["email", "role", "manager_uid"]].to_dict("index")
+                with st.spinner("Validando e importando carteira..."):
+                    result = process_clients_csv(uploaded_clients, users_map)
+                    if result:
+                        total_saved, total_new, df_rejected = result
+                        st.session_state["clients_dead_letter"] = df_rejected
+                        st.success(f"Carteira importada! {total_saved} clientes gravados ({total_new} novos).")
+        show_dead_letter("clients_dead_letter")
 
 
 # --- ABA 6: CARGA DE DADOS (API) ---
-with tab_api:
-    st.header("Carga de Dados via API")
-    st.info("As credenciais das APIs são lidas automaticamente dos Secrets.")
+if tab_api.open:
+    with tab_api:
+        st.header("Carga de Dados via API")
+        st.info("As credenciais das APIs são lidas automaticamente dos Secrets.")
     
-    st.subheader("Selecione o Período de Carga")
-    col1, col2 = st.columns(2)
-    api_start_date = col1.date_input("Data Inicial", datetime.now().replace(day=1))
-    api_end_date = col2.date_input("Data Final", datetime.now())
+        st.subheader("Selecione o Período de Carga")
+        col1, col2 = st.columns(2)
+        api_start_date = col1.date_input("Data Inicial", datetime.now().replace(day=1))
+        api_end_date = col2.date_input("Data Final", datetime.now())
+        api_replay = st.toggle(
+            "Reprocessar do arquivo local (sem chamar a API)",
+            help="Usa a resposta guardada na última carga deste mesmo período. Útil após corrigir um mapeamento."
+        )
     
-    st.divider()
+        st.divider()
 
-    st.subheader("Produto: ASTO (Logpay)")
-    st.markdown(f"Usando usuário: `{st.secrets.get('api_credentials', {}).get('asto_username', 'N/A')}`")
-    
-    if st.button("Carregar Dados ASTO"):
-        with st.spinner("Buscando dados na API ASTO..."):
-            result = asyncio.run(process_asto_api(api_start_date, api_end_date))
-            if result:
-                total_saved, total_orphans = result
-                st.success(f"Carga ASTO concluída! {total_saved} registros salvos.")
-                if total_orphans > 0:
-                    st.warning(f"**{total_orphans} vendas órfãs** detectadas. Acesse 'Atribuir Clientes'.")
-
-    st.divider()
-    
-    st.subheader("Produto: ELIQ (Uzzipay)")
-    st.markdown(f"Usando URL: `{st.secrets.get('api_credentials', {}).get('eliq_url', 'N/A')}`")
-
-    if st.button("Carregar Dados ELIQ"):
-        with st.spinner("Buscando dados na API ELIQ..."):
-            result = asyncio.run(process_eliq_api(api_start_date, api_end_date))
-            if result:
-                total_saved, total_orphans = result
-                st.success(f"Carga ELIQ concluída! {total_saved} registros salvos.")
-                if total_orphans > 0:
-                    st.warning(f"**{total_orphans} vendas órfãs** detectadas. Acesse 'Atribuir Clientes'.")
-
-
-# --- ABA 7: LOGS DE AUDITORIA ---
-with tab_logs:
-    st.header("📜 Logs de Auditoria do Sistema")
-    st.info("Exibe as ações mais recentes realizadas no sistema.")
+        # Um bloco por conector de API (utils/connectors.py)
+        for connector_id, connector in get_connectors("api").items():
+            label = connector["label"]
+            caption, secret_key = connector["secret_caption"]
+            st.subheader(f"Produto: {label}")
+            st.markdown(f"{caption}: `{st.secrets.get('api_credentials', {}).get(secret_key, 'N/A')}`")
+
+            df_archives = list_api_archives(connector["source"])
+            if not df_archives.empty:
+                with st.expander(f"Respostas arquivadas ({len(df_archives)})"):
+                    st.dataframe(df_archives, use_container_width=True, hide_index=True)
+
+            if st.button(f"Carregar Dados {label}", key=f"{connector_id}_load"):
+                with st.spinner(f"Buscando dados na API {label}..."):
+                    result = asyncio.run(run_api_connector(connector, api_start_date, api_end_date, replay=api_replay))
+                    if result:
+                        total_saved, total_orphans, df_rejected = result
+                        st.session_state[f"{connector_id}_dead_letter"] = df_rejected
+                        st.success(f"Carga {label} concluída! {total_saved} registros salvos.")
+                        if total_orphans > 0:
+                            st.warning(f"**{total_orphans} vendas órfãs** detectadas. Acesse 'Atribuir Clientes'.")
+            show_dead_letter(f"{connector_id}_dead_letter")
+
+            st.divider()
+
+
+# --- ABA 7: EXPORTAÇÃO PARA BI ---
+if tab_export.open:
+    with tab_export:
+        st.header("Exportação de Vendas (Parquet / Arrow)")
+        st.info("As vendas são lidas do Firestore em páginas e gravadas direto no arquivo, sem carregar o período inteiro em memória. Os arquivos ficam em `exports/` no servidor.")
+
+        df_users, consultants_map, consultants_list_dict = load_users()
+        managers = df_users[df_users["role"] == "manager"]
+
+        col1, col2, col3 = st.columns(3)
+        export_start_date = col1.date_input("Data Inicial", datetime.now().replace(day=1), key="export_start_date")
+        export_end_date = col2.date_input("Data Final", datetime.now(), key="export_end_date")
+        export_format = col3.selectbox("Formato", options=list(SALES_EXPORT_FORMATS.keys()), key="export_format")
+
+        col1, col2, col3 = st.columns(3)
+        export_sources = col1.multiselect("Produtos", options=[spec["source"] for spec in CONNECTORS.values()],
+                                          placeholder="Todos os Produtos", key="export_sources")
+        export_manager = col2.selectbox("Gestor", options=[None] + managers["uid"].tolist(),
+                                        format_func=lambda uid: "Todos" if uid is None else managers.set_index("uid")["name"].get(uid, uid),
+                                        key="export_manager")
+        export_consultant = col3.selectbox("Consultor", options=[None] + list(consultants_list_dict.keys()),
+                                           format_func=lambda uid: "Todos" if uid is None else consultants_list_dict.get(uid, uid),
+                                           key="export_consultant")
+
+        if st.button("Gerar Exportação", type="primary"):
+            with st.spinner("Exportando vendas..."):
+                try:
+                    queries = build_sales_queries(
+                        export_start_date, export_end_date, "admin", st.session_state.user_uid,
+                        export_manager, True, tuple(export_sources), export_consultant
+                    )
+                    name = f"vendas_{export_start_date.strftime('%Y%m%d')}_{export_end_date.strftime('%Y%m%d')}"
+                    path, rows = export_sales_to_file(queries, export_format, name)
+                    log_audit("export_sales", {
+                        "start_date": str(export_start_date),
+                        "end_date": str(export_end_date),
+                        "format": export_format,
+                        "sources": list(export_sources),
+                        "manager_uid": export_manager,
+                        "consultant_uid": export_consultant,
+                        "rows": rows,
+                        "file": os.path.basename(path),
+                    })
+                    st.session_state["export_last_file"] = (path, export_format)
+                    st.success(f"{rows} vendas exportadas para `{os.path.basename(path)}`.")
+                except Exception as e:
+                    st.error(f"Erro ao exportar vendas: {e}")
+
+        last_export = st.session_state.get("export_last_file")
+        if last_export and os.path.exists(last_export[0]):
+            path, fmt = last_export
+            size = os.path.getsize(path)
+            if size <= EXPORT_DOWNLOAD_MAX_BYTES:
+                # O arquivo só é lido no clique; depois do download o botão some
+                st.download_button(
+                    f"Baixar {os.path.basename(path)} ({size / 1024 / 1024:,.1f} MB)",
+                    data=lambda: read_export_file(path),
+                    file_name=os.path.basename(path),
+                    mime=SALES_EXPORT_FORMATS[fmt]["mime"],
+                    on_click=lambda: st.session_state.pop("export_last_file", None),
+                    key="export_download"
+                )
+            else:
+                st.info(f"Arquivo grande demais para download pelo navegador ({size / 1024 / 1024:,.0f} MB). Disponível no servidor em `{path}`.")
+                st.session_state.pop("export_last_file", None)
+
+
+# --- ABA 8: LOGS DE AUDITORIA ---
+if tab_logs.open:
+    with tab_logs:
+        st.header("📜 Logs de Auditoria do Sistema")
+        st.info("Exibe as ações mais recentes realizadas no sistema.")
     
-    with st.spinner("Carregando logs..."):
-        df_logs = get_audit_logs(limit=200)
-
-    if df_logs.empty:
-        st.info("Nenhum log de auditoria encontrado.")
-    else:
-        # Reordena colunas para melhor visualização
-        df_logs = df_logs[["timestamp", "user_email", "action", "details"]]
-
-        st.dataframe(
-            df_logs,
-            use_container_width=True,
-            column_config={
-                "timestamp": st.column_config.DatetimeColumn(
-                    "Data/Hora",
-                    format="YYYY-MM-DD HH:mm:ss"
-                ),
-                "user_email": st.column_config.TextColumn("Usuário"),
-                "action": st.column_config.TextColumn("Ação"),
-                "details": st.column_config.TextColumn("Detalhes")
-            }
-        )
+        with st.spinner("Carregando logs..."):
+            df_logs = get_audit_logs(limit=200)
 
-    if st.button("Recarregar Logs"):
-        st.cache_data.clear()
-        st.rerun()
+        if df_logs.empty:
+            st.info("Nenhum log de auditoria encontrado.")
+        else:
+            # Reordena colunas para melhor visualização
+            df_logs = df_logs[["timestamp", "user_email", "action", "details"]]
+
+            st.dataframe(
+                df_logs,
+                use_container_width=True,
+                column_config={
+                    "timestamp": st.column_config.DatetimeColumn(
+                        "Data/Hora",
+                        format="YYYY-MM-DD HH:mm:ss"
+                    ),
+                    "user_email": st.column_config.TextColumn("Usuário"),
+                    "action": st.column_config.TextColumn("Ação"),
+                    "details": st.column_config.TextColumn("Detalhes")
+                }
+            )
+
+        if st.button("Recarregar Logs"):
+            st.cache_data.clear()
+            st.rerun()
@@ -0,0 +1,71 @@
+import io
+import os
+import sys
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pyarrow.parquet as pq
+
+# Mesmo ajuste de path das páginas: permite importar 'utils'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.export import page_to_record_batch, sales_export_schema, write_sales_export
+
+
+def make_doc(doc_id, data):
+    return SimpleNamespace(id=doc_id, to_dict=lambda: dict(data))
+
+
+# Documentos antigos de sales_data: tipos misturados no mesmo campo
+MIXED_PAGE = [
+    make_doc("a", {"client_cnpj": 12345678000190, "product_name": float("nan"),
+                   "revenue_net": "abc", "revenue_gross": "10.5", "date": datetime(2025, 1, 1)}),
+    make_doc("b", {"client_cnpj": "98765432000110", "product_name": "Crédito",
+                   "revenue_net": 3, "revenue_gross": None,
+                   "date": datetime(2025, 1, 2, tzinfo=timezone.utc)}),
+    make_doc("c", {"date": "data inválida", "volume": "7"}),
+]
+
+
+class FakeQuery:
+    """Consulta paginada mínima (order_by/limit/start_after/stream)."""
+
+    def __init__(self, docs, after=None, limit=None):
+        self.docs, self.after, self.limit_count = docs, after, limit
+
+    def order_by(self, field):
+        return self
+
+    def limit(self, count):
+        return FakeQuery(self.docs, self.after, count)
+
+    def start_after(self, doc):
+        return FakeQuery(self.docs, doc, self.limit_count)
+
+    def stream(self):
+        start = 0 if self.after is None else self.docs.index(self.after) + 1
+        return iter(self.docs[start:start + self.limit_count])
+
+
+def test_page_with_mixed_types_is_coerced():
+    batch = page_to_record_batch(MIXED_PAGE, sales_export_schema())
+    data = batch.to_pydict()
+
+    assert data["doc_id"] == ["a", "b", "c"]
+    assert data["client_cnpj"] == ["12345678000190", "98765432000110", None]
+    assert data["product_name"] == [None, "Crédito", None]
+    assert data["revenue_net"] == [None, 3.0, None]
+    assert data["revenue_gross"] == [10.5, None, None]
+    assert data["volume"] == [None, None, 7.0]
+    assert data["date"][0] == datetime(2025, 1, 1, tzinfo=timezone.utc)
+    assert data["date"][1] == datetime(2025, 1, 2, tzinfo=timezone.utc)
+    assert data["date"][2] is None
+
+
+def test_mixed_page_exports_to_parquet():
+    sink = io.BytesIO()
+    rows = write_sales_export([FakeQuery(MIXED_PAGE)], "Parquet", sink)
+    sink.seek(0)
+
+    assert rows == 3
+    assert pq.read_table(sink).num_rows == 3
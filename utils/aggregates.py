@@ -0,0 +1,594 @@
+import streamlit as st
+import pandas as pd
+from utils.firebase_config import get_db
+from utils.data_access import chunk_list
+from datetime import datetime, timezone
+import random
+
+# --- AGREGADOS MANTIDOS PELA INGESTÃO ---
+#
+# Cada "agregador" recebe um registro de venda e devolve suas contribuições:
+#   [ (coleção, doc_id, ("campo", "subcampo", ...), operação, valor), ... ]
+# Operações:
+#   INC - soma. Na gravação, a contribuição do documento antigo (se existir) é
+#         subtraída da do novo: reimportar o mesmo arquivo gera delta zero
+#         (idempotente) e uma reatribuição move os valores de um dono para o outro.
+#   MAX - mantém o maior valor (ex: data da última compra, em epoch).
+#   MIN - mantém o menor valor (ex: data da primeira compra, em epoch).
+#   SET - grava o valor da venda mais recente processada (ex: nome do cliente).
+#   UNION - adiciona o valor a uma lista sem repetir (ArrayUnion, idempotente).
+#   LATEST - valor = (epoch, v): grava v só se a venda não for mais antiga que a
+#         que gravou o valor atual (guardada em '{campo}_ts'). Não depende da
+#         ordem de carga (ex: dono do cliente ao importar um histórico antigo).
+
+INC, MAX, MIN, SET, UNION, LATEST = "inc", "max", "min", "set", "union", "latest"
+
+GOAL_PROGRESS_COLLECTION = "goal_progress"
+PORTFOLIO_COLLECTION = "portfolio_summary"
+CLIENT_ACTIVITY_COLLECTION = "client_activity"
+MONTHLY_ROLLUP_COLLECTION = "monthly_rollups"
+
+def month_id_of(date_value):
+    """Retorna o ID do mês ('YYYY-MM') de uma data."""
+    return date_value.strftime("%Y-%m")
+
+def last_month_ids(count=24, today=None):
+    """IDs ('YYYY-MM') dos últimos 'count' meses, do mais antigo ao atual."""
+    today = today or datetime.now()
+    month_ids = []
+    year, month = today.year, today.month
+    for _ in range(count):
+        month_ids.append(f"{year}-{month:02d}")
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    return month_ids[::-1]
+
+def epoch_of(date_value):
+    """
+    Data em segundos (epoch), para campos comparáveis com MAX.
+    Datas sem fuso são tratadas como UTC, como o Firestore as grava.
+    """
+    if date_value.tzinfo is None:
+        date_value = date_value.replace(tzinfo=timezone.utc)
+    return int(date_value.timestamp())
+
+def day_of(date_value):
+    """Dia (ordinal) da data em UTC, usado para contar dias distintos de compra."""
+    if date_value.tzinfo is not None:
+        date_value = date_value.astimezone(timezone.utc)
+    return date_value.toordinal()
+
+def goal_progress_contributions(sale):
+    """Receita do mês por consultor e por gestor (goal_progress/{YYYY-MM})."""
+    consultant_uid = sale.get("consultant_uid")
+    if not consultant_uid or not sale.get("date"):
+        return []
+    month_id = month_id_of(sale["date"])
+    revenue_net = float(sale.get("revenue_net") or 0)
+    contributions = [
+        (GOAL_PROGRESS_COLLECTION, month_id, ("consultants", consultant_uid, "revenue_net"), INC, revenue_net),
+        (GOAL_PROGRESS_COLLECTION, month_id, ("consultants", consultant_uid, "sales"), INC, 1),
+    ]
+    manager_uid = sale.get("manager_uid")
+    if manager_uid:
+        contributions += [
+            (GOAL_PROGRESS_COLLECTION, month_id, ("managers", manager_uid, "revenue_net"), INC, revenue_net),
+            (GOAL_PROGRESS_COLLECTION, month_id, ("managers", manager_uid, "sales"), INC, 1),
+        ]
+    return contributions
+
+def portfolio_contributions(sale):
+    """
+    Resumo da carteira por consultor e cliente:
+    - portfolio_summary/{consultant_uid}: nome e última compra de cada cliente;
+    - portfolio_summary/{consultant_uid}_{YYYY-MM}: receita e vendas do mês por cliente.
+    """
+    consultant_uid = sale.get("consultant_uid")
+    cnpj = sale.get("client_cnpj")
+    if not consultant_uid or not cnpj or not sale.get("date"):
+        return []
+    month_doc = f"{consultant_uid}_{month_id_of(sale['date'])}"
+    revenue_net = float(sale.get("revenue_net") or 0)
+    last_purchase = epoch_of(sale["date"])
+    return [
+        (PORTFOLIO_COLLECTION, consultant_uid, ("clients", cnpj, "client_name"), SET, sale.get("client_name")),
+        (PORTFOLIO_COLLECTION, consultant_uid, ("clients", cnpj, "last_purchase_ts"), MAX, last_purchase),
+        (PORTFOLIO_COLLECTION, month_doc, ("clients", cnpj, "revenue_net"), INC, revenue_net),
+        (PORTFOLIO_COLLECTION, month_doc, ("clients", cnpj, "sales"), INC, 1),
+        (PORTFOLIO_COLLECTION, month_doc, ("clients", cnpj, "last_purchase_ts"), MAX, last_purchase),
+    ]
+
+def client_activity_contributions(sale):
+    """
+    Cadência de compra por CNPJ e produto (client_activity/{cnpj}):
+    dias distintos com compra, primeira e última compra. Usado pelo churn (utils/churn).
+    """
+    cnpj = sale.get("client_cnpj")
+    source = sale.get("source")
+    if not cnpj or not source or not sale.get("date"):
+        return []
+    contributions = [
+        (CLIENT_ACTIVITY_COLLECTION, cnpj, ("sources", source, "days"), UNION, day_of(sale["date"])),
+        (CLIENT_ACTIVITY_COLLECTION, cnpj, ("sources", source, "first_ts"), MIN, epoch_of(sale["date"])),
+        (CLIENT_ACTIVITY_COLLECTION, cnpj, ("sources", source, "last_ts"), MAX, epoch_of(sale["date"])),
+        (CLIENT_ACTIVITY_COLLECTION, cnpj, ("client_name",), SET, sale.get("client_name")),
+    ]
+    if sale.get("consultant_uid"):
+        # Vendas órfãs não tiram o cliente da carteira de quem já o tinha
+        contributions.append((CLIENT_ACTIVITY_COLLECTION, cnpj, ("consultant_uid",), LATEST, (epoch_of(sale["date"]), sale["consultant_uid"])))
+    return contributions
+
+def rollup_scope(kind="all", uid=None):
+    """Escopo do rollup mensal: 'all', 'manager_{uid}' ou 'consultant_{uid}'."""
+    return "all" if kind == "all" else f"{kind}_{uid}"
+
+def rollup_scope_for(scope):
+    """Escopo de acesso (utils/data_access.sales_scope) -> escopo do rollup mensal."""
+    if scope[0] == "consultant":
+        return rollup_scope("consultant", scope[1])
+    if scope[0] == "team":
+        return rollup_scope("manager", scope[1]) # Rollups seguem o gestor gravado na venda
+    return rollup_scope()
+
+def monthly_rollup_contributions(sale):
+    """
+    Totais do mês por produto (monthly_rollups/{YYYY-MM}_{escopo}) para a
+    empresa, o gestor e o consultor da venda. Base das tendências de 12/24 meses.
+    """
+    if not sale.get("date"):
+        return []
+    month_id = month_id_of(sale["date"])
+    source = sale.get("source") or "N/A"
+    scopes = [rollup_scope()]
+    if sale.get("manager_uid"):
+        scopes.append(rollup_scope("manager", sale["manager_uid"]))
+    if sale.get("consultant_uid"):
+        scopes.append(rollup_scope("consultant", sale["consultant_uid"]))
+
+    contributions = []
+    for scope in scopes:
+        doc_id = f"{month_id}_{scope}"
+        contributions += [
+            (MONTHLY_ROLLUP_COLLECTION, doc_id, ("month_id",), SET, month_id),
+            (MONTHLY_ROLLUP_COLLECTION, doc_id, ("sources", source, "revenue_net"), INC, float(sale.get("revenue_net") or 0)),
+            (MONTHLY_ROLLUP_COLLECTION, doc_id, ("sources", source, "revenue_gross"), INC, float(sale.get("revenue_gross") or 0)),
+            (MONTHLY_ROLLUP_COLLECTION, doc_id, ("sources", source, "sales"), INC, 1),
+        ]
+    return contributions
+
+# Agregadores aplicados a toda venda gravada
+SALE_AGGREGATORS = [
+    goal_progress_contributions,
+    portfolio_contributions,
+    client_activity_contributions,
+    monthly_rollup_contributions,
+]
+
+def _accumulate(deltas, contributions, sign=1):
+    for collection, doc_id, path, op, value in contributions:
+        fields = deltas.setdefault((collection, doc_id), {})
+        if op == INC:
+            _, current = fields.get(path, (INC, 0))
+            fields[path] = (INC, current + sign * value)
+        elif sign < 0:
+            continue # MAX/MIN/SET/UNION não são revertidos
+        elif op == MAX and path in fields:
+            fields[path] = (MAX, max(fields[path][1], value))
+        elif op == MIN and path in fields:
+            fields[path] = (MIN, min(fields[path][1], value))
+        elif op == LATEST and path in fields:
+            fields[path] = (LATEST, max(fields[path][1], value))
+        elif op == UNION:
+            _, values = fields.get(path, (UNION, set()))
+            values.add(value)
+            fields[path] = (UNION, values)
+        else:
+            fields[path] = (op, value)
+
+def accumulate_sale_deltas(deltas, old_sale, new_sale, aggregators=None):
+    """
+    Soma em 'deltas' a diferença (novo - antigo) das contribuições de uma venda.
+    deltas = { (coleção, doc_id): { ("campo", ...): (operação, valor) } }
+    """
+    for aggregator in aggregators or SALE_AGGREGATORS:
+        if old_sale:
+            _accumulate(deltas, aggregator(old_sale), sign=-1)
+        if new_sale:
+            _accumulate(deltas, aggregator(new_sale))
+    return deltas
+
+def _nest(path, value, target):
+    """Converte ("a", "b", "c") = v em {"a": {"b": {"c": v}}} dentro de 'target'."""
+    node = target
+    for key in path[:-1]:
+        node = node.setdefault(key, {})
+    node[path[-1]] = value
+
+def _latest_ts_path(path):
+    """Campo que guarda a data (epoch) do valor de um LATEST: ("consultant_uid",) -> ("consultant_uid_ts",)."""
+    return path[:-1] + (f"{path[-1]}_ts",)
+
+def _nested_get(data, path):
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+def _to_transform(op, value):
+    from firebase_admin import firestore # Carregado junto com o SDK (get_db), não na importação
+    if op == INC:
+        return firestore.Increment(value) if value else None
+    if op == MAX:
+        return firestore.Maximum(value)
+    if op == MIN:
+        return firestore.Minimum(value)
+    if op == UNION:
+        return firestore.ArrayUnion(sorted(value))
+    return value
+
+# --- CONTADORES DISTRIBUÍDOS (SHARDS) ---
+#
+# Documentos muito disputados (um por mês, tocado por toda venda) limitam
+# cargas paralelas: o Firestore aceita ~1 escrita/s sustentada por documento.
+# Nas coleções abaixo, as somas (INC) vão para {doc}/shards/{0..N-1}, um shard
+# sorteado por lote, e a leitura soma o documento principal com os shards.
+# Os demais campos (SET/MAX/MIN/UNION, metas) continuam no documento principal.
+
+SHARD_SUBCOLLECTION = "shards"
+SHARDED_COLLECTIONS = {
+    GOAL_PROGRESS_COLLECTION: 8,
+    MONTHLY_ROLLUP_COLLECTION: 8,
+}
+
+def shard_refs(collection, doc_id):
+    """Referências de todos os shards de um documento."""
+    db = get_db()
+    parent = db.collection(collection).document(doc_id)
+    return [parent.collection(SHARD_SUBCOLLECTION).document(str(shard)) for shard in range(SHARDED_COLLECTIONS[collection])]
+
+def _merge_shard(target, data):
+    """Soma os números de 'data' em 'target' (dicts aninhados); o resto é copiado."""
+    for key, value in data.items():
+        if isinstance(value, dict):
+            _merge_shard(target.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key in target:
+            target[key] += value
+        else:
+            target[key] = value
+
+def read_sharded_docs(collection, doc_ids):
+    """
+    Lê, em uma chamada, documentos de uma coleção com shards: { doc_id: dict }
+    com os campos do documento principal e as somas já consolidadas.
+    """
+    db = get_db()
+    refs = [db.collection(collection).document(doc_id) for doc_id in doc_ids]
+    for doc_id in doc_ids:
+        refs += shard_refs(collection, doc_id)
+
+    docs = {}
+    for doc in db.get_all(refs):
+        if not doc.exists:
+            continue
+        is_shard = doc.reference.parent.id == SHARD_SUBCOLLECTION
+        doc_id = doc.reference.parent.parent.id if is_shard else doc.id
+        _merge_shard(docs.setdefault(doc_id, {}), doc.to_dict())
+    return docs
+
+def _split_sharded(collection, fields):
+    """Separa os campos de soma (vão para um shard) dos demais (documento principal)."""
+    if collection not in SHARDED_COLLECTIONS:
+        return fields, {}
+    main = {path: item for path, item in fields.items() if item[0] != INC}
+    sums = {path: item for path, item in fields.items() if item[0] == INC}
+    return main, sums
+
+def _commit_writes(writes):
+    """Grava [(referência, payload, merge)] em lotes de até 499 operações."""
+    db = get_db()
+    for start in range(0, len(writes), 499):
+        batch = db.batch()
+        for ref, payload, merge in writes[start:start + 499]:
+            batch.set(ref, payload, merge=merge)
+        batch.commit()
+
+def max_delta_writes(keys):
+    """Limite superior de operações que aggregate_delta_writes gera para estes (coleção, doc_id)."""
+    return sum(2 if collection in SHARDED_COLLECTIONS else 1 for collection, _ in keys)
+
+def _read_latest_guards(deltas, transaction=None):
+    """Datas atuais dos campos LATEST dos deltas: { (coleção, doc_id): dict }."""
+    db = get_db()
+    refs, field_paths = {}, set()
+    for (collection, doc_id), fields in deltas.items():
+        for path, (op, _) in fields.items():
+            if op == LATEST:
+                refs[(collection, doc_id)] = db.collection(collection).document(doc_id)
+                field_paths.add(".".join(_latest_ts_path(path)))
+    if not refs:
+        return {}
+    docs = db.get_all(list(refs.values()), field_paths=sorted(field_paths), transaction=transaction)
+    return {(doc.reference.parent.id, doc.id): doc.to_dict() for doc in docs if doc.exists}
+
+def aggregate_delta_writes(deltas, transaction=None):
+    """
+    Operações [(referência, payload, merge)] que aplicam os deltas com
+    transformações (Increment/Maximum) via set + merge. Quem grava as vendas
+    as inclui no mesmo commit, para vendas e agregados nunca divergirem.
+    Lê (na 'transaction', antes de qualquer gravação) as datas dos campos LATEST.
+    """
+    db = get_db()
+    current = _read_latest_guards(deltas, transaction)
+    writes = []
+    for (collection, doc_id), fields in deltas.items():
+        main_fields, sum_fields = _split_sharded(collection, fields)
+        parts = [(main_fields, db.collection(collection).document(doc_id))]
+        if sum_fields:
+            # Um shard sorteado por lote: cargas paralelas raramente disputam o mesmo
+            parts.append((sum_fields, random.choice(shard_refs(collection, doc_id))))
+        for fields_part, ref in parts:
+            payload = {}
+            for path, (op, value) in fields_part.items():
+                if op == LATEST:
+                    epoch, value = value
+                    stored = _nested_get(current.get((collection, doc_id)), _latest_ts_path(path))
+                    if stored is not None and epoch < stored:
+                        continue # Venda mais antiga que a do valor atual
+                    _nest(_latest_ts_path(path), epoch, payload)
+                transform = _to_transform(op, value)
+                if transform is not None:
+                    _nest(path, transform, payload)
+            if not payload:
+                continue
+            payload["updated_at"] = datetime.now()
+            writes.append((ref, payload, True))
+    return writes
+
+def clear_shards_writes(collection, doc_id):
+    """Operações que zeram os shards de um documento (usadas ao recalcular do zero)."""
+    if collection not in SHARDED_COLLECTIONS:
+        return []
+    return [(ref, {}, False) for ref in shard_refs(collection, doc_id)]
+
+def rebuild_aggregate_docs(sales, aggregator, doc_ids=None):
+    """
+    Recalcula do zero os documentos de um agregador a partir de 'sales'
+    (iterável de vendas) e os sobrescreve. 'doc_ids' limita quais documentos
+    são regravados (os demais gerados pelas vendas são ignorados).
+    Em coleções com shards, as somas vão para o shard 0 e os outros são zerados.
+    """
+    deltas = {}
+    for sale in sales:
+        accumulate_sale_deltas(deltas, None, sale, aggregators=[aggregator])
+
+    db = get_db()
+    writes = []
+    for (collection, doc_id), fields in deltas.items():
+        if doc_ids is not None and doc_id not in doc_ids:
+            continue
+        main_fields, sum_fields = _split_sharded(collection, fields)
+        payload = {"updated_at": datetime.now()}
+        for path, (op, value) in main_fields.items():
+            if op == LATEST:
+                epoch, value = value
+                _nest(_latest_ts_path(path), epoch, payload)
+            _nest(path, sorted(value) if op == UNION else value, payload)
+        writes.append((db.collection(collection).document(doc_id), payload, False))
+
+        shard_writes = clear_shards_writes(collection, doc_id)
+        if shard_writes:
+            shard_payload = {"updated_at": datetime.now()}
+            for path, (_, value) in sum_fields.items():
+                _nest(path, value, shard_payload)
+            shard_writes[0] = (shard_writes[0][0], shard_payload, False)
+        writes += shard_writes
+    _commit_writes(writes)
+    return deltas
+
+def fetch_existing_sales(doc_ids, transaction=None):
+    """Lê (em uma chamada, opcionalmente dentro de uma transação) as vendas já gravadas: { doc_id: dict }."""
+    db = get_db()
+    refs = [db.collection("sales_data").document(doc_id) for doc_id in doc_ids]
+    return {doc.id: doc.to_dict() for doc in db.get_all(refs, transaction=transaction) if doc.exists}
+
+def rebuild_sales_aggregates(sales, consultant_managers):
+    """
+    Recalcula do zero todos os agregados tocados por 'sales' (os meses e os
+    consultores das vendas). Usado quando não se sabe se os deltas dessas
+    vendas foram aplicados.
+    """
+    month_ids = {month_id_of(sale["date"]) for sale in sales if sale.get("date")}
+    consultant_uids = {sale["consultant_uid"] for sale in sales if sale.get("consultant_uid")}
+    for month_id in sorted(month_ids):
+        rebuild_goal_progress(month_id, consultant_managers)
+        rebuild_monthly_rollups(month_id)
+    for consultant_uid in sorted(consultant_uids):
+        rebuild_portfolio_summary(consultant_uid)
+        rebuild_client_activity(consultant_uid)
+
+# --- PROGRESSO DE METAS (goal_progress) ---
+
+def sync_goals_to_progress(month_id, goals, consultant_managers):
+    """
+    Junta as metas ao documento de progresso do mês.
+    goals = { consultant_uid: meta }, consultant_managers = { consultant_uid: manager_uid }
+    A meta do gestor é a soma das metas do time.
+    """
+    manager_goals = {}
+    for uid, goal in goals.items():
+        manager_uid = consultant_managers.get(uid)
+        if manager_uid:
+            manager_goals[manager_uid] = manager_goals.get(manager_uid, 0.0) + goal
+
+    payload = {"consultants": {}, "managers": {}, "updated_at": datetime.now()}
+    for uid, goal in goals.items():
+        payload["consultants"][uid] = {"goal": goal}
+    for manager_uid, goal in manager_goals.items():
+        payload["managers"][manager_uid] = {"goal": goal}
+
+    db = get_db()
+    db.collection(GOAL_PROGRESS_COLLECTION).document(month_id).set(payload, merge=True)
+
+def rebuild_goal_progress(month_id, consultant_managers):
+    """
+    Recalcula do zero o progresso de um mês (carga inicial ou correção),
+    lendo as vendas do mês e as metas cadastradas.
+    """
+    db = get_db()
+    start = datetime.strptime(month_id, "%Y-%m")
+    end = datetime(start.year + (start.month == 12), start.month % 12 + 1, 1)
+    query = db.collection("sales_data").where("date", ">=", start).where("date", "<", end)
+
+    sales = (doc.to_dict() for doc in query.stream())
+    deltas = rebuild_aggregate_docs(sales, goal_progress_contributions, doc_ids={month_id})
+    if (GOAL_PROGRESS_COLLECTION, month_id) not in deltas:
+        # Mês sem vendas atribuídas: zera o documento e os shards
+        _commit_writes(
+            [(db.collection(GOAL_PROGRESS_COLLECTION).document(month_id), {"updated_at": datetime.now()}, False)]
+            + clear_shards_writes(GOAL_PROGRESS_COLLECTION, month_id)
+        )
+
+    goals_doc = db.collection("goals").document(month_id).get()
+    if goals_doc.exists:
+        sync_goals_to_progress(month_id, goals_doc.to_dict(), consultant_managers)
+
+@st.cache_data(ttl=300)
+def get_goal_progress(month_id):
+    """Documento de progresso do mês: { consultants: {...}, managers: {...} }."""
+    data = read_sharded_docs(GOAL_PROGRESS_COLLECTION, [month_id]).get(month_id, {})
+    return {
+        "consultants": data.get("consultants", {}),
+        "managers": data.get("managers", {}),
+    }
+
+# --- RESUMO DE CARTEIRA (portfolio_summary) ---
+
+def rebuild_portfolio_summary(consultant_uid):
+    """
+    Recalcula do zero o resumo de carteira de um consultor (todas as vendas dele).
+    Documentos do consultor que não têm mais vendas (ex: meses de clientes
+    reatribuídos) são apagados.
+    """
+    db = get_db()
+    query = db.collection("sales_data").where("consultant_uid", "==", consultant_uid)
+    sales = (doc.to_dict() for doc in query.stream())
+    deltas = rebuild_aggregate_docs(sales, portfolio_contributions)
+    rebuilt = {doc_id for _, doc_id in deltas}
+
+    # {uid} e {uid}_{YYYY-MM}: os meses vêm de um intervalo de IDs de documento
+    collection = db.collection(PORTFOLIO_COLLECTION)
+    month_docs = collection.where("__name__", ">=", collection.document(f"{consultant_uid}_")) \
+                           .where("__name__", "<", collection.document(f"{consultant_uid}_\uf8ff")) \
+                           .select([]).stream()
+    # len("_YYYY-MM") == 8: ignora IDs de outro consultor que comecem com este uid
+    doc_ids = {doc.id for doc in month_docs if len(doc.id) == len(consultant_uid) + 8} | {consultant_uid}
+    stale = sorted(doc_ids - rebuilt)
+    for start in range(0, len(stale), 499):
+        batch = db.batch()
+        for doc_id in stale[start:start + 499]:
+            batch.delete(collection.document(doc_id))
+        batch.commit()
+
+def rebuild_client_activity(consultant_uid):
+    """
+    Recalcula do zero a cadência de compra dos clientes do consultor.
+    Cada client_activity/{cnpj} é sobrescrito, então é recalculado com TODAS
+    as vendas do CNPJ (de qualquer consultor, órfãs ou de donos anteriores),
+    não só as do consultor.
+    """
+    db = get_db()
+    sales_by_uid = db.collection("sales_data").where("consultant_uid", "==", consultant_uid) \
+                     .select(["client_cnpj"]).stream()
+    activity_by_uid = db.collection(CLIENT_ACTIVITY_COLLECTION).where("consultant_uid", "==", consultant_uid) \
+                        .select(["consultant_uid"]).stream()
+    cnpjs = {doc.to_dict().get("client_cnpj") for doc in sales_by_uid} | {doc.id for doc in activity_by_uid}
+    cnpjs.discard(None)
+
+    for chunk in chunk_list(sorted(cnpjs)):
+        query = db.collection("sales_data").where("client_cnpj", "in", chunk)
+        # O consultor (LATEST) fica o da venda de data mais recente, em qualquer ordem, como na carga
+        sales = (doc.to_dict() for doc in query.stream())
+        deltas = rebuild_aggregate_docs(sales, client_activity_contributions, doc_ids=set(chunk))
+
+        # CNPJs sem nenhuma venda restante: o documento antigo não vale mais
+        stale = set(chunk) - {doc_id for _, doc_id in deltas}
+        if stale:
+            batch = db.batch()
+            for cnpj in stale:
+                batch.delete(db.collection(CLIENT_ACTIVITY_COLLECTION).document(cnpj))
+            batch.commit()
+
+@st.cache_data(ttl=300)
+def get_portfolio_summary(consultant_uid, month_ids):
+    """
+    Lê, em uma chamada, o resumo da carteira e os meses pedidos.
+    Retorna { cnpj: {client_name, last_purchase_ts, revenue_net, sales} }
+    com receita e vendas somadas nos meses de 'month_ids'.
+    """
+    db = get_db()
+    collection = db.collection(PORTFOLIO_COLLECTION)
+    refs = [collection.document(consultant_uid)]
+    refs += [collection.document(f"{consultant_uid}_{month_id}") for month_id in month_ids]
+
+    summary = {}
+    for doc in db.get_all(refs):
+        if not doc.exists:
+            continue
+        for cnpj, data in doc.to_dict().get("clients", {}).items():
+            client = summary.setdefault(cnpj, {"client_name": None, "last_purchase_ts": None, "revenue_net": 0.0, "sales": 0})
+            if doc.id == consultant_uid:
+                client["client_name"] = data.get("client_name")
+                client["last_purchase_ts"] = data.get("last_purchase_ts")
+            else:
+                client["revenue_net"] += data.get("revenue_net", 0)
+                client["sales"] += data.get("sales", 0)
+    return summary
+
+# --- ROLLUPS MENSAIS (monthly_rollups) ---
+
+def rebuild_monthly_rollups(month_id):
+    """
+    Recalcula do zero os rollups de um mês (carga inicial ou correção).
+    Escopos que não têm mais vendas no mês (ex: consultor reatribuído) são apagados.
+    """
+    db = get_db()
+    start = datetime.strptime(month_id, "%Y-%m")
+    end = datetime(start.year + (start.month == 12), start.month % 12 + 1, 1)
+    query = db.collection("sales_data").where("date", ">=", start).where("date", "<", end)
+
+    sales = (doc.to_dict() for doc in query.stream())
+    deltas = rebuild_aggregate_docs(sales, monthly_rollup_contributions)
+    rebuilt = {doc_id for _, doc_id in deltas}
+
+    stale = db.collection(MONTHLY_ROLLUP_COLLECTION).where("month_id", "==", month_id).stream()
+    refs = []
+    for doc in stale:
+        if doc.id not in rebuilt:
+            refs += [doc.reference] + shard_refs(MONTHLY_ROLLUP_COLLECTION, doc.id)
+    for start in range(0, len(refs), 499):
+        batch = db.batch()
+        for ref in refs[start:start + 499]:
+            batch.delete(ref)
+        batch.commit()
+
+@st.cache_data(ttl=300)
+def get_monthly_rollups(scope, month_ids):
+    """
+    Lê, em uma chamada, os rollups do escopo nos meses pedidos (custo fixo:
+    um documento e seus shards por mês, qualquer que seja o volume de vendas).
+    Retorna um DataFrame: month_id, source, revenue_net, revenue_gross, sales.
+    """
+    docs = read_sharded_docs(MONTHLY_ROLLUP_COLLECTION, [f"{month_id}_{scope}" for month_id in month_ids])
+
+    rows = []
+    for doc_id, data in docs.items():
+        month_id = doc_id[:7]
+        for source, totals in data.get("sources", {}).items():
+            rows.append({
+                "month_id": month_id,
+                "source": source,
+                "revenue_net": totals.get("revenue_net", 0.0),
+                "revenue_gross": totals.get("revenue_gross", 0.0),
+                "sales": totals.get("sales", 0),
+            })
+    return pd.DataFrame(rows, columns=["month_id", "source", "revenue_net", "revenue_gross", "sales"])
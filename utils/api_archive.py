@@ -0,0 +1,63 @@
+import pandas as pd
+import gzip
+import json
+import os
+from datetime import datetime
+
+# --- ARQUIVO LOCAL DAS RESPOSTAS DAS APIs ---
+#
+# Cada carga via API guarda a resposta bruta (JSON compactado com gzip) em
+# api_archive/{fonte}_{inicio}_{fim}.json.gz. O modo "replay" reprocessa a
+# partir desse arquivo, sem chamar a API do parceiro de novo.
+
+API_ARCHIVE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "api_archive"))
+
+def archive_key(source):
+    """'Rovema Pay' -> 'rovema_pay' (usado no nome do arquivo)."""
+    return "".join(ch if ch.isalnum() else "_" for ch in source.lower())
+
+def archive_path(source, start_date, end_date):
+    return os.path.join(
+        API_ARCHIVE_DIR,
+        f"{archive_key(source)}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.json.gz"
+    )
+
+def save_api_response(source, start_date, end_date, data):
+    """Grava a resposta bruta da API (substitui a anterior da mesma janela). Retorna o caminho."""
+    os.makedirs(API_ARCHIVE_DIR, exist_ok=True)
+    path = archive_path(source, start_date, end_date)
+    temp_path = f"{path}.tmp"
+    with gzip.open(temp_path, "wt", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, default=str)
+    os.replace(temp_path, path) # Nunca deixa um arquivo pela metade
+    return path
+
+def load_api_response(source, start_date, end_date):
+    """Lê a resposta arquivada da janela, ou None se ela não foi carregada antes."""
+    path = archive_path(source, start_date, end_date)
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        return json.load(file)
+
+def list_api_archives(source=None):
+    """Janelas arquivadas (mais recentes primeiro), opcionalmente de uma fonte."""
+    columns = ["source", "start_date", "end_date", "size_kb", "saved_at"]
+    if not os.path.isdir(API_ARCHIVE_DIR):
+        return pd.DataFrame(columns=columns)
+
+    prefix = f"{archive_key(source)}_" if source else ""
+    rows = []
+    for name in os.listdir(API_ARCHIVE_DIR):
+        if not name.endswith(".json.gz") or not name.startswith(prefix):
+            continue
+        key, start, end = name[:-len(".json.gz")].rsplit("_", 2)
+        path = os.path.join(API_ARCHIVE_DIR, name)
+        rows.append({
+            "source": key,
+            "start_date": datetime.strptime(start, "%Y%m%d").date(),
+            "end_date": datetime.strptime(end, "%Y%m%d").date(),
+            "size_kb": round(os.path.getsize(path) / 1024, 1),
+            "saved_at": datetime.fromtimestamp(os.path.getmtime(path)),
+        })
+    return pd.DataFrame(rows, columns=columns).sort_values("saved_at", ascending=False).reset_index(drop=True)
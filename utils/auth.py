@@ -1,14 +1,72 @@
 import streamlit as st
-# CORREÇÃO: Importa o get_auth_client
-from utils.firebase_config import get_db, get_auth_client
+from utils.firebase_config import get_db
 from utils.logger import log_audit  # <-- Importa a nova função de log
 import time
-import httpx 
+from utils.http_clients import http_client_for
+
+# O ID token do Firebase vale 1 hora: o perfil fica em cache pelo mesmo tempo
+PROFILE_TTL = 3600
+# Renova o token quando faltam menos que estes segundos para expirar
+TOKEN_REFRESH_MARGIN = 300
+# Depois de uma renovação falha, espera isto antes de tentar de novo (o modo ao vivo reroda a cada 5 s)
+TOKEN_REFRESH_RETRY_SECONDS = 60
+
+@st.cache_data(ttl=PROFILE_TTL, show_spinner=False)
+def get_user_profile(user_uid):
+    """Perfil (name, role, manager_uid) do usuário no Firestore, ou None se não existe."""
+    db = get_db()
+    user_doc = db.collection("users").document(user_uid).get()
+    return user_doc.to_dict() if user_doc.exists else None
+
+def _store_session(id_token, refresh_token, expires_in):
+    """Guarda os tokens da sessão e quando o ID token expira (epoch)."""
+    st.session_state.id_token = id_token
+    st.session_state.refresh_token = refresh_token
+    st.session_state.token_expires_at = time.time() + int(expires_in)
+    st.session_state.pop("token_refresh_failed_at", None)
+
+def _apply_profile(user_data_db):
+    st.session_state.user_name = user_data_db.get("name", "Usuário")
+    st.session_state.user_role = user_data_db.get("role", "consultant")
+    st.session_state.manager_uid = user_data_db.get("manager_uid")
+
+def refresh_session():
+    """
+    Troca o refresh token por um novo ID token e relê o perfil do Firestore
+    (sem o cache), para que uma mudança de role valha na renovação.
+    Retorna True se a sessão foi renovada.
+    """
+    refresh_token = st.session_state.get("refresh_token")
+    if not refresh_token:
+        return False
+    try:
+        api_key = st.secrets["firebase_config"]["apiKey"]
+        refresh_url = f"https://securetoken.googleapis.com/v1/token?key={api_key}"
+        response = http_client_for(refresh_url).post(refresh_url, data={
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token
+        })
+        response.raise_for_status()
+        token_data = response.json()
+        get_user_profile.clear(token_data["user_id"])
+        user_data_db = get_user_profile(token_data["user_id"])
+    except Exception as e:
+        # Sem a mensagem completa: a URL da requisição leva a API key
+        status = getattr(getattr(e, "response", None), "status_code", None)
+        log_audit("session_refresh_failed", {"error": type(e).__name__, "status": status})
+        return False
+
+    if user_data_db is None:
+        return False
+    _store_session(token_data["id_token"], token_data["refresh_token"], token_data["expires_in"])
+    _apply_profile(user_data_db)
+    return True
 
 def login_user(email, password):
     """
     Tenta logar o usuário usando a API REST de Autenticação do Firebase.
     """
+    import httpx # Só no envio do formulário: a tela de login abre sem ele
     try:
         # Pega a API Key da configuração web (necessária para a API REST)
         api_key = st.secrets["firebase_config"]["apiKey"]
@@ -23,30 +81,25 @@ def login_user(email, password):
             "returnSecureToken": True
         }
         
-        # Faz a requisição POST
-        with httpx.Client() as client:
-            response = client.post(auth_url, json=payload)
-            response.raise_for_status() # Lança um erro se a requisição falhar (ex: 400)
+        # Faz a requisição POST (cliente compartilhado: reaproveita a conexão TLS)
+        response = http_client_for(auth_url).post(auth_url, json=payload)
+        response.raise_for_status() # Lança um erro se a requisição falhar (ex: 400)
             
         user_data_auth = response.json()
         
         # Se chegou aqui, o login na API foi bem-sucedido
         user_uid = user_data_auth['localId']
         
-        # Após o login, busca os dados (role, name) do usuário no Firestore
-        db = get_db()
-        user_doc = db.collection("users").document(user_uid).get()
+        # Após o login, busca os dados (role, name) do usuário no Firestore (em cache pela vida do token)
+        user_data_db = get_user_profile(user_uid)
         
-        if user_doc.exists:
-            user_data_db = user_doc.to_dict()
-            
+        if user_data_db is not None:
             # Armazena tudo na sessão do Streamlit
             st.session_state.authenticated = True
             st.session_state.user_uid = user_uid
             st.session_state.user_email = user_data_auth['email']
-            st.session_state.user_name = user_data_db.get("name", "Usuário")
-            st.session_state.user_role = user_data_db.get("role", "consultant")
-            st.session_state.manager_uid = user_data_db.get("manager_uid")
+            _apply_profile(user_data_db)
+            _store_session(user_data_auth['idToken'], user_data_auth['refreshToken'], user_data_auth['expiresIn'])
             
             # --- MELHORIA: Log de Auditoria ---
             log_audit(action="login_success", details={"email": email})
@@ -110,6 +163,24 @@ def auth_guard():
         st.error("Acesso negado. Por favor, faça o login.")
         time.sleep(2)
         st.switch_page("Home.py")
+
+    # Renova o token antes de expirar; só desloga se ele já expirou e não foi possível renovar.
+    # Uma falha fica registrada na sessão: antes de expirar, novas tentativas (e seus
+    # registros de auditoria) só depois de TOKEN_REFRESH_RETRY_SECONDS
+    expires_at = st.session_state.get("token_expires_at")
+    now = time.time()
+    if expires_at is not None and now > expires_at - TOKEN_REFRESH_MARGIN:
+        expired = now > expires_at
+        failed_at = st.session_state.get("token_refresh_failed_at")
+        if expired or failed_at is None or now - failed_at >= TOKEN_REFRESH_RETRY_SECONDS:
+            if not refresh_session():
+                if expired:
+                    log_audit(action="session_expired")
+                    st.session_state.clear()
+                    st.error("Sua sessão expirou. Por favor, faça o login novamente.")
+                    time.sleep(2)
+                    st.switch_page("Home.py")
+                st.session_state.token_refresh_failed_at = now
     
     # Exibe o logo e o botão de logout na sidebar de todas as páginas autenticadas
     
@@ -0,0 +1,77 @@
+import streamlit as st
+import pandas as pd
+from statistics import median
+from datetime import datetime, timezone
+from utils.firebase_config import get_db
+from utils.aggregates import CLIENT_ACTIVITY_COLLECTION
+
+# --- DETECÇÃO DE INATIVIDADE (CHURN) ---
+#
+# Lê client_activity/{cnpj} (mantido pela ingestão) e compara, por produto,
+# o tempo desde a última compra com o intervalo usual do cliente.
+
+# Dias distintos de compra necessários para estimar a cadência
+MIN_PURCHASE_DAYS = 3
+# Quantos intervalos recentes entram na mediana
+RECENT_INTERVALS = 12
+# "Bem além do usual": X vezes o intervalo típico...
+RISK_FACTOR = 2.0
+# ...e nunca menos que estes dias sem comprar
+MIN_DAYS_INACTIVE = 7
+
+def score_source_activity(activity, today_ordinal):
+    """
+    Avalia a cadência de um produto para um cliente.
+    Retorna None se não há histórico suficiente, senão um dict com
+    intervalo usual, dias sem comprar e a razão entre eles.
+    """
+    days = sorted(set(activity.get("days", [])))
+    if len(days) < MIN_PURCHASE_DAYS:
+        return None
+    recent = days[-(RECENT_INTERVALS + 1):]
+    intervals = [b - a for a, b in zip(recent, recent[1:])]
+    usual_interval = max(median(intervals), 1)
+    days_since_last = today_ordinal - days[-1]
+    return {
+        "usual_interval": usual_interval,
+        "days_since_last": days_since_last,
+        "risk_ratio": days_since_last / usual_interval,
+        "at_risk": days_since_last >= max(RISK_FACTOR * usual_interval, MIN_DAYS_INACTIVE),
+    }
+
+def score_client(cnpj, data, today_ordinal):
+    """Retorna o produto de maior risco do cliente (ou None se nenhum está em risco)."""
+    worst = None
+    for source, activity in data.get("sources", {}).items():
+        score = score_source_activity(activity, today_ordinal)
+        if score and score["at_risk"] and (worst is None or score["risk_ratio"] > worst["risk_ratio"]):
+            worst = score | {"source": source}
+    if worst is None:
+        return None
+    last_ts = data["sources"][worst["source"]].get("last_ts")
+    return worst | {
+        "cnpj": cnpj,
+        "client_name": data.get("client_name", "N/A"),
+        "last_purchase": datetime.fromtimestamp(last_ts, tz=timezone.utc).replace(tzinfo=None) if last_ts else None,
+    }
+
+@st.cache_data(ttl=600)
+def get_at_risk_clients(consultant_uid):
+    """
+    Lista, do maior para o menor risco, os clientes do consultor que pararam
+    de comprar. Custo proporcional ao número de clientes, não de vendas.
+    """
+    db = get_db()
+    docs = db.collection(CLIENT_ACTIVITY_COLLECTION).where("consultant_uid", "==", consultant_uid).stream()
+    today_ordinal = datetime.now(timezone.utc).toordinal()
+
+    at_risk = []
+    for doc in docs:
+        score = score_client(doc.id, doc.to_dict(), today_ordinal)
+        if score:
+            at_risk.append(score)
+
+    columns = ["cnpj", "client_name", "source", "last_purchase", "days_since_last", "usual_interval", "risk_ratio"]
+    if not at_risk:
+        return pd.DataFrame(columns=columns)
+    return pd.DataFrame(at_risk)[columns].sort_values("risk_ratio", ascending=False).reset_index(drop=True)
@@ -0,0 +1,140 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import unicodedata
+import bisect
+import re
+from utils.firebase_config import get_db
+
+# --- ÍNDICE DE BUSCA DE CLIENTES ---
+#
+# Nomes são normalizados (sem acento, minúsculos) e quebrados em palavras.
+# O índice guarda o vocabulário ordenado (busca por prefixo via bisect),
+# trigramas -> palavras (busca por trecho) e palavra -> linhas (CSR).
+# CNPJs ficam em um array ordenado para busca por prefixo dos dígitos.
+
+NGRAM_SIZE = 3
+
+def normalize_text(text):
+    """Remove acentos, pontuação e caixa: 'São José Ltda.' -> 'sao jose ltda'."""
+    if not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+def _ngrams(token):
+    return {token[i:i + NGRAM_SIZE] for i in range(len(token) - NGRAM_SIZE + 1)}
+
+def build_client_search_index(names, cnpjs):
+    """
+    Monta o índice a partir das listas (mesma ordem) de nomes e CNPJs.
+    Retorna um dict usado por search_clients.
+    """
+    normalized = [normalize_text(name) for name in names]
+
+    # Palavra -> linhas, no formato CSR (linhas ordenadas por palavra)
+    token_of_row = {}
+    for row, name in enumerate(normalized):
+        for token in set(name.split()):
+            token_of_row.setdefault(token, []).append(row)
+    vocab = sorted(token_of_row)
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(token_of_row[token]) for token in vocab])
+    rows = np.fromiter(
+        (row for token in vocab for row in token_of_row[token]),
+        dtype=np.int32,
+        count=int(offsets[-1])
+    )
+
+    # Trigrama -> palavras do vocabulário (bem menor que o número de clientes)
+    ngram_tokens = {}
+    for token_id, token in enumerate(vocab):
+        for gram in _ngrams(token):
+            ngram_tokens.setdefault(gram, []).append(token_id)
+    ngram_tokens = {gram: np.array(ids, dtype=np.int32) for gram, ids in ngram_tokens.items()}
+
+    cnpj_digits = np.array(["".join(filter(str.isdigit, str(cnpj))) for cnpj in cnpjs])
+    cnpj_order = np.argsort(cnpj_digits, kind="stable")
+
+    return {
+        "normalized": normalized,
+        "vocab": vocab,
+        "offsets": offsets,
+        "rows": rows,
+        "ngram_tokens": ngram_tokens,
+        "cnpj_sorted": cnpj_digits[cnpj_order].tolist(),
+        "cnpj_order": cnpj_order,
+    }
+
+def _token_ids_for(index, token):
+    """Palavras do vocabulário que começam com 'token' ou o contêm (via trigramas)."""
+    vocab = index["vocab"]
+    start = bisect.bisect_left(vocab, token)
+    end = bisect.bisect_left(vocab, token + "\uffff")
+    ids = set(range(start, end))
+    if len(token) >= NGRAM_SIZE:
+        candidates = None
+        for gram in _ngrams(token):
+            gram_ids = index["ngram_tokens"].get(gram)
+            if gram_ids is None:
+                return ids
+            candidates = gram_ids if candidates is None else np.intersect1d(candidates, gram_ids, assume_unique=True)
+        ids.update(int(token_id) for token_id in candidates if token in vocab[token_id])
+    return ids
+
+def _rows_for_token(index, token):
+    offsets, rows = index["offsets"], index["rows"]
+    chunks = [rows[offsets[token_id]:offsets[token_id + 1]] for token_id in _token_ids_for(index, token)]
+    if not chunks:
+        return np.array([], dtype=np.int32)
+    return np.unique(np.concatenate(chunks))
+
+def _rows_for_cnpj_prefix(index, digits):
+    cnpj_sorted = index["cnpj_sorted"]
+    start = bisect.bisect_left(cnpj_sorted, digits)
+    end = bisect.bisect_left(cnpj_sorted, digits + "\uffff")
+    return np.sort(index["cnpj_order"][start:end])
+
+def search_clients(index, query):
+    """
+    Busca por nome (sem acento; cada palavra por prefixo ou trecho) ou por
+    dígitos do CNPJ (prefixo). Retorna as posições das linhas encontradas,
+    com os nomes que começam pela busca primeiro.
+    """
+    query_text = normalize_text(query)
+    if not query_text:
+        return np.arange(len(index["normalized"]))
+
+    digits = re.sub(r"\D", "", query)
+    if digits and len(digits) == len(query_text.replace(" ", "")):
+        # Só dígitos (com ou sem máscara): busca por CNPJ
+        return _rows_for_cnpj_prefix(index, digits)
+
+    result = None
+    for token in query_text.split():
+        token_rows = _rows_for_token(index, token)
+        result = token_rows if result is None else np.intersect1d(result, token_rows, assume_unique=True)
+        if result.size == 0:
+            break
+
+    normalized = index["normalized"]
+    starts = np.array([normalized[row].startswith(query_text) for row in result], dtype=bool)
+    return np.concatenate([result[starts], result[~starts]])
+
+@st.cache_resource(ttl=300, show_spinner="Indexando clientes...")
+def get_client_search_data():
+    """
+    Carrega os clientes (apenas os campos usados) e monta o índice de busca.
+    Fica em memória compartilhada do processo; limpe com get_client_search_data.clear().
+    """
+    db = get_db()
+    clients_ref = db.collection("clients").select(["client_name", "consultant_uid"]).stream()
+    clients = [
+        {"cnpj": client.id, "name": data.get("client_name"), "consultant_uid": data.get("consultant_uid")}
+        for client in clients_ref
+        for data in [client.to_dict()]
+    ]
+    df_clients = pd.DataFrame(clients, columns=["cnpj", "name", "consultant_uid"])
+    index = build_client_search_index(df_clients["name"].tolist(), df_clients["cnpj"].tolist())
+    return df_clients, index
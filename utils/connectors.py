@@ -0,0 +1,418 @@
+import streamlit as st
+import pandas as pd
+import httpx # Para chamadas de API
+import asyncio
+import string
+import json
+import urllib.parse # Importado para depuração
+from utils.logger import log_audit
+from utils.http_clients import http_client_for
+from utils.api_archive import save_api_response, load_api_response
+from utils.data_processing import (
+    parse_value_series,
+    clean_cnpj_series,
+    get_client_portfolio_map,
+    batch_write_to_firestore,
+    upload_fingerprint
+)
+
+# --- CONECTORES DE FONTES (PRODUTOS) ---
+#
+# Cada produto é descrito por um dict declarativo:
+#   "columns":       campo unificado -> coluna de origem (ou lista: a primeira preenchida vence)
+#   "status_column" / "valid_statuses": filtro das vendas válidas
+#   "date_format":   formato da coluna 'date'
+#   "money_columns": campos convertidos com clean_value
+#   "id_template":   ID do documento em sales_data, com {Coluna de origem}
+#   "templates":     outros campos montados a partir das colunas de origem
+# Todos passam pelo mesmo pipeline vetorizado (run_pipeline) e pela mesma
+# gravação em lote (batch_write_to_firestore). Um produto novo é só um dict novo.
+
+# Linhas lidas do CSV por vez (o arquivo bruto nunca fica inteiro em memória)
+CSV_CHUNK_ROWS = 100_000
+
+# --- Busca nas APIs ---
+
+async def fetch_eliq(start_date, end_date):
+    """Busca as transações da API ELIQ (Uzzipay/Sigyo). Retorna a lista ou None em caso de erro."""
+    try:
+        creds = st.secrets["api_credentials"]
+        URL_ELIQ = creds["eliq_url"] # Deve ser ".../api/transacoes"
+        api_token = creds["eliq_token"]
+    except KeyError as e:
+        st.error(f"Secret 'api_credentials.{e.args[0]}' não encontrado. Verifique seus Secrets.")
+        return
+    except Exception as e:
+        st.error(f"Erro ao ler Secrets da API: {e}")
+        return
+
+    date_range_str = f"{start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}"
+    params = {
+        "TransacaoSearch[data_cadastro]": date_range_str
+    }
+    headers = {
+        "Authorization": f"Bearer {api_token}"
+    }
+
+    # Log de Depuração
+    full_url_for_log = f"{URL_ELIQ}?{urllib.parse.urlencode(params)}"
+    st.info(f"Tentando chamar a API ELIQ (Abastecimento) no endpoint: {full_url_for_log}")
+
+    try:
+        # Timeout aumentado para 120 segundos. O cliente compartilhado (pool) é
+        # síncrono: roda em uma thread para não bloquear o loop do asyncio.
+        client = http_client_for(URL_ELIQ)
+        response = await asyncio.to_thread(client.get, URL_ELIQ, params=params, headers=headers, timeout=120.0)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        st.error(f"Erro na API ELIQ: {e.response.status_code} - {e.response.text}")
+        st.error(f"O URL completo que falhou foi: {full_url_for_log}")
+    except httpx.TimeoutException:
+        st.error(f"Erro na API ELIQ: O Timeout de 120 segundos foi excedido. A API está muito lenta.")
+    except Exception as e:
+        st.error(f"Erro ao processar dados ELIQ: {e}")
+
+# --- Registro de conectores ---
+
+CONNECTORS = {
+    "bionio": {
+        "kind": "csv",
+        "source": "Bionio",
+        "label": "Bionio",
+        "file_name": "Bionio.csv",
+        "read_options": {"sep": ";", "dtype": str, "encoding": "latin-1"},
+        "status_column": "Status do pedido",
+        "valid_statuses": ["Transferido", "Pago e Agendado"],
+        "columns": {
+            "client_cnpj": "CNPJ da organização",
+            "client_name": "Nome fantasia",
+            "date": "Data do pagamento do pedido",
+            "revenue_gross": "Valor total do pedido",
+            "revenue_net": "Valor total do pedido", # Bionio não tem spread, usamos o valor total
+            "product_name": "Nome do benefício",
+            "status": "Status do pedido",
+            "payment_type": "Tipo de pagamento",
+        },
+        "date_format": "%d/%m/%Y",
+        "money_columns": ["revenue_gross", "revenue_net"],
+        # Bionio_NumeroPedido_DataPagamento
+        "id_template": "BIONIO_{Número do pedido}_{Data do pagamento do pedido}",
+        "templates": {"raw_id": "{Número do pedido}"},
+    },
+    "rovema": {
+        "kind": "csv",
+        "source": "Rovema Pay",
+        "label": "Rovema Pay",
+        "file_name": "RovemaPay.csv",
+        "read_options": {"sep": ";", "dtype": str, "encoding": "latin-1"},
+        "status_column": "Status",
+        "valid_statuses": ["Pago", "Antecipado"],
+        "columns": {
+            "client_cnpj": "CNPJ",
+            "client_name": "EC",
+            "date": "Venda", # Ex: 01/09/2025 07:01:16
+            "revenue_gross": "Bruto",
+            "revenue_net": "Spread", # Métrica de receita: "Spread" é a nossa receita
+            "product_name": "Tipo", # Débito / Crédito
+            "product_detail": "Bandeira", # mastercard, visa
+            "status": "Status",
+        },
+        "date_format": "%d/%m/%Y %H:%M:%S",
+        "money_columns": ["revenue_gross", "revenue_net"],
+        "id_template": "ROVEMA_{ID Venda}_{ID Parcela}",
+        "templates": {"raw_id": "{ID Venda}-{ID Parcela}"},
+    },
+    "asto": {
+        "kind": "api",
+        "source": "ASTO",
+        "label": "ASTO (Logpay)",
+        "secret_caption": ("Usando usuário", "asto_username"),
+        # DESATIVADO até que um endpoint funcional seja fornecido.
+        # Para ativar: informar "fetch", "status_column", "columns" etc., como no ELIQ.
+        "fetch": None,
+        "disabled_title": "Integração ASTO (Manutenção) Pausada",
+        "disabled_message": """
+    Não foi possível carregar os dados do ASTO (Manutenção).
+
+    **Motivo:** Nenhuma das APIs ASTO/Logpay testadas fornece os dados necessários.
+    - A API de Fatura (`.../FaturaPagamentoFechadaApuracao`) funciona, mas **não retorna o CNPJ do Cliente**, impedindo a atribuição.
+    - A API de Transações (`.../ManutencoesAnalitico`) **retorna erro 404** (Não Encontrado).
+
+    **Ação Necessária:** Por favor, entre em contato com o suporte da ASTO/Logpay e solicite um **endpoint de transações analíticas de manutenção** que inclua o `cnpjCliente`, `valor` e `data` de cada transação.
+    """,
+    },
+    "eliq": {
+        "kind": "api",
+        "source": "ELIQ",
+        "label": "ELIQ (Uzzipay)",
+        "secret_caption": ("Usando URL", "eliq_url"),
+        "fetch": fetch_eliq,
+        "status_column": "status",
+        "valid_statuses": ["confirmada"],
+        # O cliente/produto pode vir na raiz ou dentro de 'informacao'
+        "columns": {
+            "client_cnpj": ["cliente.cnpj", "informacao.cliente.cnpj"],
+            "client_name": ["cliente.nome", "informacao.cliente.nome"],
+            "date": "data_cadastro",
+            "revenue_gross": "valor_total",
+            "revenue_net": ["valor_taxa_cliente", "desconto"],
+            "product_name": ["produto.nome", "informacao.produto.nome"],
+            "product_detail": ["produto.categoria", "informacao.produto.categoria"],
+            "volume": "quantidade",
+            "status": "status",
+        },
+        "defaults": {"client_name": "N/A", "product_name": "N/A", "product_detail": "N/A"},
+        "required_columns": ["client_cnpj", "id"], # Sem 'id', as vendas colapsariam em 'ELIQ_'
+        "date_format": "%Y-%m-%d %H:%M:%S",
+        "money_columns": ["revenue_gross", "revenue_net", "volume"],
+        "absolute_columns": ["revenue_net"],
+        "id_template": "ELIQ_{id}",
+        "templates": {"raw_id": "{id}"},
+    },
+}
+
+def get_connectors(kind):
+    """Conectores de um tipo ('csv' ou 'api'), na ordem do registro."""
+    return {connector_id: spec for connector_id, spec in CONNECTORS.items() if spec["kind"] == kind}
+
+# --- Pipeline compartilhado ---
+
+def _coalesce_columns(df, columns):
+    """Primeira coluna preenchida de uma lista de candidatas (colunas ausentes são ignoradas)."""
+    if isinstance(columns, str):
+        columns = [columns]
+    result = pd.Series(pd.NA, index=df.index, dtype=object)
+    for column in columns:
+        if column in df.columns:
+            result = result.where(result.notna(), df[column])
+    return result
+
+def _template_text(values):
+    """Texto de uma coluna para templates: números inteiros vindos como float (ex: IDs de JSON com nulos) saem sem '.0'."""
+    text = values.astype("string")
+    if pd.api.types.is_float_dtype(values):
+        integral = values.notna() & (values % 1 == 0)
+        text[integral] = values[integral].astype("int64").astype("string")
+    return text
+
+def render_template(df, template):
+    """Monta uma coluna de texto a partir de um template ('BIONIO_{Número do pedido}')."""
+    result = pd.Series("", index=df.index, dtype="string")
+    for literal, field, _, _ in string.Formatter().parse(template):
+        if literal:
+            result = result + literal
+        if field is not None:
+            result = result + _template_text(df[field]).fillna("")
+    return result
+
+def filter_status(connector, df_raw):
+    """Mantém apenas as vendas com status válido (se o conector define um filtro)."""
+    status_column = connector.get("status_column")
+    if not status_column:
+        return df_raw
+    return df_raw[df_raw[status_column].isin(connector["valid_statuses"])]
+
+# Motivos de rejeição (dead-letter)
+REJECT_MISSING = "{field}_ausente"
+REJECT_INVALID_DATE = "data_invalida"
+REJECT_INVALID_VALUE = "valor_invalido"
+DEAD_LETTER_COLUMNS = ["row", "doc_id", "reason", "field", "value"]
+
+def transform_frame(connector, df):
+    """
+    Converte um DataFrame bruto (já filtrado) no formato unificado de sales_data, sem loop por linha.
+    Retorna (vendas_validas, rejeitadas): as rejeitadas saem da mesma passada, com o
+    motivo, o campo e o valor original (a primeira regra violada vence).
+    """
+    sales = pd.DataFrame(index=df.index)
+    for field, columns in connector["columns"].items():
+        sales[field] = _coalesce_columns(df, columns)
+    for field, default in connector.get("defaults", {}).items():
+        sales[field] = sales[field].fillna(default)
+
+    reason = pd.Series(pd.NA, index=df.index, dtype="string")
+    failed_field = pd.Series(pd.NA, index=df.index, dtype="string")
+    failed_value = pd.Series(pd.NA, index=df.index, dtype="string")
+
+    def reject(failed, code, field, raw_values):
+        new = reason.isna() & failed
+        reason[new] = code
+        failed_field[new] = field
+        failed_value[new] = raw_values[new].astype("string")
+
+    for field in connector.get("required_columns", []):
+        # Campo do formato unificado ou coluna bruta (ex: a usada no id_template)
+        values = sales[field] if field in sales.columns else _coalesce_columns(df, field)
+        reject(values.isna(), REJECT_MISSING.format(field=field), field, values)
+
+    sales["source"] = connector["source"]
+    sales["client_cnpj"] = clean_cnpj_series(sales["client_cnpj"])
+
+    raw_dates = sales["date"]
+    sales["date"] = pd.to_datetime(raw_dates, format=connector["date_format"], errors="coerce")
+    reject(sales["date"].isna(), REJECT_INVALID_DATE, "date", raw_dates)
+
+    for field in connector.get("money_columns", []):
+        raw_values = sales[field]
+        sales[field], invalid = parse_value_series(raw_values)
+        reject(invalid, REJECT_INVALID_VALUE, field, raw_values)
+    for field in connector.get("absolute_columns", []):
+        sales[field] = sales[field].abs()
+
+    # '/' não é permitido em IDs do Firestore (ex: datas dd/mm/aaaa)
+    sales["doc_id"] = render_template(df, connector["id_template"]).str.replace("/", "-", regex=False)
+    for field, template in connector.get("templates", {}).items():
+        sales[field] = render_template(df, template)
+
+    rejected_mask = reason.notna()
+    rejected = pd.DataFrame({
+        "row": df.index[rejected_mask] + 1, # Linha de dados no arquivo/resposta (1 = primeira)
+        "doc_id": sales["doc_id"][rejected_mask],
+        "reason": reason[rejected_mask],
+        "field": failed_field[rejected_mask],
+        "value": failed_value[rejected_mask],
+    }, columns=DEAD_LETTER_COLUMNS)
+    return sales[~rejected_mask], rejected
+
+def attribute_sales(sales):
+    """Mapeia as vendas (via CNPJ) ao consultor/gestor da carteira. Sem dono = venda órfã."""
+    portfolio = pd.DataFrame.from_dict(get_client_portfolio_map(), orient="index")
+    portfolio = portfolio.reindex(columns=["consultant_uid", "manager_uid"])
+    return sales.join(portfolio, on="client_cnpj")
+
+def frame_to_records(sales):
+    """{ doc_id: registro } para batch_write_to_firestore (última ocorrência de um ID vence)."""
+    sales = sales.drop_duplicates(subset="doc_id", keep="last")
+    values = sales.drop(columns="doc_id").astype(object)
+    values = values.where(values.notna(), None)
+    return dict(zip(sales["doc_id"], values.to_dict("records")))
+
+def build_dead_letter(rejected_parts):
+    """Junta as rejeições dos pedaços em uma tabela compacta (motivo e campo como categorias)."""
+    parts = [part for part in rejected_parts if not part.empty]
+    if not parts:
+        return pd.DataFrame(columns=DEAD_LETTER_COLUMNS)
+    rejected = pd.concat(parts, ignore_index=True)
+    return rejected.astype({"reason": "category", "field": "category"})
+
+def run_pipeline(connector, frames, audit_action, audit_details=None, checkpoint_id=None):
+    """
+    Processa os DataFrames brutos (pedaços do CSV ou resposta da API):
+    filtro de status -> limpeza -> IDs -> atribuição -> gravação em lote -> auditoria.
+    'checkpoint_id' (impressão digital da carga) permite retomar uma gravação interrompida.
+    Retorna (salvos, órfãs, rejeitadas_df) ou None em caso de erro de leitura.
+    """
+    label = connector["label"]
+    rows_found = 0
+    rows_processed = 0
+    parts = []
+    rejected_parts = []
+    try:
+        for df_raw in frames:
+            rows_found += len(df_raw)
+            df_valid = filter_status(connector, df_raw)
+            rows_processed += len(df_valid)
+            if not df_valid.empty:
+                sales_part, rejected_part = transform_frame(connector, df_valid)
+                parts.append(sales_part)
+                rejected_parts.append(rejected_part)
+    except Exception as e:
+        st.error(f"Erro ao ler os dados de {label}: {e}")
+        return
+
+    df_rejected = build_dead_letter(rejected_parts)
+
+    statuses = " ou ".join(f"'{status}'" for status in connector.get("valid_statuses", []))
+    st.write(f"{label}: {rows_found} linhas encontradas.")
+    st.write(f"{rows_processed} registros de vendas válidas ({statuses}).")
+
+    if not df_rejected.empty:
+        st.write(f"{len(df_rejected)} registros rejeitados (veja o relatório abaixo).")
+
+    if rows_processed == len(df_rejected):
+        st.warning("Nenhum registro de venda válida encontrado.")
+        return 0, 0, df_rejected # Retorna zero para não dar erro na página admin
+
+    sales = attribute_sales(pd.concat(parts, ignore_index=True))
+    total_saved, total_orphans = batch_write_to_firestore(frame_to_records(sales), checkpoint_id=checkpoint_id)
+
+    log_audit(
+        action=audit_action,
+        details={
+            "product": label,
+            **(audit_details or {}),
+            "fingerprint": checkpoint_id,
+            "rows_found": rows_found,
+            "rows_processed": rows_processed,
+            "rows_saved": total_saved,
+            "rows_orphaned": total_orphans,
+            "rows_rejected": len(df_rejected),
+            "rejected_by_reason": {str(reason): int(count) for reason, count in df_rejected["reason"].value_counts().items()}
+        }
+    )
+
+    return total_saved, total_orphans, df_rejected
+
+def run_csv_connector(connector, uploaded_file):
+    """
+    Processa um CSV de produto, lendo o arquivo em pedaços.
+    Reenviar o mesmo arquivo após uma falha continua do último lote gravado.
+    """
+    fingerprint = upload_fingerprint(connector["source"], uploaded_file.getvalue())
+    try:
+        uploaded_file.seek(0)
+        reader = pd.read_csv(uploaded_file, chunksize=CSV_CHUNK_ROWS, **connector["read_options"])
+    except Exception as e:
+        st.error(f"Erro ao ler o CSV: {e}")
+        return
+    return run_pipeline(connector, reader, audit_action="upload_csv", checkpoint_id=fingerprint)
+
+async def run_api_connector(connector, start_date, end_date, replay=False):
+    """
+    Busca o período na API do produto e processa pelo pipeline compartilhado.
+    A resposta bruta fica arquivada em disco; com replay=True o período é
+    reprocessado a partir desse arquivo, sem acessar a rede.
+    """
+    if connector.get("fetch") is None:
+        # Conector ainda sem endpoint funcional
+        st.error(connector["disabled_title"])
+        st.warning(connector["disabled_message"])
+        return 0, 0, build_dead_letter([])
+
+    if replay:
+        data = load_api_response(connector["source"], start_date, end_date)
+        if data is None:
+            st.error(f"Nenhuma resposta arquivada de {connector['label']} para este período. Faça uma carga normal primeiro.")
+            return
+        st.info(f"Reprocessando {len(data)} registros arquivados (sem chamar a API).")
+    else:
+        data = await connector["fetch"](start_date, end_date)
+        if data is None:
+            return # Erro já exibido pela busca
+        try:
+            save_api_response(connector["source"], start_date, end_date, data)
+        except OSError as e:
+            st.warning(f"Não foi possível arquivar a resposta da API: {e}")
+
+    if not data:
+        st.warning(f"Nenhum dado retornado pela API {connector['label']} para o período.")
+        return 0, 0, build_dead_letter([])
+
+    # Mesma janela com a mesma resposta = mesma carga (pode ser retomada)
+    window = f"{start_date:%Y%m%d}_{end_date:%Y%m%d}"
+    content = json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+    try:
+        return run_pipeline(
+            connector,
+            [pd.json_normalize(data)],
+            audit_action="load_api",
+            audit_details={
+                "start_date": start_date.strftime("%Y-%m-%d"),
+                "end_date": end_date.strftime("%Y-%m-%d"),
+                "replay": replay,
+            },
+            checkpoint_id=upload_fingerprint(f"{connector['source']}_{window}", content)
+        )
+    except Exception as e:
+        st.error(f"Erro ao processar dados {connector['label']}: {e}")
@@ -0,0 +1,75 @@
+import streamlit as st
+import numpy as np
+
+# Quantas combinações de filtros ficam memorizadas por sessão
+MAX_CACHED_VIEWS = 8
+
+def _get_view_cache():
+    return st.session_state.setdefault("dashboard_view_cache", {})
+
+def make_view_key(version, sources):
+    """Chave da visão: (versão do conjunto carregado, filtros aplicados)."""
+    return (version, tuple(sorted(sources or [])))
+
+def build_filter_mask(df, sources):
+    """
+    Máscara booleana dos filtros pós-query (sem copiar o DataFrame).
+    Só o produto: o escopo de acesso (gestor/consultor) já vem filtrado na consulta.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    if df.empty:
+        return mask
+    if sources:
+        mask &= df['source'].isin(sources).to_numpy()
+    return mask
+
+def _build_view(df, mask):
+    """Calcula agregados e figuras apenas com as colunas necessárias."""
+    view = {"mask": mask, "rows": int(mask.sum())}
+    if view["rows"] == 0:
+        return view
+    import plotly.express as px # Só quando há gráfico para montar (importação pesada)
+
+    by_source = df.loc[mask, ['source', 'revenue_net']].groupby("source")['revenue_net'].sum().reset_index()
+    fig_source = px.pie(
+        by_source,
+        names="source",
+        values="revenue_net",
+        title="Receita Líquida (R$) por Fonte",
+        hole=0.3
+    )
+    fig_source.update_traces(textposition='inside', textinfo='percent+label')
+
+    by_product = df.loc[mask, ['product_name', 'revenue_net']].groupby('product_name')['revenue_net'].sum()
+
+    by_day = df.loc[mask, ['date', 'revenue_net']].resample('D', on='date')['revenue_net'].sum().reset_index()
+    fig_time = px.area(
+        by_day,
+        x="date",
+        y="revenue_net",
+        title="Receita Líquida ao Longo do Tempo"
+    )
+
+    view.update({
+        "fig_source": fig_source,
+        "fig_time": fig_time,
+        "bottom_products": by_product.nsmallest(5).reset_index(),
+        "top_products": by_product.nlargest(5).reset_index(),
+    })
+    return view
+
+def get_dashboard_view(df, version, sources):
+    """
+    Retorna a visão memorizada para (versão, filtros). Trocar filtros já vistos
+    não recalcula groupbys, resample nem figuras.
+    """
+    cache = _get_view_cache()
+    key = make_view_key(version, sources)
+    if key not in cache:
+        # Visões de conjuntos antigos não servem mais
+        for old_key in [k for k in cache if k[0] != version]:
+            del cache[old_key]
+        while len(cache) >= MAX_CACHED_VIEWS:
+            del cache[next(iter(cache))]
+        cache[key] = _build_view(df, build_filter_mask(df, sources))
+    return cache[key]
@@ -0,0 +1,321 @@
+import streamlit as st
+import pandas as pd
+from utils.firebase_config import get_db
+from utils.frame_cache import get_sales_frame_cache
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+# Limite do operador "in" do Firestore (valores por consulta)
+FIRESTORE_IN_LIMIT = 30
+# Máximo de consultas paralelas ao Firestore por carga
+MAX_PARALLEL_QUERIES = 8
+# Validade dos segmentos de vendas no cache: dias já fechados mudam só com
+# uma carga (que limpa os caches); o segmento que inclui hoje expira mais cedo
+CLOSED_SEGMENT_TTL = 6 * 3600
+OPEN_SEGMENT_TTL = 600
+
+# --- HIERARQUIA DE TIMES (users) ---
+
+@st.cache_data(ttl=300) # Cache de 5 minutos para a hierarquia
+def get_team_hierarchy():
+    """
+    Busca a coleção 'users' e monta o mapa:
+    { "manager_uid": ["consultant_uid", ...] }
+    É a fonte da verdade para os times (não o manager_uid gravado nas vendas).
+    """
+    db = get_db()
+    users_ref = db.collection("users").where("role", "==", "consultant").stream()
+    hierarchy = {}
+    for user in users_ref:
+        manager_uid = user.to_dict().get("manager_uid")
+        if manager_uid:
+            hierarchy.setdefault(manager_uid, []).append(user.id)
+    return hierarchy
+
+@st.cache_data(ttl=600)
+def get_users_frame():
+    """Usuários (uid, name, role, manager_uid) para filtros e metas."""
+    db = get_db()
+    users_ref = db.collection("users").stream()
+    users = []
+    for user in users_ref:
+        data = user.to_dict()
+        users.append({
+            "uid": user.id,
+            "name": data.get("name", "N/A"),
+            "role": data.get("role", "N/A"),
+            "manager_uid": data.get("manager_uid")
+        })
+
+    return pd.DataFrame(users)
+
+def get_team_uids(manager_uid):
+    """Retorna a lista (ordenada) de consultores do time de um gestor."""
+    return sorted(get_team_hierarchy().get(manager_uid, []))
+
+def chunk_list(values, size=FIRESTORE_IN_LIMIT):
+    """Divide uma lista em pedaços de no máximo 'size' itens."""
+    values = list(values)
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+# --- CONSULTAS DE VENDAS ---
+
+def build_team_queries(base_query, consultant_uids, chunk_size=FIRESTORE_IN_LIMIT):
+    """
+    Gera uma consulta por lote de consultores (consultant_uid in [...]),
+    respeitando o limite do operador "in" do Firestore.
+    """
+    return [
+        base_query.where("consultant_uid", "in", chunk)
+        for chunk in chunk_list(consultant_uids, max(chunk_size, 1))
+    ]
+
+def get_previous_period(start_date, end_date):
+    """Retorna (início, fim) do período anterior de mesma duração."""
+    period_days = (end_date - start_date).days
+    prev_end_date = start_date - timedelta(days=1)
+    prev_start_date = prev_end_date - timedelta(days=period_days)
+    return prev_start_date, prev_end_date
+
+# --- ESCOPO DE ACESSO (segurança por linha) ---
+#
+# Toda leitura de vendas/clientes passa por um escopo: a tupla com o que o
+# usuário pode ver, já reduzida pelos filtros escolhidos. É também a chave
+# de cache dos loaders (mesmo escopo = mesma entrada, em qualquer página).
+#   ("consultant", uid)                  -> vendas de um consultor
+#   ("team", manager_uid, team_mode)     -> time de um gestor (hierarquia atual se team_mode)
+#   ("all",)                             -> empresa inteira (só admin)
+
+def sales_scope(role, uid, manager_uid_filter=None, team_mode=False, consultant_uid=None):
+    """
+    Compila (papel, uid, filtros) no escopo mais estreito permitido.
+    Consultor: sempre ele mesmo (filtros ignorados). Gestor: o time ou um
+    consultor do time ('manager_uid_filter'). Admin: empresa, um gestor
+    ('manager_uid_filter') ou um consultor ('consultant_uid').
+    Levanta PermissionError se o filtro sai do alcance do papel.
+    """
+    if role == 'consultant':
+        return ("consultant", uid)
+    if role == 'manager':
+        if manager_uid_filter:
+            if manager_uid_filter not in get_team_uids(uid):
+                raise PermissionError("Consultor fora do seu time.")
+            return ("consultant", manager_uid_filter)
+        return ("team", uid, bool(team_mode))
+    if role == 'admin':
+        if consultant_uid:
+            return ("consultant", consultant_uid)
+        if manager_uid_filter:
+            return ("team", manager_uid_filter, bool(team_mode))
+        return ("all",)
+    raise PermissionError(f"Papel sem acesso às vendas: {role}")
+
+def scope_consultant_uid(scope):
+    """UID do consultor de um escopo individual (ou None para time/empresa)."""
+    return scope[1] if scope[0] == "consultant" else None
+
+def scope_queries(base_query, scope, chunk_size=FIRESTORE_IN_LIMIT):
+    """
+    Restringe 'base_query' (de qualquer coleção com consultant_uid/manager_uid)
+    ao escopo. Retorna uma lista: o time pela hierarquia vira consultas em lotes.
+    """
+    if scope[0] == "consultant":
+        return [base_query.where("consultant_uid", "==", scope[1])]
+    if scope[0] == "team":
+        _, manager_uid, team_mode = scope
+        if team_mode:
+            # Time resolvido pela hierarquia atual (consultas em lotes, em paralelo)
+            return build_team_queries(base_query, get_team_uids(manager_uid), chunk_size)
+        return [base_query.where("manager_uid", "==", manager_uid)]
+    return [base_query]
+
+def build_scope_queries(start_date, end_date, scope, sources=None):
+    """
+    Monta as consultas de 'sales_data' do período para o escopo.
+    'sources' é um filtro opcional aplicado no servidor.
+    """
+    db = get_db()
+    start_ts = datetime.combine(start_date, datetime.min.time())
+    end_ts = datetime.combine(end_date, datetime.max.time())
+    query = db.collection("sales_data").where("date", ">=", start_ts).where("date", "<=", end_ts)
+    if sources:
+        query = query.where("source", "in", list(sources))
+    # Cada "in" multiplica as disjunções, então o lote do time encolhe com os produtos
+    chunk_size = FIRESTORE_IN_LIMIT // max(len(sources or []), 1)
+    return scope_queries(query, scope, chunk_size)
+
+def build_sales_queries(start_date, end_date, role, uid, manager_uid_filter=None,
+                        team_mode=False, sources=None, consultant_uid=None):
+    """Atalho: compila o escopo e monta as consultas do período (ver sales_scope)."""
+    scope = sales_scope(role, uid, manager_uid_filter, team_mode, consultant_uid)
+    return build_scope_queries(start_date, end_date, scope, sources)
+
+def _stream_to_dicts(query):
+    return [doc.to_dict() for doc in query.stream()]
+
+def stream_queries(queries):
+    """
+    Executa várias consultas em paralelo e junta os resultados em um DataFrame.
+    """
+    if not queries:
+        return pd.DataFrame()
+    if len(queries) == 1:
+        data = _stream_to_dicts(queries[0])
+    else:
+        workers = min(MAX_PARALLEL_QUERIES, len(queries))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_stream_to_dicts, queries)
+            data = [row for rows in results for row in rows]
+    if not data:
+        return pd.DataFrame()
+    return pd.DataFrame(data)
+
+# --- AGREGAÇÕES NO SERVIDOR (count/sum) ---
+
+def _aggregate_query(query):
+    aggregate = query.count(alias="sales") \
+                     .sum("revenue_net", alias="revenue_net") \
+                     .sum("revenue_gross", alias="revenue_gross")
+    totals = {}
+    for result in aggregate.get()[0]:
+        totals[result.alias] = result.value or 0
+    return totals
+
+def aggregate_sales(*query_groups):
+    """
+    Executa count()/sum() no Firestore (sem baixar documentos).
+    Cada argumento é uma lista de consultas cujos resultados são somados;
+    todos os grupos rodam em paralelo (uma ida ao servidor). Retorna, por grupo:
+    { "sales": int, "revenue_net": float, "revenue_gross": float }
+    """
+    tagged = [(group_idx, query) for group_idx, queries in enumerate(query_groups) for query in queries]
+    totals = [{"sales": 0, "revenue_net": 0.0, "revenue_gross": 0.0} for _ in query_groups]
+    if tagged:
+        workers = min(MAX_PARALLEL_QUERIES, len(tagged))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            partials = executor.map(lambda item: _aggregate_query(item[1]), tagged)
+            for (group_idx, _), partial in zip(tagged, partials):
+                for key in totals[group_idx]:
+                    totals[group_idx][key] += partial.get(key, 0)
+    for group_totals in totals:
+        group_totals["sales"] = int(group_totals["sales"])
+    return totals[0] if len(totals) == 1 else totals
+
+# --- JANELAS E SEGMENTOS (chaves de cache estáveis) ---
+#
+# Um período qualquer é dividido em segmentos reutilizáveis: meses inteiros
+# (ou o mês corrente até hoje) e, nas pontas, dias avulsos. Cada segmento
+# tem sua própria entrada de cache, então períodos que se sobrepõem
+# (ex: "este mês" e "últimos 45 dias") só buscam os segmentos que faltam.
+
+def normalize_window(start_date, end_date):
+    """Datas (sem hora) do período: datetime.now() e date.today() geram a mesma chave."""
+    if isinstance(start_date, datetime):
+        start_date = start_date.date()
+    if isinstance(end_date, datetime):
+        end_date = end_date.date()
+    return start_date, end_date
+
+def month_end(day):
+    """Último dia do mês de 'day'."""
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+def split_window(start_date, end_date, today=None):
+    """
+    [(início, fim)] dos segmentos que cobrem o período: um por mês quando o
+    período cobre o mês inteiro (até hoje, no mês corrente), senão um por dia.
+    """
+    today = today or date.today()
+    segments = []
+    day = start_date
+    while day <= end_date:
+        last_day = month_end(day)
+        if day.day == 1 and end_date >= min(last_day, today):
+            segment_end = min(last_day, end_date)
+        else:
+            segment_end = day
+        segments.append((day, segment_end))
+        day = segment_end + timedelta(days=1)
+    return segments
+
+def load_sales_segment(segment, scope):
+    """
+    Vendas de um segmento, pelo cache com orçamento de memória (utils/frame_cache).
+    Erros sobem para quem montou o período (nada é guardado).
+    """
+    start_date, end_date = segment
+    ttl = CLOSED_SEGMENT_TTL if end_date < date.today() else OPEN_SEGMENT_TTL
+    return get_sales_frame_cache().get_or_load(
+        (start_date, end_date, scope),
+        lambda: stream_queries(build_scope_queries(start_date, end_date, scope)),
+        ttl
+    )
+
+# --- CARGAS EM CACHE (compartilhadas entre páginas e pelo aquecimento) ---
+
+def load_sales_frame(start_date, end_date, scope):
+    """
+    Vendas do período dentro do escopo (ver sales_scope), montadas a partir
+    dos segmentos em cache; só os segmentos ausentes vão ao Firestore.
+    A comparação com o período anterior vem das agregações (load_sales_kpis),
+    então apenas o período atual é baixado.
+    """
+    start_date, end_date = normalize_window(start_date, end_date)
+    segments = split_window(start_date, end_date)
+    try:
+        if len(segments) == 1:
+            frames = [load_sales_segment(segments[0], scope)]
+        else:
+            workers = min(MAX_PARALLEL_QUERIES, len(segments))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                frames = list(executor.map(lambda segment: load_sales_segment(segment, scope), segments))
+    except Exception as e:
+        st.error(f"Erro ao consultar o Firestore: {e}")
+        return pd.DataFrame()
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+def load_sales_kpis(start_date, end_date, scope, sources=()):
+    """
+    KPIs do período atual e do anterior via agregação no servidor (count/sum),
+    sem baixar os documentos de vendas. O período é normalizado para datas.
+    Em caso de erro devolve zeros, mas nada é guardado no cache.
+    """
+    start_date, end_date = normalize_window(start_date, end_date)
+    try:
+        return _load_sales_kpis(start_date, end_date, scope, tuple(sources))
+    except Exception as e:
+        st.error(f"Erro ao consultar os KPIs no Firestore: {e}")
+        empty = {"sales": 0, "revenue_net": 0.0, "revenue_gross": 0.0}
+        return empty, dict(empty), get_previous_period(start_date, end_date)
+
+@st.cache_data(ttl=600)
+def _load_sales_kpis(start_date, end_date, scope, sources):
+    # Erros sobem: o st.cache_data não guarda exceções (uma falha passageira não vira zeros por 10 min)
+    prev_start_date, prev_end_date = get_previous_period(start_date, end_date)
+    current, previous = aggregate_sales(
+        build_scope_queries(start_date, end_date, scope, sources),
+        build_scope_queries(prev_start_date, prev_end_date, scope, sources)
+    )
+    return current, previous, (prev_start_date, prev_end_date)
+
+# --- CARTEIRA (clients) ---
+
+@st.cache_data(ttl=600)
+def load_clients_frame(scope):
+    """Clientes (cnpj, name, consultant_uid, manager_uid) da carteira do escopo."""
+    db = get_db()
+    base_query = db.collection("clients").select(["client_name", "consultant_uid", "manager_uid"])
+    clients = []
+    for query in scope_queries(base_query, scope):
+        for client in query.stream():
+            data = client.to_dict()
+            clients.append({
+                "cnpj": client.id,
+                "name": data.get("client_name", "N/A"),
+                "consultant_uid": data.get("consultant_uid"),
+                "manager_uid": data.get("manager_uid")
+            })
+    return pd.DataFrame(clients, columns=["cnpj", "name", "consultant_uid", "manager_uid"])
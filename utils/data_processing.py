@@ -1,12 +1,16 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from utils.firebase_config import get_db
 from utils.logger import log_audit  # Importa a nova função de log
-import httpx # Para chamadas de API
+from utils.aggregates import fetch_existing_sales, accumulate_sale_deltas, aggregate_delta_writes, max_delta_writes, rebuild_sales_aggregates
+from utils.data_access import get_users_frame
+from utils.client_search import get_client_search_data
+from utils.warmup import start_warmup
 from datetime import datetime
-import urllib.parse # Importado para depuração
 import time # IMPORTADO PARA O SLEEP
-import json # IMPORTADO PARA DEBUG DO ASTO
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # --- FUNÇÕES DE LIMPEZA (ETL) ---
 
@@ -43,6 +47,64 @@ def clean_cnpj(cnpj_str):
     cleaned_cnpj = "".join(filter(str.isdigit, cnpj_str))
     return cleaned_cnpj.zfill(14) # Garante que tem 14 dígitos
 
+CNPJ_WEIGHTS_1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+CNPJ_WEIGHTS_2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+def parse_value_series(values):
+    """
+    Versão vetorizada de clean_value: strings no formato BR e números na mesma coluna.
+    Retorna (valores, invalidos): vazios viram 0.0; 'invalidos' marca os valores
+    preenchidos que não são números (que clean_value transformaria em 0.0 sem aviso).
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float).fillna(0.0), pd.Series(False, index=values.index)
+    is_text = values.map(type) == str
+    text = values.where(is_text).astype("string").str.strip()
+    text = text.str.replace("R$", "", regex=False).str.replace("%", "", regex=False)
+    text = text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False) # 1.000,00 -> 1000.00
+    parsed = pd.to_numeric(text, errors="coerce").astype(float)
+    numbers = pd.to_numeric(values.where(~is_text), errors="coerce").astype(float)
+    result = parsed.where(is_text, numbers)
+    empty = values.isna() | (is_text & text.eq("").fillna(False).astype(bool))
+    return result.fillna(0.0), result.isna() & ~empty
+
+def clean_value_series(values):
+    """Versão vetorizada de clean_value (valores inválidos viram 0.0)."""
+    return parse_value_series(values)[0]
+
+def clean_cnpj_series(cnpj_series):
+    """Versão vetorizada de clean_cnpj: só dígitos, completando 14 com zeros à esquerda."""
+    text = cnpj_series.astype("string")
+    # Remove cotações (ex: "3,96829E+12")
+    scientific = text.str.contains("E", case=False, regex=False).fillna(False).astype(bool)
+    if scientific.any():
+        numbers = pd.to_numeric(text[scientific].str.replace(",", ".", regex=False), errors="coerce").dropna()
+        text.loc[numbers.index] = numbers.map("{:.0f}".format)
+    return text.str.replace(r"\D", "", regex=True).str.zfill(14)
+
+def validate_cnpj_series(cnpj_series):
+    """
+    Valida CNPJs já limpos (14 dígitos) de uma vez, pelos dígitos verificadores.
+    Retorna uma Series booleana.
+    """
+    valid = cnpj_series.notna() & cnpj_series.str.fullmatch(r"\d{14}").fillna(False)
+    if not valid.any():
+        return valid
+
+    digits = np.frombuffer(
+        "".join(cnpj_series[valid]).encode("ascii"), dtype=np.uint8
+    ).reshape(-1, 14).astype(np.int64) - ord("0")
+
+    def check_digit(values, weights):
+        remainder = (values * weights).sum(axis=1) % 11
+        return np.where(remainder < 2, 0, 11 - remainder)
+
+    ok = (check_digit(digits[:, :12], CNPJ_WEIGHTS_1) == digits[:, 12]) & \
+         (check_digit(digits[:, :13], CNPJ_WEIGHTS_2) == digits[:, 13]) & \
+         ~(digits == digits[:, :1]).all(axis=1) # "00000000000000", "11111111111111"...
+    valid.loc[valid] = ok
+    return valid
+
 
 # --- MAPPER DE CARTEIRA (O CORAÇÃO DO SISTEMA) ---
 
@@ -65,356 +127,314 @@ def get_client_portfolio_map():
         }
     return client_map
 
-def map_sale_to_consultant(cnpj):
-    """Mapeia uma venda (via CNPJ) ao consultor/gestor."""
-    client_map = get_client_portfolio_map() # Usa o mapa em cache
-    cnpj_limpo = clean_cnpj(cnpj)
-    
-    if cnpj_limpo in client_map:
-        return client_map[cnpj_limpo]["consultant_uid"], client_map[cnpj_limpo]["manager_uid"]
-    else:
-        return None, None # Venda "Órfã"
+# --- FUNÇÕES DE CARGA (GRAVAÇÃO COMPARTILHADA PELOS CONECTORES) ---
 
-# --- FUNÇÕES DE CARGA (POR PRODUTO) ---
+# Checkpoints das cargas: import_checkpoints/{fingerprint}
+IMPORT_CHECKPOINTS_COLLECTION = "import_checkpoints"
 
-def batch_write_to_firestore(records):
-    """Escreve os registros em lotes no Firestore."""
+def upload_fingerprint(source, content):
+    """Impressão digital de uma carga (fonte + conteúdo bruto em bytes)."""
+    digest = hashlib.sha256(source.encode("utf-8"))
+    digest.update(content)
+    return digest.hexdigest()
+
+def get_import_checkpoint(checkpoint_id):
+    """Checkpoint salvo de uma carga (ou None se ela nunca foi iniciada)."""
+    db = get_db()
+    doc = db.collection(IMPORT_CHECKPOINTS_COLLECTION).document(checkpoint_id).get()
+    return doc.to_dict() if doc.exists else None
+
+# Operações por commit (o limite do Firestore é 500)
+MAX_WRITES_PER_COMMIT = 499
+
+def _commit_sales_chunk(items, build_sale, checkpoint=None):
+    """
+    Grava, em uma única transação, o maior prefixo de 'items' que cabe em um
+    commit: as vendas, os deltas dos agregados (utils/aggregates) e o checkpoint.
+    As vendas atuais são lidas dentro da transação: cargas simultâneas do mesmo
+    arquivo são serializadas pelo Firestore e a segunda calcula delta zero.
+    build_sale(venda_atual, dados) -> venda nova (ou None para ignorar o item).
+    checkpoint(quantidade) -> (referência, payload) gravado no mesmo commit.
+    Retorna quantos itens de 'items' foram consumidos.
+    """
+    from firebase_admin import firestore # Carregado junto com o SDK (get_db), não na importação
+    db = get_db()
+
+    @firestore.transactional
+    def commit(transaction):
+        existing = fetch_existing_sales([doc_id for doc_id, _ in items], transaction=transaction)
+        sales, deltas = [], {}
+        used = 1 if checkpoint else 0
+        consumed = 0
+        for doc_id, data in items:
+            old_sale = existing.get(doc_id)
+            new_sale = build_sale(old_sale, data)
+            if new_sale is not None:
+                new_keys = accumulate_sale_deltas({}, old_sale, new_sale).keys() - deltas.keys()
+                needed = 1 + max_delta_writes(new_keys)
+                if sales and used + needed > MAX_WRITES_PER_COMMIT:
+                    break
+                used += needed
+                sales.append((db.collection("sales_data").document(doc_id), new_sale))
+                accumulate_sale_deltas(deltas, old_sale, new_sale)
+            consumed += 1
+
+        # Lê os agregados que precisa antes da primeira gravação (regra da transação)
+        aggregate_writes = aggregate_delta_writes(deltas, transaction)
+        for doc_ref, sale in sales:
+            transaction.set(doc_ref, sale) # .set() faz o "upsert" (cria ou sobrescreve)
+        for ref, payload, merge in aggregate_writes:
+            transaction.set(ref, payload, merge=merge)
+        if checkpoint:
+            # Confirmado junto com o lote: nunca aponta para um lote que não foi gravado
+            ref, payload = checkpoint(consumed)
+            transaction.set(ref, payload)
+        return consumed
+
+    return commit(db.transaction())
+
+def batch_write_to_firestore(records, checkpoint_id=None):
+    """
+    Escreve os registros em lotes no Firestore.
+    Cada lote é uma transação que lê os documentos já existentes e grava,
+    junto com as vendas, os agregados (utils/aggregates) apenas com a
+    diferença (idempotente). Com 'checkpoint_id', o mesmo commit grava
+    quantos registros já foram confirmados: se a carga cair no meio, repetir
+    o mesmo arquivo continua do último lote confirmado.
+    """
     db = get_db()
-    batch = db.batch()
-    count = 0
     total_written = 0
-    total_orphans = 0 # Contagem de órfãs
+    # Contagem de órfãs (inclui lotes já gravados em uma tentativa anterior)
+    total_orphans = sum(1 for data in records.values() if data.get("consultant_uid") is None)
     
-    total_records = len(records)
+    items = list(records.items())
+    total_records = len(items)
+
+    checkpoint_ref = None
+    if checkpoint_id:
+        checkpoint_ref = db.collection(IMPORT_CHECKPOINTS_COLLECTION).document(checkpoint_id)
+        checkpoint = get_import_checkpoint(checkpoint_id)
+        if checkpoint and checkpoint.get("status") == "in_progress" and checkpoint.get("total") == total_records:
+            total_written = checkpoint.get("offset", 0)
+            st.info(f"Retomando carga interrompida: {total_written} de {total_records} registros já estavam gravados.")
+            if checkpoint.get("aggregates_pending"):
+                # Checkpoint de uma versão anterior, que gravava os agregados depois
+                # do lote (de 499): o último lote pode não tê-los aplicado
+                with st.spinner("Recalculando os agregados do último lote gravado..."):
+                    df_users = get_users_frame()
+                    consultant_managers = {
+                        row.uid: row.manager_uid for row in df_users.itertuples() if pd.notna(row.manager_uid)
+                    } if not df_users.empty else {}
+                    last_chunk = items[max(0, total_written - 499):total_written]
+                    rebuild_sales_aggregates([data for _, data in last_chunk], consultant_managers)
+                checkpoint_ref.update({"aggregates_pending": False})
+
     progress_bar = st.progress(0, text="Salvando dados no banco... (Isso pode levar vários minutos)")
     
-    for i, (doc_id, data) in enumerate(records.items()):
-        doc_ref = db.collection("sales_data").document(doc_id)
-        batch.set(doc_ref, data) # .set() faz o "upsert" (cria ou sobrescreve)
-        count += 1
+    while total_written < total_records:
+        start = total_written
+        checkpoint_write = None
+        if checkpoint_ref:
+            checkpoint_write = lambda count: (checkpoint_ref, {
+                "offset": start + count,
+                "total": total_records,
+                "status": "in_progress",
+                "updated_at": datetime.now()
+            })
+        chunk = items[start:start + MAX_WRITES_PER_COMMIT]
+        total_written += _commit_sales_chunk(chunk, lambda old_sale, data: data, checkpoint_write)
         
-        if data.get("consultant_uid") is None:
-            total_orphans += 1
+        # Atualiza a barra de progresso
+        progress_bar.progress(total_written / total_records, text=f"Salvando dados... ({total_written} / {total_records} registros)")
         
-        if count == 499: # Limite do batch é 500
-            batch.commit()
-            total_written += count
-            
+        if total_written < total_records:
             # Pausa para evitar Rate Limit (Erro 429)
             time.sleep(1) # Pausa por 1 segundo
+
+    if checkpoint_ref:
+        checkpoint_ref.set({"status": "done", "finished_at": datetime.now()}, merge=True)
             
-            batch = db.batch() # Novo batch
-            count = 0
-            
-            # Atualiza a barra de progresso
-            progress_percentage = (i + 1) / total_records
-            progress_bar.progress(progress_percentage, text=f"Salvando dados... ({total_written} / {total_records} registros)")
-            
-    if count > 0:
-        batch.commit() # Salva o lote final
-        total_written += count
-        
     progress_bar.progress(1.0, text=f"Concluído! {total_written} registros salvos.")
     
-    # Invalida o cache do mapa de clientes
+    # Invalida o cache do mapa de clientes e reaquece em segundo plano
     st.cache_data.clear()
+    start_warmup()
 
     return total_written, total_orphans # Retorna contagem de órfãs
 
-def process_bionio_csv(uploaded_file):
-    """Processa o CSV Bionio."""
-    try:
-        df = pd.read_csv(
-            uploaded_file, 
-            sep=';', 
-            dtype={'CNPJ da organização': str}, 
-            encoding='latin-1'
-        )
-    except Exception as e:
-        st.error(f"Erro ao ler o CSV: {e}")
-        return
-        
-    st.write(f"Arquivo Bionio lido: {len(df)} linhas encontradas.")
-    
-    # 1. Filtra apenas pedidos pagos/transferidos
-    df_paid = df[df['Status do pedido'].isin(['Transferido', 'Pago e Agendado'])].copy()
-    st.write(f"{len(df_paid)} registros de vendas válidas ('Transferido' ou 'Pago e Agendado').")
-    
-    if df_paid.empty:
-        st.warning("Nenhum registro de venda válida encontrado no arquivo.")
-        return 0, 0 # Retorna zero para não dar erro na página admin
+def update_sales_attribution(assignments):
+    """
+    Reatribui vendas já gravadas: { doc_id: (consultant_uid, manager_uid) }.
+    Mantém os agregados consistentes (move os valores do dono antigo para o
+    novo) gravando-os na mesma transação das vendas.
+    """
+    def reassign(old_sale, owners):
+        if old_sale is None:
+            return None
+        consultant_uid, manager_uid = owners
+        return old_sale | {"consultant_uid": consultant_uid, "manager_uid": manager_uid}
 
-    records_to_write = {}
-    
-    for _, row in df_paid.iterrows():
-        # 2. Limpeza e ETL
-        cnpj = clean_cnpj(row['CNPJ da organização'])
-        data_pagamento_str = row['Data do pagamento do pedido']
-        
-        try:
-            data_pagamento = datetime.strptime(data_pagamento_str, "%d/%m/%Y")
-        except:
-            continue # Pula se a data do pagamento for inválida
+    items = list(assignments.items())
+    start = 0
+    while start < len(items):
+        start += _commit_sales_chunk(items[start:start + MAX_WRITES_PER_COMMIT], reassign)
 
-        revenue = clean_value(row['Valor total do pedido'])
-        
-        # 3. Mapeamento
-        consultant_uid, manager_uid = map_sale_to_consultant(cnpj)
-        
-        # 4. Gera ID único (Evita duplicidade)
-        # Bionio_NumeroPedido_DataPagamento
-        doc_id = f"BIONIO_{row['Número do pedido']}_{data_pagamento_str.replace('/', '-')}"
-        
-        # 5. Monta o registro unificado
-        unified_record = {
-            "source": "Bionio",
-            "client_cnpj": cnpj,
-            "client_name": row['Nome fantasia'],
-            "consultant_uid": consultant_uid,
-            "manager_uid": manager_uid,
-            "date": data_pagamento, # Timestamp
-            "revenue_gross": revenue,
-            "revenue_net": revenue, # Bionio não tem spread, usamos o valor total
-            "product_name": row['Nome do benefício'],
-            "status": row['Status do pedido'],
-            "payment_type": row['Tipo de pagamento'],
-            "raw_id": str(row['Número do pedido']),
-        }
-        records_to_write[doc_id] = unified_record
-        
-    # 6. Salva no Firestore
-    total_saved, total_orphans = batch_write_to_firestore(records_to_write)
-    
-    log_audit(
-        action="upload_csv",
-        details={
-            "product": "Bionio",
-            "rows_found": len(df),
-            "rows_processed": len(df_paid),
-            "rows_saved": total_saved,
-            "rows_orphaned": total_orphans
-        }
-    )
-    
-    return total_saved, total_orphans
+# --- CARTEIRA DE CLIENTES (IMPORTAÇÃO EM MASSA) ---
 
-def process_rovema_csv(uploaded_file):
-    """Processa o CSV Rovema Pay."""
-    try:
-        df = pd.read_csv(
-            uploaded_file, 
-            sep=';', 
-            dtype=str, 
-            encoding='latin-1'
-        )
-    except Exception as e:
-        st.error(f"Erro ao ler o CSV: {e}")
-        return
+# Colunas esperadas no CSV de carteira (gestor é opcional)
+PORTFOLIO_CSV_COLUMNS = ["cnpj", "client_name", "consultant", "manager"]
+# Campos que, em branco no CSV, mantêm o valor atual (não apagam o cadastro)
+PORTFOLIO_OPTIONAL_FIELDS = ["client_name"]
+# Lotes de 500 gravados em paralelo
+PORTFOLIO_WRITE_WORKERS = 8
 
-    st.write(f"Arquivo Rovema Pay lido: {len(df)} linhas encontradas.")
-    
-    # 1. Filtra apenas transações pagas
-    df_paid = df[df['Status'].isin(['Pago', 'Antecipado'])].copy()
-    st.write(f"{len(df_paid)} registros de vendas válidas ('Pago' ou 'Antecipado').")
+def get_portfolio_snapshot():
+    """Carteira atual (apenas os campos comparados) como DataFrame indexado por CNPJ."""
+    db = get_db()
+    clients_ref = db.collection("clients").select(["client_name", "consultant_uid", "manager_uid"]).stream()
+    rows = [
+        {"cnpj": client.id, "client_name": data.get("client_name"),
+         "consultant_uid": data.get("consultant_uid"), "manager_uid": data.get("manager_uid")}
+        for client in clients_ref
+        for data in [client.to_dict()]
+    ]
+    return pd.DataFrame(rows, columns=["cnpj", "client_name", "consultant_uid", "manager_uid"]).set_index("cnpj")
 
-    if df_paid.empty:
-        st.warning("Nenhum registro de venda válida encontrado no arquivo.")
-        return 0, 0 # Retorna zero para não dar erro na página admin
+def validate_portfolio_frame(df, users_map):
+    """
+    Valida o CSV de carteira de uma vez (sem loop por linha).
+    users_map = { uid: {"email", "role", "manager_uid"} }
+    Retorna (df_validos, df_rejeitados com a coluna 'reason').
+    """
+    df = df.copy()
+    df["cnpj"] = clean_cnpj_series(df["cnpj"])
+    df["client_name"] = df["client_name"].astype("string").str.strip().replace("", pd.NA)
 
-    records_to_write = {}
-    
-    for _, row in df_paid.iterrows():
-        # 2. Limpeza e ETL
-        cnpj = clean_cnpj(row['CNPJ'])
-        data_venda_str = row['Venda'] # Ex: 01/09/2025 07:01:16
-        
-        try:
-            data_venda = datetime.strptime(data_venda_str, "%d/%m/%Y %H:%M:%S")
-        except:
-            continue # Pula se a data for inválida
+    # Consultor pode vir como UID ou e-mail
+    email_to_uid = {data.get("email", "").lower(): uid for uid, data in users_map.items() if data.get("email")}
+    consultant_key = df["consultant"].astype("string").str.strip()
+    df["consultant_uid"] = consultant_key.where(consultant_key.isin(users_map.keys()),
+                                                consultant_key.str.lower().map(email_to_uid))
+    consultant_roles = df["consultant_uid"].map(lambda uid: users_map.get(uid, {}).get("role"))
+    default_managers = df["consultant_uid"].map(lambda uid: users_map.get(uid, {}).get("manager_uid"))
 
-        revenue_gross = clean_value(row['Bruto'])
-        # Métrica de receita: Assumindo que "Spread" é a nossa receita
-        revenue_net = clean_value(row['Spread']) 
-        
-        # 3. Mapeamento
-        consultant_uid, manager_uid = map_sale_to_consultant(cnpj)
-        
-        # 4. Gera ID único
-        doc_id = f"ROVEMA_{row['ID Venda']}_{row['ID Parcela']}"
-        
-        # 5. Monta o registro unificado
-        unified_record = {
-            "source": "Rovema Pay",
-            "client_cnpj": cnpj,
-            "client_name": row['EC'],
-            "consultant_uid": consultant_uid,
-            "manager_uid": manager_uid,
-            "date": data_venda, # Timestamp
-            "revenue_gross": revenue_gross,
-            "revenue_net": revenue_net, # Receita da empresa
-            "product_name": row['Tipo'], # Débito / Crédito
-            "product_detail": row['Bandeira'], # mastercard, visa
-            "status": row['Status'],
-            "raw_id": f"{row['ID Venda']}-{row['ID Parcela']}",
-        }
-        records_to_write[doc_id] = unified_record
-        
-    # 6. Salva no Firestore
-    total_saved, total_orphans = batch_write_to_firestore(records_to_write)
-    
-    log_audit(
-        action="upload_csv",
-        details={
-            "product": "Rovema Pay",
-            "rows_found": len(df),
-            "rows_processed": len(df_paid),
-            "rows_saved": total_saved,
-            "rows_orphaned": total_orphans
-        }
-    )
-    
-    return total_saved, total_orphans
+    manager_key = df["manager"].astype("string").str.strip() if "manager" in df else pd.Series(pd.NA, index=df.index, dtype="string")
+    manager_key = manager_key.replace("", pd.NA)
+    manager_uid = manager_key.where(manager_key.isin(users_map.keys()), manager_key.str.lower().map(email_to_uid))
+    df["manager_uid"] = manager_uid.where(manager_key.notna(), default_managers)
+    manager_roles = df["manager_uid"].map(lambda uid: users_map.get(uid, {}).get("role"))
+
+    # Motivo da rejeição (a primeira regra violada vence)
+    reason = pd.Series(pd.NA, index=df.index, dtype="string")
+    checks = [
+        (~validate_cnpj_series(df["cnpj"]), "cnpj_invalido"),
+        (df["cnpj"].duplicated(keep="last"), "cnpj_duplicado_no_arquivo"),
+        (df["consultant_uid"].isna(), "consultor_desconhecido"),
+        (consultant_roles != "consultant", "usuario_nao_e_consultor"),
+        (manager_key.notna() & (manager_roles != "manager"), "gestor_invalido"),
+    ]
+    for failed, code in checks:
+        reason = reason.mask(reason.isna() & failed.fillna(True), code)
 
-async def process_asto_api(start_date, end_date):
+    rejected = df[reason.notna()].assign(reason=reason[reason.notna()])
+    valid = df[reason.isna()][["cnpj", "client_name", "consultant_uid", "manager_uid"]]
+    return valid, rejected
+
+def diff_portfolio(df_valid, df_existing):
     """
-    Processa a API ASTO (Logpay) - MANUTENÇÃO.
-    Esta função está DESATIVADA até que um endpoint funcional seja fornecido.
+    Mantém apenas clientes novos ou com nome/consultor/gestor diferente do atual.
+    Campo opcional em branco (PORTFOLIO_OPTIONAL_FIELDS) não conta como alteração.
     """
-    
-    # --- MUDANÇA APLICADA ---
-    # Interrompe a execução e informa o usuário
-    
-    st.error("Integração ASTO (Manutenção) Pausada")
-    st.warning("""
-    Não foi possível carregar os dados do ASTO (Manutenção).
-    
-    **Motivo:** Nenhuma das APIs ASTO/Logpay testadas fornece os dados necessários.
-    - A API de Fatura (`.../FaturaPagamentoFechadaApuracao`) funciona, mas **não retorna o CNPJ do Cliente**, impedindo a atribuição.
-    - A API de Transações (`.../ManutencoesAnalitico`) **retorna erro 404** (Não Encontrado).
-    
-    **Ação Necessária:** Por favor, entre em contato com o suporte da ASTO/Logpay e solicite um **endpoint de transações analíticas de manutenção** que inclua o `cnpjCliente`, `valor` e `data` de cada transação.
-    """)
-    
-    return 0, 0
-    # --- FIM DA MUDANÇA ---
+    current = df_existing.reindex(df_valid["cnpj"])
+    changed = np.zeros(len(df_valid), dtype=bool)
+    for column in ["client_name", "consultant_uid", "manager_uid"]:
+        new_values = df_valid[column].astype("string").fillna("").to_numpy()
+        old_values = current[column].astype("string").fillna("").to_numpy()
+        differs = new_values != old_values
+        if column in PORTFOLIO_OPTIONAL_FIELDS:
+            differs &= new_values != ""
+        changed |= differs
+    is_new = current["consultant_uid"].isna().to_numpy() & current["client_name"].isna().to_numpy()
+    return df_valid[changed], int((changed & is_new).sum())
 
+def _commit_clients_batch(rows, updated_at):
+    db = get_db()
+    batch = db.batch()
+    for row in rows:
+        payload = {
+            "client_name": row["client_name"],
+            "consultant_uid": row["consultant_uid"],
+            "manager_uid": row["manager_uid"],
+            "updated_at": updated_at
+        }
+        # Opcional em branco: fora do merge, para não apagar o valor atual
+        for field in PORTFOLIO_OPTIONAL_FIELDS:
+            if payload[field] is None:
+                del payload[field]
+        batch.set(db.collection("clients").document(row["cnpj"]), payload, merge=True)
+    batch.commit()
+    return len(rows)
+
+def write_clients_parallel(df_changes):
+    """Grava os clientes em lotes de 500, com vários commits em paralelo."""
+    rows = [
+        {key: (None if pd.isna(value) else value) for key, value in row.items()}
+        for row in df_changes.to_dict("records")
+    ]
+    chunks = [rows[i:i + 500] for i in range(0, len(rows), 500)]
+    if not chunks:
+        return 0
 
-async def process_eliq_api(start_date, end_date):
+    updated_at = datetime.now()
+    progress_bar = st.progress(0, text="Salvando carteira...")
+    written = 0
+    with ThreadPoolExecutor(max_workers=PORTFOLIO_WRITE_WORKERS) as executor:
+        futures = [executor.submit(_commit_clients_batch, chunk, updated_at) for chunk in chunks]
+        for future in as_completed(futures):
+            written += future.result()
+            progress_bar.progress(written / len(rows), text=f"Salvando carteira... ({written} / {len(rows)} clientes)")
+    progress_bar.progress(1.0, text=f"Concluído! {written} clientes salvos.")
+    return written
+
+def process_clients_csv(uploaded_file, users_map):
     """
-    Processa a API ELIQ (Uzzipay/Sigyo) - ABastecimento.
-    Contém as correções de Timeout e Rate Limit.
+    Importa a carteira de clientes (CNPJ, nome, consultor, gestor) em massa.
+    Retorna (gravados, novos, rejeitados_df) ou None em caso de erro de leitura.
     """
     try:
-        creds = st.secrets["api_credentials"]
-        URL_ELIQ = creds["eliq_url"] # Deve ser ".../api/transacoes"
-        api_token = creds["eliq_token"]
-    except KeyError as e:
-        st.error(f"Secret 'api_credentials.{e.args[0]}' não encontrado. Verifique seus Secrets.")
-        return
+        df = pd.read_csv(uploaded_file, sep=';', dtype=str, encoding='latin-1')
     except Exception as e:
-        st.error(f"Erro ao ler Secrets da API: {e}")
+        st.error(f"Erro ao ler o CSV: {e}")
         return
 
-    # Formato dos Parâmetros (Corrigido)
-    date_range_str = f"{start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}"
-    params = {
-        "TransacaoSearch[data_cadastro]": date_range_str
-    }
-    
-    headers = {
-        "Authorization": f"Bearer {api_token}"
-    }
-    
-    records_to_write = {}
-    
-    # Log de Depuração
-    full_url_for_log = f"{URL_ELIQ}?{urllib.parse.urlencode(params)}"
-    st.info(f"Tentando chamar a API ELIQ (Abastecimento) no endpoint: {full_url_for_log}")
+    df.columns = [column.strip().lower() for column in df.columns]
+    missing = [column for column in PORTFOLIO_CSV_COLUMNS[:3] if column not in df.columns]
+    if missing:
+        st.error(f"Colunas obrigatórias ausentes: {', '.join(missing)}. Esperado: {';'.join(PORTFOLIO_CSV_COLUMNS)}")
+        return
 
-    try:
-        # Timeout aumentado para 120 segundos
-        async with httpx.AsyncClient(headers=headers, timeout=120.0) as client:
-            response = await client.get(URL_ELIQ, params=params)
-            response.raise_for_status()
-            data = response.json() 
-
-        st.write(f"API ELIQ: {len(data)} transações (abastecimentos) encontradas.")
-        if not data:
-            st.warning("Nenhum dado retornado pela API ELIQ para o período.")
-            return 0, 0
-
-        for sale in data:
-            if sale.get('status') != 'confirmada':
-                continue 
-
-            cliente_info = sale.get('cliente', {})
-            if not cliente_info:
-                cliente_info = sale.get('informacao', {}).get('cliente', {})
-            
-            if not cliente_info:
-                continue 
-            
-            cnpj = clean_cnpj(cliente_info.get('cnpj'))
-            if not cnpj: continue
+    st.write(f"Arquivo de carteira lido: {len(df)} linhas encontradas.")
 
-            data_venda = datetime.strptime(sale['data_cadastro'], "%Y-%m-%d %H:%M:%S")
-            revenue_gross = clean_value(sale.get('valor_total', 0))
-            
-            # Métrica de Receita (Corrigida)
-            revenue_net_raw = sale.get('valor_taxa_cliente', sale.get('desconto', 0))
-            revenue_net = abs(clean_value(revenue_net_raw))
-            
-            produto_info = sale.get('produto', {})
-            if not produto_info:
-                produto_info = sale.get('informacao', {}).get('produto', {})
-            
-            # 3. Mapeamento
-            consultant_uid, manager_uid = map_sale_to_consultant(cnpj)
-            
-            # 4. Gera ID único
-            doc_id = f"ELIQ_{sale['id']}"
-            
-            # 5. Monta o registro unificado
-            unified_record = {
-                "source": "ELIQ",
-                "client_cnpj": cnpj,
-                "client_name": cliente_info.get('nome', 'N/A'),
-                "consultant_uid": consultant_uid,
-                "manager_uid": manager_uid,
-                "date": data_venda,
-                "revenue_gross": revenue_gross,
-                "revenue_net": revenue_net, # Receita Corrigida
-                "product_name": produto_info.get('nome', 'N/A'),
-                "product_detail": produto_info.get('categoria', 'N/A'),
-                "volume": clean_value(sale.get('quantidade', 0)),
-                "status": sale['status'],
-                "raw_id": str(sale.get('id', 'N/A')),
-            }
-            records_to_write[doc_id] = unified_record
-            
-        # 6. Salva no Firestore
-        # Esta função (batch_write_to_firestore) agora tem o sleep(1)
-        total_saved, total_orphans = batch_write_to_firestore(records_to_write)
-        
-        log_audit(
-            action="load_api",
-            details={
-                "product": "ELIQ (Abastecimento)",
-                "start_date": start_date.strftime("%Y-%m-%d"),
-                "end_date": end_date.strftime("%Y-%m-%d"),
-                "rows_found": len(data),
-                "rows_saved": total_saved,
-                "rows_orphaned": total_orphans
-            }
-        )
-        
-        return total_saved, total_orphans
+    df_valid, df_rejected = validate_portfolio_frame(df, users_map)
+    df_changes, total_new = diff_portfolio(df_valid, get_portfolio_snapshot())
+    st.write(f"{len(df_valid)} linhas válidas, {len(df_changes)} com alterações ({total_new} clientes novos).")
 
-    except httpx.HTTPStatusError as e:
-        st.error(f"Erro na API ELIQ: {e.response.status_code} - {e.response.text}")
-        st.error(f"O URL completo que falhou foi: {full_url_for_log}")
-    except httpx.TimeoutException:
-        st.error(f"Erro na API ELIQ: O Timeout de 120 segundos foi excedido. A API está muito lenta.")
-    except Exception as e:
-        st.error(f"Erro ao processar dados ELIQ: {e}")
+    total_saved = write_clients_parallel(df_changes)
+
+    # Invalida mapas e índices de clientes e reaquece em segundo plano
+    st.cache_data.clear()
+    get_client_search_data.clear()
+    start_warmup()
+
+    log_audit(
+        action="upload_clients_csv",
+        details={
+            "rows_found": len(df),
+            "rows_valid": len(df_valid),
+            "rows_rejected": len(df_rejected),
+            "rows_saved": total_saved,
+            "clients_new": total_new
+        }
+    )
+
+    return total_saved, total_new, df_rejected
@@ -0,0 +1,86 @@
+import streamlit as st
+import math
+import numpy as np
+from datetime import datetime
+from utils.export import EXPORT_FORMATS, export_dataframe
+
+PAGE_SIZES = [50, 100, 250, 500]
+
+def get_sort_order(df, sort_by, ascending, cache_key, mask=None):
+    """
+    Retorna as posições das linhas (filtradas por 'mask') ordenadas por 'sort_by'.
+    A ordem fica em memória (por sessão) para que trocar de página não reordene tudo.
+    """
+    sort_cache = st.session_state.setdefault("detail_sort_cache", {})
+    key = (cache_key, sort_by, ascending)
+    if key not in sort_cache:
+        sort_cache.clear() # Mantém apenas a ordenação atual
+        rows = np.arange(len(df)) if mask is None else np.flatnonzero(mask)
+        ordered = df[sort_by].iloc[rows].reset_index(drop=True).sort_values(
+            ascending=ascending, kind="stable", na_position="last"
+        )
+        sort_cache[key] = rows[ordered.index.to_numpy()]
+    return sort_cache[key]
+
+def get_page(df, sort_by, ascending, page, page_size, cache_key, mask=None):
+    """Retorna apenas a fatia da página pedida (já ordenada no servidor)."""
+    positions = get_sort_order(df, sort_by, ascending, cache_key, mask)
+    start = (page - 1) * page_size
+    return df.iloc[positions[start:start + page_size]]
+
+def render_detail_table(df, key, cache_key, mask=None, default_sort="date"):
+    """
+    Tabela detalhada sob demanda: só é montada quando o usuário ativa,
+    envia ao navegador uma página por vez e exporta em CSV/Parquet.
+    'mask' (opcional) seleciona as linhas visíveis sem copiar o DataFrame.
+    """
+    total_rows = len(df) if mask is None else int(mask.sum())
+    if not st.toggle("Carregar tabela detalhada", key=f"{key}_enabled"):
+        st.caption(f"{total_rows:,} registros disponíveis. Ative para visualizar ou exportar.")
+        return
+
+    columns = list(df.columns)
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    sort_by = col1.selectbox(
+        "Ordenar por",
+        options=columns,
+        index=columns.index(default_sort) if default_sort in columns else 0,
+        key=f"{key}_sort_by"
+    )
+    ascending = col2.toggle("Crescente", value=False, key=f"{key}_ascending")
+    page_size = col3.selectbox("Linhas por página", options=PAGE_SIZES, key=f"{key}_page_size")
+    total_pages = max(math.ceil(total_rows / page_size), 1)
+    # Ao trocar o tamanho da página, a página atual pode deixar de existir
+    if st.session_state.get(f"{key}_page", 1) > total_pages:
+        st.session_state[f"{key}_page"] = total_pages
+    page = col4.number_input("Página", min_value=1, max_value=total_pages, step=1, key=f"{key}_page")
+
+    st.dataframe(
+        get_page(df, sort_by, ascending, page, page_size, cache_key, mask),
+        use_container_width=True
+    )
+    st.caption(f"Página {page} de {total_pages} ({total_rows:,} registros)")
+
+    # --- Exportação (gerada apenas quando solicitada) ---
+    col1, col2 = st.columns([1, 3])
+    export_format = col1.selectbox("Formato", options=list(EXPORT_FORMATS.keys()), key=f"{key}_export_format")
+    export_state_key = f"{key}_export"
+
+    if col2.button("Gerar arquivo para download", key=f"{key}_export_button"):
+        with st.spinner("Gerando arquivo..."):
+            st.session_state[export_state_key] = (
+                cache_key,
+                export_format,
+                export_dataframe(df if mask is None else df[mask], export_format)
+            )
+
+    export = st.session_state.get(export_state_key)
+    if export and export[0] == cache_key and export[1] == export_format:
+        spec = EXPORT_FORMATS[export_format]
+        st.download_button(
+            f"Baixar {export_format}",
+            data=export[2],
+            file_name=f"vendas_{datetime.now().strftime('%Y%m%d_%H%M')}.{spec['extension']}",
+            mime=spec["mime"],
+            key=f"{key}_download"
+        )
@@ -0,0 +1,209 @@
+import io
+import math
+import os
+import pandas as pd
+from datetime import datetime
+
+# Linhas por bloco ao serializar (limita o pico de memória da exportação)
+EXPORT_CHUNK_ROWS = 50_000
+
+EXPORT_FORMATS = {
+    "CSV": {"extension": "csv", "mime": "text/csv"},
+    "Parquet": {"extension": "parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+def iter_frame_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Percorre o DataFrame em fatias de até 'chunk_rows' linhas (sem cópia)."""
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+def iter_csv_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Gera o CSV (separador ';', padrão BR) bloco a bloco, em bytes."""
+    header = True
+    for chunk in iter_frame_chunks(df, chunk_rows):
+        yield chunk.to_csv(index=False, sep=';', header=header).encode("utf-8")
+        header = False
+
+def dataframe_to_csv_bytes(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Serializa o DataFrame em CSV, escrevendo em blocos."""
+    buffer = io.BytesIO()
+    for block in iter_csv_chunks(df, chunk_rows):
+        buffer.write(block)
+    return buffer.getvalue()
+
+def dataframe_to_parquet_bytes(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Serializa o DataFrame em Parquet, um row group por bloco."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    buffer = io.BytesIO()
+    with pq.ParquetWriter(buffer, schema, compression="snappy") as writer:
+        for chunk in iter_frame_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    return buffer.getvalue()
+
+def export_dataframe(df, fmt):
+    """Serializa o DataFrame no formato pedido ('CSV' ou 'Parquet')."""
+    if fmt == "Parquet":
+        return dataframe_to_parquet_bytes(df)
+    return dataframe_to_csv_bytes(df)
+
+# --- EXPORTAÇÃO EM FLUXO (sales_data -> Parquet / Arrow IPC) ---
+#
+# Para ferramentas de BI: as vendas são lidas do Firestore em páginas
+# (order_by("date") + start_after) e cada página vira um RecordBatch do Arrow,
+# gravado direto no arquivo. Nenhum DataFrame com o resultado inteiro é montado;
+# o pico de memória é de um bloco (EXPORT_CHUNK_ROWS), não do período.
+
+EXPORT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "exports"))
+
+# Documentos por página lida do Firestore
+EXPORT_PAGE_SIZE = 5_000
+# Acima deste tamanho o arquivo fica só no servidor (o download carrega o arquivo inteiro em memória)
+EXPORT_DOWNLOAD_MAX_BYTES = 100 * 1024 * 1024
+
+SALES_EXPORT_FORMATS = {
+    "Parquet": {"extension": "parquet", "mime": "application/vnd.apache.parquet"},
+    "Arrow IPC": {"extension": "arrow", "mime": "application/vnd.apache.arrow.file"},
+}
+
+# Colunas exportadas (esquema fixo: todos os arquivos têm o mesmo formato)
+SALES_EXPORT_COLUMNS = {
+    "doc_id": "string",
+    "date": "timestamp",
+    "source": "string",
+    "client_cnpj": "string",
+    "client_name": "string",
+    "consultant_uid": "string",
+    "manager_uid": "string",
+    "product_name": "string",
+    "product_detail": "string",
+    "payment_type": "string",
+    "status": "string",
+    "raw_id": "string",
+    "revenue_gross": "float64",
+    "revenue_net": "float64",
+    "volume": "float64",
+}
+
+def sales_export_schema():
+    import pyarrow as pa
+    types = {
+        "string": pa.string(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "float64": pa.float64(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in SALES_EXPORT_COLUMNS.items()])
+
+def iter_query_pages(queries, page_size=EXPORT_PAGE_SIZE):
+    """Percorre as consultas em páginas ordenadas por data; só uma página fica em memória."""
+    for query in queries:
+        ordered = query.order_by("date")
+        last_doc = None
+        while True:
+            page = ordered.limit(page_size)
+            if last_doc is not None:
+                page = page.start_after(last_doc)
+            docs = list(page.stream())
+            if docs:
+                yield docs
+            if len(docs) < page_size:
+                break
+            last_doc = docs[-1]
+
+def _string_column(values):
+    """Texto ou None (CNPJ gravado como número, NaN de planilhas antigas...)."""
+    return [None if value is None or (isinstance(value, float) and math.isnan(value)) else str(value)
+            for value in values]
+
+def _float_column(values):
+    """Número ou nulo: valores em texto que não viram número ficam nulos."""
+    numbers = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+    return numbers.astype("float64").to_numpy()
+
+def _timestamp_column(values):
+    """Datas em UTC (sem fuso = UTC; texto inválido = nulo), em microssegundos."""
+    dates = pd.to_datetime(pd.Series(values, dtype=object), errors="coerce", utc=True, format="mixed")
+    return dates.astype("datetime64[us, UTC]")
+
+def page_to_record_batch(docs, schema):
+    """
+    Documentos do Firestore -> RecordBatch (campos fora do esquema são ignorados).
+    Cada coluna é convertida para o tipo do esquema: documentos antigos com
+    tipos misturados viram nulos em vez de interromper a exportação.
+    """
+    import pyarrow as pa
+    rows = [doc.to_dict() for doc in docs]
+    converters = {"string": _string_column, "float64": _float_column, "timestamp": _timestamp_column}
+    arrays = []
+    for field in schema:
+        if field.name == "doc_id":
+            values = [doc.id for doc in docs]
+        else:
+            values = [row.get(field.name) for row in rows]
+        column = converters[SALES_EXPORT_COLUMNS[field.name]](values)
+        arrays.append(pa.array(column, type=field.type, from_pandas=True))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def iter_sales_batches(queries, page_size=EXPORT_PAGE_SIZE):
+    """Uma página do Firestore por RecordBatch, no esquema fixo da exportação."""
+    schema = sales_export_schema()
+    for docs in iter_query_pages(queries, page_size):
+        yield page_to_record_batch(docs, schema)
+
+def write_sales_export(queries, fmt, sink, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Grava as vendas das consultas em 'sink' (caminho ou arquivo) no formato
+    pedido. No Parquet as páginas são juntadas em row groups de até
+    'chunk_rows' linhas. Retorna o número de linhas gravadas.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = sales_export_schema()
+    rows_written = 0
+    if fmt == "Arrow IPC":
+        with pa.ipc.new_file(sink, schema) as writer:
+            for batch in iter_sales_batches(queries):
+                writer.write_batch(batch)
+                rows_written += batch.num_rows
+        return rows_written
+
+    with pq.ParquetWriter(sink, schema, compression="snappy") as writer:
+        pending = []
+        pending_rows = 0
+        for batch in iter_sales_batches(queries):
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows >= chunk_rows:
+                writer.write_table(pa.Table.from_batches(pending, schema=schema))
+                rows_written += pending_rows
+                pending, pending_rows = [], 0
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending, schema=schema))
+            rows_written += pending_rows
+    return rows_written
+
+def read_export_file(path):
+    """Conteúdo do arquivo exportado (para o botão de download)."""
+    with open(path, "rb") as file:
+        return file.read()
+
+def export_sales_to_file(queries, fmt, name):
+    """
+    Exporta para exports/{name}_{AAAAMMDD_HHMMSS}.{ext} (também lido por ferramentas
+    de BI no servidor). Retorna (caminho, linhas).
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    extension = SALES_EXPORT_FORMATS[fmt]["extension"]
+    path = os.path.join(EXPORT_DIR, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}")
+    temp_path = f"{path}.tmp"
+    try:
+        rows = write_sales_export(queries, fmt, temp_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, path) # Nunca deixa um arquivo pela metade
+    return path, rows
@@ -1,36 +1,47 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
 import json
 import os
 
-# Carrega as credenciais do Streamlit Secrets
-try:
-    # CORREÇÃO APLICADA AQUI:
-    # Busca o JSON de dentro da seção [firebase_config]
-    service_account_json_str = st.secrets["firebase_config"]["FIREBASE_SERVICE_ACCOUNT_JSON"]
-    
-    # Carrega a configuração web (para login)
-    firebase_config_dict = st.secrets["firebase_config"]
-    
-except KeyError as e:
-    st.error(f"ERRO DE CONFIGURAÇÃO: Secret '{e.args[0]}' não encontrado.")
-    st.error("Por favor, verifique se o painel de Secrets no Streamlit Cloud está 100% correto (Ação 1).")
-    st.stop()
+# O SDK (firebase_admin, pyrebase) e os Secrets só são carregados quando
+# alguém precisa do banco: a tela de login abre sem pagar esse custo.
 
-@st.cache_resource
+@st.cache_resource(show_spinner=False)
+def get_firebase_secrets():
+    """
+    Lê as credenciais do Streamlit Secrets (seção [firebase_config]).
+    Retorna (json_da_conta_de_servico, configuracao_web).
+    """
+    try:
+        # CORREÇÃO APLICADA AQUI:
+        # Busca o JSON de dentro da seção [firebase_config]
+        service_account_json_str = st.secrets["firebase_config"]["FIREBASE_SERVICE_ACCOUNT_JSON"]
+        
+        # Carrega a configuração web (para login)
+        firebase_config_dict = dict(st.secrets["firebase_config"])
+        
+    except KeyError as e:
+        st.error(f"ERRO DE CONFIGURAÇÃO: Secret '{e.args[0]}' não encontrado.")
+        st.error("Por favor, verifique se o painel de Secrets no Streamlit Cloud está 100% correto (Ação 1).")
+        st.stop()
+    return service_account_json_str, firebase_config_dict
+
+@st.cache_resource(show_spinner=False)
 def init_firebase_admin():
     """
     Inicializa o SDK Admin do Firebase de forma robusta,
     lendo o JSON de serviço como uma string única para
     contornar bugs de parsing do Streamlit Secrets.
     """
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
     try:
         # Verifica se o app já foi inicializado
         firebase_admin.get_app()
     except ValueError:
         try:
             # Converte a string JSON (lida dos Secrets) em um dicionário Python
+            service_account_json_str, _ = get_firebase_secrets()
             creds_dict = json.loads(service_account_json_str)
             
             # Inicializa o app usando o DICIONÁRIO de credenciais
@@ -56,6 +67,7 @@ def init_pyrebase():
     # se a inicialização do admin falhar.
     import pyrebase
     
+    _, firebase_config_dict = get_firebase_secrets()
     # Adiciona a databaseURL se não estiver presente (Pyrebase precisa disso)
     if "databaseURL" not in firebase_config_dict:
          firebase_config_dict["databaseURL"] = f"https://{firebase_config_dict['projectId']}-default-rtdb.firebaseio.com/"
@@ -69,6 +81,7 @@ def get_db():
 def get_admin_auth():
     """Retorna o módulo de autenticação do Admin SDK."""
     init_firebase_admin() # Garante que o app admin está inicializado
+    from firebase_admin import auth
     return auth
 
 def get_auth_client():
@@ -0,0 +1,135 @@
+import streamlit as st
+import threading
+import time
+from collections import OrderedDict
+
+# --- CACHE DE DATAFRAMES COM ORÇAMENTO DE MEMÓRIA ---
+#
+# O st.cache_data guarda cada resultado até o TTL, sem limite de tamanho.
+# Para os segmentos de vendas (os objetos grandes) usamos um cache próprio,
+# compartilhado pelo processo: soma os bytes de cada DataFrame e, ao passar
+# do orçamento, descarta os menos usados recentemente (LRU).
+#
+# Invalidação: as cargas e edições chamam st.cache_data.clear(). O cache
+# guarda a "geração" (um valor em st.cache_data); quando ela muda, tudo é
+# descartado, sem precisar alterar esses pontos de chamada.
+
+# Orçamento de memória dos segmentos de vendas (bytes)
+SALES_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Frames maiores que esta fração do orçamento não são guardados
+MAX_ENTRY_FRACTION = 0.25
+
+@st.cache_data(show_spinner=False)
+def cache_generation():
+    """Muda a cada st.cache_data.clear() (o valor novo é calculado na próxima chamada)."""
+    return time.time_ns()
+
+def frame_nbytes(df):
+    """Memória ocupada pelo DataFrame (inclui o conteúdo das strings)."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+class FrameCache:
+    """Cache LRU de DataFrames limitado em bytes, com TTL por entrada e métricas."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # chave -> {frame, nbytes, expires_at, created_at, hits}
+        self._lock = threading.Lock()
+        self._generation = None
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.oversized = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry["nbytes"]
+
+    def _check_generation(self):
+        generation = cache_generation()
+        if generation != self._generation:
+            self._entries.clear()
+            self.total_bytes = 0
+            self._generation = generation
+
+    def get(self, key):
+        """Frame guardado (não modifique: é a mesma instância para todas as sessões) ou None."""
+        with self._lock:
+            self._check_generation()
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry["hits"] += 1
+            self.hits += 1
+            return entry["frame"]
+
+    def put(self, key, frame, ttl, generation=None):
+        """Guarda o frame. Com 'generation', descarta se os caches foram limpos durante a busca."""
+        nbytes = frame_nbytes(frame)
+        with self._lock:
+            self._check_generation()
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            if nbytes > self.max_bytes * MAX_ENTRY_FRACTION:
+                self.oversized += 1
+                return
+            while self._entries and self.total_bytes + nbytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            now = time.time()
+            self._entries[key] = {"frame": frame, "nbytes": nbytes, "expires_at": now + ttl, "created_at": now, "hits": 0}
+            self.total_bytes += nbytes
+
+    def get_or_load(self, key, loader, ttl):
+        """Devolve o frame da chave, chamando loader() e guardando o resultado em caso de falta."""
+        frame = self.get(key)
+        if frame is None:
+            generation = self._generation
+            frame = loader()
+            self.put(key, frame, ttl, generation)
+        return frame
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """Métricas para a página de diagnóstico."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "oversized": self.oversized,
+            }
+
+    def entries(self):
+        """[(chave, bytes, idade_s, ttl_restante_s, acertos)] do mais antigo ao mais recente (ordem LRU)."""
+        now = time.time()
+        with self._lock:
+            return [
+                (key, entry["nbytes"], now - entry["created_at"], entry["expires_at"] - now, entry["hits"])
+                for key, entry in self._entries.items()
+            ]
+
+@st.cache_resource(show_spinner=False)
+def get_sales_frame_cache():
+    """Cache dos segmentos de vendas, único por processo."""
+    return FrameCache(SALES_CACHE_MAX_BYTES)
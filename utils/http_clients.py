@@ -0,0 +1,44 @@
+import streamlit as st
+from urllib.parse import urlsplit
+
+# --- CLIENTES HTTP COMPARTILHADOS ---
+#
+# Um cliente por host, criado uma vez por processo (st.cache_resource).
+# As conexões ficam abertas (keep-alive) entre logins e cargas, evitando
+# um novo handshake TLS a cada chamada. O limite de conexões é por host.
+
+# Timeout padrão (cada chamada pode pedir outro, ex: ELIQ com 120s)
+HTTP_TIMEOUT = 30.0
+# Conexões simultâneas e ociosas (keep-alive) por host
+HTTP_MAX_CONNECTIONS_PER_HOST = 10
+HTTP_MAX_KEEPALIVE_PER_HOST = 5
+# Segundos que uma conexão ociosa fica aberta
+HTTP_KEEPALIVE_EXPIRY = 120.0
+
+def _http2_available():
+    """HTTP/2 só é usado se o pacote 'h2' (httpx[http2]) estiver instalado."""
+    try:
+        import h2 # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+@st.cache_resource(show_spinner=False)
+def get_http_client(origin):
+    """Cliente com pool de conexões para um host ('https://host'). Compartilhado entre sessões."""
+    import httpx # Carregado no primeiro uso (não na importação das páginas)
+    return httpx.Client(
+        base_url=origin,
+        http2=_http2_available(),
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_PER_HOST,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+def http_client_for(url):
+    """Cliente compartilhado do host de 'url'."""
+    parts = urlsplit(url)
+    return get_http_client(f"{parts.scheme}://{parts.netloc}")
@@ -0,0 +1,184 @@
+import threading
+import time
+import pandas as pd
+from datetime import date
+from utils.data_access import build_scope_queries
+
+# --- MODO AO VIVO (listeners do Firestore) ---
+#
+# Em vez de refazer a consulta a cada clique, o Dashboard pode assinar o
+# período atual com on_snapshot. O primeiro snapshot traz o período inteiro;
+# depois chegam só as mudanças (vendas gravadas por uma carga, reatribuições),
+# que são aplicadas sobre o DataFrame e os totais já montados.
+#
+# Um listener por (período, escopo), compartilhado entre as sessões do
+# processo; uma thread encerra os listeners sem acesso há LIVE_IDLE_SECONDS.
+
+# Intervalo com que a página confere se chegaram mudanças
+LIVE_REFRESH_SECONDS = 5
+# Listener sem nenhuma página lendo há este tempo é encerrado
+LIVE_IDLE_SECONDS = 300
+# Máximo de listeners abertos no processo
+LIVE_MAX_VIEWS = 20
+# Intervalo da thread que encerra listeners ociosos
+LIVE_REAPER_SECONDS = 60
+
+TOTAL_COLUMNS = ["sales", "revenue_net", "revenue_gross"]
+
+def _source_totals(df):
+    """Vendas e receitas por produto de um pedaço do frame (índice = source)."""
+    if df.empty:
+        return pd.DataFrame(columns=TOTAL_COLUMNS, dtype=float)
+    values = df.reindex(columns=["source", "revenue_net", "revenue_gross"])
+    values = values.assign(
+        source=values["source"].fillna("N/A"),
+        revenue_net=pd.to_numeric(values["revenue_net"], errors="coerce").fillna(0.0),
+        revenue_gross=pd.to_numeric(values["revenue_gross"], errors="coerce").fillna(0.0),
+        sales=1,
+    )
+    return values.groupby("source")[TOTAL_COLUMNS].sum()
+
+class LiveSalesView:
+    """Vendas de um período/escopo mantidas em dia por listeners (on_snapshot)."""
+
+    def __init__(self, queries):
+        self._lock = threading.Lock()
+        self._frame = pd.DataFrame()   # índice = doc_id
+        self._totals = pd.DataFrame(columns=TOTAL_COLUMNS, dtype=float)
+        self._pending = {}             # doc_id -> dados (None = saiu do período/escopo)
+        self._members = {}             # doc_id -> consultas (lotes do time) que contêm a venda
+        self._delivered = set()
+        self._expected = len(queries)
+        self._ready = threading.Event()
+        self.version = 0
+        self.last_access = time.time()
+        self.updated_at = None
+        if not queries:
+            self._ready.set()
+        self._watches = [
+            query.on_snapshot(lambda snapshot, changes, read_time, idx=idx: self._on_snapshot(idx, changes))
+            for idx, query in enumerate(queries)
+        ]
+
+    def _on_snapshot(self, query_idx, changes):
+        # Roda na thread do listener: só registra as mudanças (o merge é feito na leitura)
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                members = self._members.setdefault(doc.id, set())
+                if change.type.name == "REMOVED":
+                    members.discard(query_idx)
+                    # Venda que mudou de lote (reatribuída no time): o ADDED do
+                    # outro lote pode chegar antes deste REMOVED, então ela só sai
+                    # quando nenhuma consulta a contém
+                    if members:
+                        continue
+                    del self._members[doc.id]
+                    self._pending[doc.id] = None
+                else:
+                    members.add(query_idx)
+                    self._pending[doc.id] = doc.to_dict()
+            if changes:
+                self.version += 1
+                self.updated_at = time.time()
+            self._delivered.add(query_idx)
+            if len(self._delivered) == self._expected:
+                self._ready.set()
+
+    def _apply_pending(self):
+        """Aplica as mudanças acumuladas: tira as linhas antigas e acrescenta as novas."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+
+        changed = self._frame.index.intersection(list(pending))
+        if len(changed):
+            self._totals = self._totals.sub(_source_totals(self._frame.loc[changed]), fill_value=0)
+            self._frame = self._frame.drop(index=changed)
+
+        rows = {doc_id: data for doc_id, data in pending.items() if data is not None}
+        if rows:
+            added = pd.DataFrame.from_records(list(rows.values()), index=list(rows.keys()))
+            self._totals = self._totals.add(_source_totals(added), fill_value=0)
+            self._frame = added if self._frame.empty else pd.concat([self._frame, added])
+
+    def is_ready(self):
+        """True depois do primeiro snapshot de todas as consultas (carga inicial completa)."""
+        return self._ready.is_set()
+
+    def state(self):
+        """(pronto, versão) para a página conferir novidades; conta como acesso (mantém o listener)."""
+        self.last_access = time.time()
+        return self.is_ready(), self.version
+
+    def snapshot(self):
+        """(DataFrame atual, versão). O frame é novo a cada chamada (pode ser modificado)."""
+        with self._lock:
+            self._apply_pending()
+            self.last_access = time.time()
+            return self._frame.reset_index(drop=True), self.version
+
+    def totals(self, sources=None):
+        """{sales, revenue_net, revenue_gross} do período, opcionalmente só dos produtos pedidos."""
+        with self._lock:
+            self._apply_pending()
+            totals = self._totals
+        if sources:
+            totals = totals[totals.index.isin(sources)]
+        summed = totals.sum()
+        return {
+            "sales": int(summed.get("sales", 0)),
+            "revenue_net": float(summed.get("revenue_net", 0.0)),
+            "revenue_gross": float(summed.get("revenue_gross", 0.0)),
+        }
+
+    def close(self):
+        for watch in self._watches:
+            watch.unsubscribe()
+
+# --- Registro dos listeners (por processo) ---
+
+_views = {}
+_views_lock = threading.Lock()
+_reaper = None
+
+def _close_idle_views():
+    now = time.time()
+    for key in [key for key, view in _views.items() if now - view.last_access > LIVE_IDLE_SECONDS]:
+        _views.pop(key).close()
+
+def _reap_idle_views():
+    # Roda mesmo sem tráfego: listeners abandonados não ficam abertos
+    while True:
+        time.sleep(LIVE_REAPER_SECONDS)
+        with _views_lock:
+            _close_idle_views()
+
+def _start_reaper():
+    global _reaper
+    if _reaper is None:
+        _reaper = threading.Thread(target=_reap_idle_views, name="live-sales-reaper", daemon=True)
+        _reaper.start()
+
+def live_window_supported(end_date):
+    """O modo ao vivo vale para períodos que incluem hoje (onde chegam vendas novas)."""
+    return end_date >= date.today()
+
+def get_live_sales_view(start_date, end_date, scope):
+    """
+    Listener compartilhado do período/escopo (cria na primeira chamada, sem
+    esperar a carga inicial: veja is_ready). Retorna None se o limite de
+    listeners foi atingido.
+    """
+    key = (start_date, end_date, scope)
+    with _views_lock:
+        _start_reaper()
+        _close_idle_views()
+        view = _views.get(key)
+        if view is None:
+            if len(_views) >= LIVE_MAX_VIEWS:
+                return None
+            view = LiveSalesView(build_scope_queries(start_date, end_date, scope))
+            _views[key] = view
+        view.last_access = time.time()
+    return view
@@ -0,0 +1,78 @@
+import ast
+import os
+import re
+import subprocess
+import sys
+
+# --- ORÇAMENTO DE INICIALIZAÇÃO (IMPORTAÇÕES) ---
+#
+# Mede, em um processo Python novo (como num cold start), quanto tempo as
+# importações de cada página levam, usando 'python -X importtime'.
+# Uso: python -m utils.startup  (sai com código 1 se alguma página estourar o orçamento)
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Segundos de importação permitidos por página (a tela de login deve abrir rápido)
+STARTUP_BUDGET_SECONDS = {"Home.py": 1.0}
+DEFAULT_BUDGET_SECONDS = 4.0
+# Quantos módulos mais pesados aparecem no relatório de cada página
+REPORT_TOP_MODULES = 5
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def list_pages():
+    """Home.py e os arquivos de pages/, na ordem do menu."""
+    pages_dir = os.path.join(ROOT_DIR, "pages")
+    pages = sorted(name for name in os.listdir(pages_dir) if name.endswith(".py"))
+    return ["Home.py"] + [os.path.join("pages", name) for name in pages]
+
+def page_imports(page):
+    """Código das importações de nível superior da página (o que roda antes da primeira tela)."""
+    with open(os.path.join(ROOT_DIR, page), encoding="utf-8") as file:
+        tree = ast.parse(file.read())
+    imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return "\n".join(ast.unparse(node) for node in imports)
+
+def profile_imports(code):
+    """
+    Executa 'code' em um processo novo com -X importtime.
+    Retorna (segundos_total, [(módulo, segundos_acumulados)] dos módulos de primeiro nível).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT_DIR, capture_output=True, text=True
+    )
+    top_level = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # Sem recuo = importado diretamente pelo código (o tempo inclui as dependências)
+        if match and len(match.group(3)) == 1:
+            top_level.append((match.group(4), int(match.group(2)) / 1_000_000))
+    # Ignora o que o próprio interpretador carrega ao iniciar (site, encodings...)
+    interpreter_modules = set() if code == "pass" else {name for name, _ in profile_imports("pass")[1]}
+    top_level = [(name, seconds) for name, seconds in top_level if name not in interpreter_modules]
+    return sum(seconds for _, seconds in top_level), top_level
+
+def startup_report():
+    """Uma linha por página: tempo de importação, orçamento e os módulos mais pesados."""
+    report = []
+    for page in list_pages():
+        total, modules = profile_imports(page_imports(page))
+        budget = STARTUP_BUDGET_SECONDS.get(page, DEFAULT_BUDGET_SECONDS)
+        heaviest = sorted(modules, key=lambda item: item[1], reverse=True)[:REPORT_TOP_MODULES]
+        report.append({
+            "page": page,
+            "import_seconds": round(total, 3),
+            "budget_seconds": budget,
+            "within_budget": total <= budget,
+            "heaviest": ", ".join(f"{name} ({seconds:.2f}s)" for name, seconds in heaviest),
+        })
+    return report
+
+if __name__ == "__main__":
+    report = startup_report()
+    for row in report:
+        status = "OK " if row["within_budget"] else "ACIMA"
+        print(f"[{status}] {row['page']}: {row['import_seconds']:.2f}s (orçamento {row['budget_seconds']:.1f}s)")
+        print(f"        {row['heaviest']}")
+    sys.exit(0 if all(row["within_budget"] for row in report) else 1)
@@ -0,0 +1,91 @@
+import streamlit as st
+import threading
+from datetime import date
+
+# --- AQUECIMENTO DOS CACHES ---
+#
+# Depois de um deploy ou de um st.cache_data.clear(), o primeiro usuário
+# pagaria a leitura de users, metas, clientes e vendas do mês. Uma thread em
+# segundo plano preenche esses caches com as mesmas chaves que as páginas usam
+# (mês atual, visão padrão de cada usuário), antes de alguém pedir.
+
+# Quantas visões padrão são aquecidas (admins, gestores e os primeiros consultores).
+# O custo no Firestore acompanha este limite, não o número de usuários.
+WARMUP_MAX_VIEWS = 10
+
+_warmup_lock = threading.Lock()
+
+def current_month_window():
+    """(1º dia do mês, hoje): o período padrão do Dashboard."""
+    today = date.today()
+    return today.replace(day=1), today
+
+def default_views(df_users, limit=WARMUP_MAX_VIEWS):
+    """
+    (role, uid) das visões padrão mais quentes: admins primeiro (visão
+    mais ampla e mais pesada), depois gestores e consultores, até 'limit'.
+    """
+    if df_users.empty:
+        return []
+    order = {"admin": 0, "manager": 1, "consultant": 2}
+    users = df_users[df_users["role"].isin(order.keys())]
+    users = users.iloc[users["role"].map(order).argsort(kind="stable")]
+    return list(zip(users["role"], users["uid"]))[:limit]
+
+def warm_caches():
+    """Preenche os caches quentes. Roda fora de uma sessão: erros só vão para o log."""
+    # Importações aqui: a thread carrega a pilha analítica, não a tela de login
+    from utils.data_access import (
+        get_users_frame, get_team_hierarchy, sales_scope,
+        load_sales_frame, load_sales_kpis, load_clients_frame
+    )
+    from utils.aggregates import get_goal_progress, get_portfolio_summary
+    from utils.data_processing import get_client_portfolio_map
+    from utils.client_search import get_client_search_data
+    from utils.churn import get_at_risk_clients
+
+    start_date, end_date = current_month_window()
+    month_id = start_date.strftime("%Y-%m")
+
+    df_users = get_users_frame()
+    get_team_hierarchy()
+    get_goal_progress(month_id)
+    get_client_portfolio_map()
+    get_client_search_data()
+
+    views = default_views(df_users)
+    # Mesmos argumentos (posicionais) que o Dashboard usa na visão sem filtros
+    scopes = [(role, sales_scope(role, uid)) for role, uid in views]
+    for role, scope in scopes:
+        load_sales_kpis(start_date, end_date, scope, ())
+    for role, scope in scopes:
+        load_sales_frame(start_date, end_date, scope)
+
+    # Minha Carteira: clientes, mês atual e clientes em risco dos consultores aquecidos
+    for role, scope in scopes:
+        if role == "consultant":
+            load_clients_frame(scope)
+            get_portfolio_summary(scope[1], (month_id,))
+            get_at_risk_clients(scope[1])
+
+def start_warmup():
+    """Dispara o aquecimento em segundo plano (no máximo um por vez). Retorna False se já está rodando."""
+    if not _warmup_lock.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            warm_caches()
+        except Exception as e:
+            print(f"Falha no aquecimento dos caches: {e}")
+        finally:
+            _warmup_lock.release()
+
+    threading.Thread(target=run, name="cache-warmup", daemon=True).start()
+    return True
+
+@st.cache_resource(show_spinner=False)
+def warmup_on_process_start():
+    """Aquece os caches uma única vez por processo (a primeira página aberta dispara)."""
+    start_warmup()
+    return True